@@ -1,2 +1,11 @@
 __version__ = "0.0.3"
-from . import sfdx_cli_utils
+
+import importlib
+
+
+def __getattr__(name):
+    # sfdx_cli_utils (asyncio, http.client, ssl) is only imported when used,
+    # so commands like sf-orgs start quickly.
+    if name == "sfdx_cli_utils":
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,174 @@
+# benchmark.py
+__version__ = "0.0.3"
+
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from . import fake_sf
+from . import org_builder
+from . import sfdx_cli_utils as sfdx
+
+# Set the Log level
+#
+logging.basicConfig(
+    level=logging.ERROR, format="%(asctime)s - %(message)s", datefmt="%d-%b-%y %H:%M:%S"
+)
+logger = logging.getLogger()
+#
+
+
+def setup_args():
+    parser = argparse.ArgumentParser(
+        prog="org_bench",
+        description="""
+Run org_builder against the fake sf CLI for a set of org_config.yml
+ variants and report the wall time of each build step.
+    """,
+    )
+    parser.add_argument(
+        "configs",
+        help="org_config.yml variants. Default: benchmarks/configs/*.yml",
+        nargs="*",
+    )
+    parser.add_argument(
+        "-p",
+        "--project",
+        help="Project folder copied into each run. Default: benchmarks/project",
+        default="benchmarks/project",
+        type=str,
+    )
+    parser.add_argument("-r", "--repeat", help="Runs per config. Default: 3", default=3, type=int)
+    parser.add_argument(
+        "--latency",
+        help="FAKE_SF_LATENCY for the fake CLI, e.g. '0.2' or 'apex:run=1,*=0.2'",
+        default="",
+        type=str,
+    )
+    parser.add_argument(
+        "--install-seconds",
+        help="Seconds a fake package install stays IN_PROGRESS. Default: 1",
+        default=1,
+        type=float,
+    )
+    parser.add_argument(
+        "--api",
+        help="cli: every call is an sf process, rest: REST calls go to the fake API server. Default: cli",
+        choices=["cli", "rest"],
+        default="cli",
+    )
+    parser.add_argument("--fail", help="FAKE_SF_FAIL failure injection spec", default="", type=str)
+    parser.add_argument("--json", help="Write the raw timings to this file", type=str)
+    parser.add_argument("--debug", help="Turn on debug messages", action="store_true")
+
+    return parser
+
+
+def run_build(config_file, project, alias, extra_args=None):
+    work_dir = tempfile.mkdtemp(prefix="org_bench_")
+    shutil.copytree(project, work_dir, dirs_exist_ok=True)
+    shutil.copy(config_file, os.path.join(work_dir, "org_config.yml"))
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    start = time.perf_counter()
+    exit_code = 0
+    try:
+        org_builder.main("./org_config.yml", ["-a", alias, *(extra_args or [])])
+    except SystemExit as e:
+        exit_code = e.code or 0
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "config": config_file,
+        "alias": alias,
+        "exit_code": exit_code,
+        "total": time.perf_counter() - start,
+        "steps": list(org_builder.STEP_TIMINGS),
+    }
+
+
+def summarise(runs):
+    steps = {}
+    for run in runs:
+        for name, seconds in run["steps"]:
+            steps.setdefault(name, []).append(seconds)
+
+    return steps
+
+
+def print_report(config_file, runs):
+    failures = len([run for run in runs if run["exit_code"] != 0])
+    totals = [run["total"] for run in runs]
+
+    print()
+    print(f"{config_file}  runs: {len(runs)}  failed: {failures}")
+    print(f"{'Step':<60} {'Mean':>8} {'Min':>8} {'Max':>8}")
+    print(f"{'----':<60} {'----':>8} {'---':>8} {'---':>8}")
+    for name, seconds in summarise(runs).items():
+        print(f"{name[:60]:<60} {statistics.mean(seconds):>8.2f} {min(seconds):>8.2f} {max(seconds):>8.2f}")
+    print(f"{'Total':<60} {statistics.mean(totals):>8.2f} {min(totals):>8.2f} {max(totals):>8.2f}")
+
+
+def main(argv=None):
+    args = setup_args().parse_args(argv)
+
+    configs = args.configs or sorted(glob.glob("benchmarks/configs/*.yml"))
+    if not configs:
+        logging.error("No benchmark configs found")
+        sys.exit(1)
+
+    if args.debug:
+        logging.error("~~~ Setting up DEBUG ~~~")
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.CRITICAL)
+
+    project = os.path.abspath(args.project)
+    configs = [os.path.abspath(config_file) for config_file in configs]
+
+    fake_home = tempfile.mkdtemp(prefix="fake_sf_")
+    os.environ["FAKE_SF_HOME"] = fake_home
+    os.environ["SF_ORG_BUILDER_HOME"] = os.path.join(fake_home, "state")
+    os.environ["SF_ORG_BUILDER_AUTH_HOME"] = fake_home
+    os.environ["FAKE_SF_LATENCY"] = args.latency
+    os.environ["FAKE_SF_INSTALL_SECONDS"] = str(args.install_seconds)
+    os.environ["FAKE_SF_FAIL"] = args.fail
+    sfdx.SFDX_CMD = fake_sf.install_shim(os.path.join(fake_home, "bin"))
+
+    api_server = None
+    if args.api == "rest":
+        api_server = fake_sf.start_api_server()
+        os.environ["FAKE_SF_API_URL"] = f"http://127.0.0.1:{api_server.server_address[1]}"
+        sfdx.set_api_backend("rest")
+
+    results = {}
+    try:
+        for config_file in configs:
+            name = os.path.splitext(os.path.basename(config_file))[0]
+            runs = []
+            for n in range(args.repeat):
+                runs.append(run_build(config_file, project, f"bench-{name}-{n}"))
+            results[config_file] = runs
+            print_report(config_file, runs)
+    finally:
+        if api_server:
+            api_server.shutdown()
+        shutil.rmtree(fake_home, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as jsonfile:
+            json.dump(results, jsonfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# build_history.py
+__version__ = "0.0.3"
+
+#
+# Step timings of every org_builder run, kept in a SQLite file in the
+# SF_ORG_BUILDER_HOME folder. A step is keyed by its stage & target (the
+# package ID, source folders or apex script), next to the build's alias &
+# Dev Hub. `sf-org_builder --stats` reports p50/p95 per step, and `--plan`
+# estimates a build's time from the steps it would run.
+#
+
+import logging
+import math
+import sqlite3
+import time
+
+from . import local_state
+
+# Config
+#
+# Most recent runs of a step used for its p50/p95.
+HISTORY_RUNS = 50
+#
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    alias TEXT NOT NULL,
+    devhub TEXT,
+    config TEXT,
+    started REAL NOT NULL,
+    seconds REAL NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    build_id INTEGER NOT NULL REFERENCES builds (id),
+    stage TEXT NOT NULL,
+    target TEXT NOT NULL,
+    name TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS steps_key ON steps (stage, target, build_id);
+"""
+
+
+def db_file():
+    return local_state.state_path("history", "timings.db")
+
+
+def connect():
+    db = sqlite3.connect(db_file(), timeout=30)
+    db.executescript(SCHEMA)
+    return db
+
+
+def record(alias, devhub, config, started, seconds, status, timings, keys):
+    # timings: [(step name, seconds)], keys: {step name: (stage, target)}.
+    try:
+        with connect() as db:
+            cur = db.execute(
+                "INSERT INTO builds (alias, devhub, config, started, seconds, status) VALUES (?, ?, ?, ?, ?, ?)",
+                (alias, devhub, config, started, seconds, status),
+            )
+            db.executemany(
+                "INSERT INTO steps (build_id, stage, target, name, seconds) VALUES (?, ?, ?, ?, ?)",
+                [(cur.lastrowid, *keys.get(name, ("setup", name)), name, value) for name, value in timings],
+            )
+    except sqlite3.Error as e:
+        # History is a nice to have, the build itself is done.
+        logging.warning(f"Unable to record build timings ~ {e}")
+
+
+def percentile(values, p):
+    # Nearest rank.
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+def samples(db, stage, target, alias=None):
+    sql = "SELECT s.seconds FROM steps s JOIN builds b ON b.id = s.build_id WHERE s.stage = ? AND s.target = ?"
+    params = [stage, target]
+    if alias:
+        sql = sql + " AND b.alias = ?"
+        params.append(alias)
+    sql = sql + " ORDER BY s.build_id DESC LIMIT ?"
+
+    return [row[0] for row in db.execute(sql, params + [HISTORY_RUNS])]
+
+
+def step_stats(alias=None):
+    with connect() as db:
+        if alias:
+            keys = db.execute(
+                "SELECT DISTINCT s.stage, s.target, s.name FROM steps s JOIN builds b ON b.id = s.build_id "
+                "WHERE b.alias = ? ORDER BY s.stage, s.target",
+                (alias,),
+            ).fetchall()
+        else:
+            keys = db.execute("SELECT DISTINCT stage, target, name FROM steps ORDER BY stage, target").fetchall()
+
+        stats = {}
+        for stage, target, name in keys:
+            if (stage, target) in stats:
+                continue
+            values = samples(db, stage, target, alias)
+            stats[(stage, target)] = {
+                "stage": stage,
+                "target": target,
+                "name": name,
+                "runs": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "last": values[0],
+            }
+
+    # Slowest first.
+    return sorted(stats.values(), key=lambda s: s["p50"], reverse=True)
+
+
+def build_stats(alias=None):
+    # Newest first.
+    sql = "SELECT seconds, status FROM builds"
+    params = []
+    if alias:
+        sql = sql + " WHERE alias = ?"
+        params.append(alias)
+
+    with connect() as db:
+        return db.execute(sql + " ORDER BY id DESC", params).fetchall()
+
+
+def estimate(stage, target):
+    # (p50, p95) of a step, else of its stage when the target is new, else None.
+    with connect() as db:
+        values = samples(db, stage, target)
+        if not values:
+            values = [
+                row[0]
+                for row in db.execute(
+                    "SELECT seconds FROM steps WHERE stage = ? ORDER BY build_id DESC LIMIT ?", (stage, HISTORY_RUNS)
+                )
+            ]
+
+    if not values:
+        return None
+
+    return percentile(values, 50), percentile(values, 95)
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    return time.strftime("%Hh %Mm %Ss" if seconds >= 3600 else "%Mm %Ss", time.gmtime(seconds))
+
+
+def print_stats(alias=None):
+    builds = build_stats(alias)
+    if not builds:
+        print("No build history")
+        return 0
+
+    print()
+    print(f"{'Step':<60} {'Runs':>5} {'p50':>10} {'p95':>10} {'Last':>10}")
+    print(f"{'----':<60} {'----':>5} {'---':>10} {'---':>10} {'----':>10}")
+    for s in step_stats(alias):
+        print(
+            f"{s['name'][:60]:<60} {s['runs']:>5} {format_seconds(s['p50']):>10} "
+            f"{format_seconds(s['p95']):>10} {format_seconds(s['last']):>10}"
+        )
+    print()
+
+    complete = [seconds for seconds, status in builds if status == "complete"]
+    failed = len(builds) - len(complete)
+    print(f"Builds: {len(builds)} ({failed} failed)")
+    if complete:
+        print(f"Build time: p50 {format_seconds(percentile(complete, 50))}, p95 {format_seconds(percentile(complete, 95))}")
+    # Getting slower? The last 10 complete builds against the ones before.
+    if len(complete) > 10:
+        recent, earlier = complete[:10], complete[10:]
+        print(
+            f"Last 10 builds: p50 {format_seconds(percentile(recent, 50))}, "
+            f"earlier p50 {format_seconds(percentile(earlier, 50))}"
+        )
+    print()
+
+    return 0
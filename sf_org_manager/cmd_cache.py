@@ -0,0 +1,211 @@
+# cmd_cache.py
+__version__ = "0.0.3"
+
+#
+# Caches the result of read-only sf commands, keyed by the command line, in
+# the user state folder. Entries older than their TTL are still served for
+# a while, and refreshed in the background. Entries are tagged with the orgs
+# they describe, so commands that change an org can invalidate them; an org
+# is tagged by both its alias & username, so either one clears the entry.
+#
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from . import local_auth
+from . import local_state
+
+# Config
+#
+# Seconds a cached result is fresh, per command.
+CACHE_TTLS = {
+    "org_list": 60,
+    "package_list": 300,
+}
+# Seconds past its TTL a result may still be served while it is refreshed.
+STALE_SEC = 24 * 60 * 60
+# Set SF_ORG_BUILDER_CACHE=0 to turn the cache off.
+CACHE_ENABLED = os.environ.get("SF_ORG_BUILDER_CACHE", "1") != "0"
+# Bumped when entries written by an older version must not be kept; 2 no
+# longer caches user_details, whose results hold access tokens.
+CACHE_VERSION = 2
+#
+
+# Target shared by every entry that lists orgs.
+ORGS = "orgs"
+
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+# Cache folders already checked for entries of an older version.
+_upgraded = set()
+_upgraded_lock = threading.Lock()
+
+
+def cache_dir():
+    folder = local_state.state_dir("cache")
+    with _upgraded_lock:
+        if folder not in _upgraded:
+            upgrade(folder)
+            _upgraded.add(folder)
+
+    return folder
+
+
+def upgrade(folder):
+    # Drops every entry once when the folder was written by an older version.
+    version_file = os.path.join(folder, "VERSION")
+    with local_state.file_lock(version_file):
+        if os.path.isfile(version_file):
+            with open(version_file, "r") as f:
+                if f.read().strip() == str(CACHE_VERSION):
+                    return
+
+        for path in glob.glob(os.path.join(folder, "*.json")):
+            with local_state.file_lock(path):
+                if os.path.isfile(path):
+                    os.remove(path)
+        logging.debug(f"Cache upgraded to version {CACHE_VERSION}")
+
+        with open(version_file, "w") as f:
+            f.write(str(CACHE_VERSION))
+
+
+def entry_path(name, cmd):
+    key = hashlib.sha1(json.dumps([name, *cmd[1:]]).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir(), f"{name}-{key}.json")
+
+
+def is_cached(name):
+    return CACHE_ENABLED and CACHE_TTLS.get(name, 0) > 0
+
+
+def age(entry):
+    return time.time() - entry["created"]
+
+
+def target_keys(targets):
+    # An org target also stands for its alias / username from the CLI's auth
+    # files, e.g. a package list cached by alias is cleared by an install
+    # made by username.
+    keys = set()
+    for target in targets:
+        if not target:
+            continue
+        keys.add(target)
+        org = local_auth.resolve(target) if target != ORGS else None
+        if org:
+            keys.update(key for key in (org["alias"], org["username"]) if key)
+
+    return keys
+
+
+def store(path, name, targets, py_obj):
+    # Only successful results are kept.
+    if py_obj.get("status") != 0:
+        return
+
+    entry = {"name": name, "targets": sorted(target_keys(targets)), "created": time.time(), "result": py_obj}
+    local_state.write_json(path, entry)
+
+
+def refresh(path, name, targets, fetch, max_age):
+    # Under the entry lock, so only one process runs the command; the others
+    # pick up its result.
+    with local_state.file_lock(path):
+        entry = local_state.read_json(path)
+        if entry and age(entry) < max_age:
+            return entry["result"]
+
+        py_obj = fetch()
+        store(path, name, targets, py_obj)
+
+    return py_obj
+
+
+def revalidate(path, name, targets, fetch):
+    try:
+        refresh(path, name, targets, fetch, CACHE_TTLS[name])
+    except BaseException as e:
+        logging.warning(f"Cache refresh of {name} failed ~ {e!r}")
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(path)
+
+
+def peek(name, cmd):
+    # The cached result however old, without running the command; None if none.
+    if not is_cached(name):
+        return None
+
+    entry = local_state.read_json(entry_path(name, cmd))
+    return entry["result"] if entry else None
+
+
+def cached(name, cmd, targets, fetch, fresh=False):
+    if not is_cached(name):
+        return fetch()
+
+    path = entry_path(name, cmd)
+    ttl = CACHE_TTLS[name]
+
+    if not fresh:
+        entry = local_state.read_json(path)
+        if entry and age(entry) < ttl:
+            logging.debug(f"Cache hit {name}")
+            return entry["result"]
+
+        if entry and age(entry) < ttl + STALE_SEC:
+            logging.debug(f"Cache stale {name}, refreshing")
+            with _revalidating_lock:
+                start = path not in _revalidating
+                _revalidating.add(path)
+            if start:
+                threading.Thread(target=revalidate, args=(path, name, targets, fetch)).start()
+            return entry["result"]
+
+    return refresh(path, name, targets, fetch, 0 if fresh else ttl)
+
+
+async def cached_async(name, cmd, targets, fetch, fresh=False):
+    if not is_cached(name):
+        return await fetch()
+
+    path = entry_path(name, cmd)
+
+    if not fresh:
+        entry = local_state.read_json(path)
+        if entry and age(entry) < CACHE_TTLS[name]:
+            logging.debug(f"Cache hit {name}")
+            return entry["result"]
+
+    py_obj = await fetch()
+    with local_state.file_lock(path):
+        store(path, name, targets, py_obj)
+
+    return py_obj
+
+
+def invalidate(*targets):
+    if not CACHE_ENABLED:
+        return
+
+    targets = target_keys(targets)
+    folder = cache_dir()
+
+    for file_name in os.listdir(folder):
+        if not file_name.endswith(".json"):
+            continue
+
+        path = os.path.join(folder, file_name)
+        entry = local_state.read_json(path) or {}
+        if targets & set(entry.get("targets", [])):
+            logging.debug(f"Cache invalidate {file_name}")
+            with local_state.file_lock(path):
+                if os.path.isfile(path):
+                    os.remove(path)
@@ -0,0 +1,188 @@
+# data_snapshot.py
+__version__ = "0.0.3"
+
+#
+# Seed data snapshots. The first build runs the BUILD_DATA_CMD apex as
+# usual and then exports the seeded records (DATA_SNAPSHOT_QUERIES) with
+# `sf data export tree --plan`. Builds with the same seed scripts & source
+# import that snapshot instead, in chunks of at most CHUNK_SIZE records
+# imported side by side. The snapshot key changes with the scripts, so an
+# edited script gets a new snapshot on its next build.
+#
+
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+from . import local_state
+from . import sfdx_cli_utils as sfdx
+from .errors import SfdxError
+
+# Config
+#
+# Max records in one `sf data import tree` file (the CLI's limit is 200).
+CHUNK_SIZE = 200
+# Snapshots kept, most recently used first.
+KEEP_SNAPSHOTS = 5
+#
+
+
+def snapshots_dir():
+    return local_state.state_dir("data_snapshots")
+
+
+def snapshot_key(cfg, dir_path, skip=False):
+    # Seed scripts, queries and everything deployed before the data runs,
+    # the project source too unless the build skips its source push.
+    scripts = [os.path.join(dir_path, script) for script in cfg["BUILD_DATA_CMD"]]
+    folders = [os.path.join(dir_path, folder) for folder in cfg["PRE_DEPLOY"] + cfg["SRC_FOLDERS"]]
+
+    key = {
+        "scripts": local_state.hash_files(*scripts),
+        "folders": [local_state.hash_folder(folder) for folder in folders if os.path.isdir(folder)],
+        "queries": cfg["DATA_SNAPSHOT_QUERIES"],
+        "packages": cfg["PACKAGE_IDS"] or [],
+        "scratch_def": local_state.hash_files(cfg["SCRATCH_DEF"]) if os.path.isfile(cfg["SCRATCH_DEF"]) else "",
+    }
+    if not skip:
+        key["source"] = [local_state.hash_folder(folder) for folder in local_state.project_folders(dir_path)]
+
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def snapshot_path(key):
+    return os.path.join(snapshots_dir(), key)
+
+
+def manifest_file(key):
+    return os.path.join(snapshot_path(key), "snapshot.json")
+
+
+def exists(key):
+    return os.path.isfile(manifest_file(key))
+
+
+def chunk_file(path, folder):
+    # Split a tree file into files of at most CHUNK_SIZE records.
+    with open(path, "r") as jsonfile:
+        records = json.load(jsonfile)["records"]
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    chunks = []
+    for idx in range(0, len(records), CHUNK_SIZE):
+        chunk = os.path.join(folder, f"{stem}-{idx // CHUNK_SIZE + 1}.json")
+        with open(chunk, "w") as jsonfile:
+            json.dump({"records": records[idx : idx + CHUNK_SIZE]}, jsonfile)
+        chunks.append(os.path.relpath(chunk, os.path.dirname(folder)))
+
+    return chunks
+
+
+def export_group(org_alias, query, export_dir, prefix):
+    py_obj = sfdx.data_export_tree(org_alias, query, export_dir, prefix)
+
+    if py_obj["status"] == 1:
+        logging.error(f"Data export failed ~ {query} MESSAGE: {py_obj['message']}")
+        logging.warning(f"{py_obj}")
+        raise SfdxError.from_result(py_obj)
+
+    plans = glob.glob(os.path.join(export_dir, f"{prefix}-*plan.json"))
+    if not plans:
+        raise SfdxError("NoDataPlan", f"Data export wrote no plan ~ {query}", py_obj)
+
+    with open(plans[0], "r") as jsonfile:
+        plan = json.load(jsonfile)
+
+    # Records that refer to each other must be imported by one command.
+    if any(entry.get("resolveRefs") for entry in plan):
+        return {"plan": os.path.relpath(plans[0], os.path.dirname(export_dir))}
+
+    chunk_dir = os.path.join(os.path.dirname(export_dir), "chunks")
+    os.makedirs(chunk_dir, exist_ok=True)
+
+    chunks = []
+    for entry in plan:
+        for file_name in entry["files"]:
+            chunks += chunk_file(os.path.join(export_dir, file_name), chunk_dir)
+
+    return {"chunks": chunks}
+
+
+def export(org_alias, key, queries):
+    # Written to a temp folder and moved into place, so a snapshot is only
+    # seen once complete.
+    with local_state.file_lock(snapshot_path(key)):
+        if exists(key):
+            return True
+
+        tmp_path = f"{snapshot_path(key)}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        export_dir = os.path.join(tmp_path, "export")
+        os.makedirs(export_dir)
+
+        try:
+            groups = [export_group(org_alias, query, export_dir, f"q{idx}") for idx, query in enumerate(queries)]
+            manifest = {"key": key, "created": time.time(), "queries": queries, "groups": groups}
+            local_state.write_json(os.path.join(tmp_path, "snapshot.json"), manifest)
+            os.replace(tmp_path, snapshot_path(key))
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    logging.error(f"~~~ Data snapshot {key} saved ~~~")
+    prune(key)
+
+    return True
+
+
+def import_error(name, py_obj):
+    message = py_obj.get("message")
+    logging.error(f"Data import failed ~ {name} MESSAGE: {message}")
+    logging.warning(f"{py_obj}")
+    raise SfdxError.from_result(py_obj)
+
+
+async def import_snapshot_async(org_alias, key):
+    folder = snapshot_path(key)
+    manifest = local_state.read_json(manifest_file(key))
+
+    # Groups in query order, the chunks of a group side by side.
+    for group in manifest["groups"]:
+        if "plan" in group:
+            py_obj = await sfdx.data_import_tree_async(org_alias, plan=os.path.join(folder, group["plan"]))
+            if py_obj["status"] == 1:
+                import_error(group["plan"], py_obj)
+            continue
+
+        files = [os.path.join(folder, chunk) for chunk in group["chunks"]]
+        results = await asyncio.gather(*[sfdx.data_import_tree_async(org_alias, files=[f]) for f in files])
+        for chunk, py_obj in zip(group["chunks"], results):
+            if py_obj["status"] == 1:
+                import_error(chunk, py_obj)
+
+    # Last used, for prune().
+    os.utime(folder)
+
+    return True
+
+
+def import_snapshot(org_alias, key):
+    return asyncio.run(import_snapshot_async(org_alias, key))
+
+
+def prune(keep_key):
+    folder = snapshots_dir()
+    paths = [
+        os.path.join(folder, name)
+        for name in os.listdir(folder)
+        if name != keep_key and os.path.isdir(os.path.join(folder, name)) and ".tmp-" not in name
+    ]
+    paths.sort(key=os.path.getmtime, reverse=True)
+
+    for path in paths[KEEP_SNAPSHOTS - 1 :]:
+        logging.info(f"Removing data snapshot {os.path.basename(path)}")
+        shutil.rmtree(path, ignore_errors=True)
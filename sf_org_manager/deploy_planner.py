@@ -0,0 +1,114 @@
+# deploy_planner.py
+__version__ = "0.0.3"
+
+#
+# Groups source folders into as few `project deploy start` calls as
+# possible. Folders deploy together unless ordering matters: a folder with
+# metadata that changes how later metadata deploys (org settings,
+# destructive changes) is deployed on its own, and a folder that redefines
+# a component from an earlier folder starts a new deploy so it still wins.
+#
+
+import os
+
+# Config
+#
+# Metadata types deployed on their own, after the folders listed before
+# them and before the folders listed after them.
+ORDERED_TYPES = ("Settings", "DestructiveChanges")
+#
+
+METADATA_SUFFIXES = (
+    (".cls", "ApexClass"),
+    (".trigger", "ApexTrigger"),
+    (".page", "ApexPage"),
+    (".component", "ApexComponent"),
+    (".object-meta.xml", "CustomObject"),
+    (".field-meta.xml", "CustomField"),
+    (".recordType-meta.xml", "RecordType"),
+    (".listView-meta.xml", "ListView"),
+    (".validationRule-meta.xml", "ValidationRule"),
+    (".permissionset-meta.xml", "PermissionSet"),
+    (".profile-meta.xml", "Profile"),
+    (".layout-meta.xml", "Layout"),
+    (".flow-meta.xml", "Flow"),
+    (".labels-meta.xml", "CustomLabels"),
+    (".tab-meta.xml", "CustomTab"),
+    (".app-meta.xml", "CustomApplication"),
+    (".md-meta.xml", "CustomMetadata"),
+    (".settings-meta.xml", "Settings"),
+    (".site-meta.xml", "CustomSite"),
+    (".network-meta.xml", "Network"),
+)
+
+BUNDLE_FOLDERS = {"lwc": "LightningComponentBundle", "aura": "AuraDefinitionBundle"}
+
+# Child metadata named <Object>.<Name>, e.g. objects/Account/fields/Region__c.
+OBJECT_CHILD_FOLDERS = ("fields", "recordTypes", "listViews", "validationRules")
+
+COMPANION_SUFFIXES = (".cls-meta.xml", ".trigger-meta.xml", ".page-meta.xml", ".component-meta.xml")
+
+
+def component(path):
+    # (type, full name) of the source file at path, or None.
+    parts = path.replace(os.sep, "/").split("/")
+    name = parts[-1]
+
+    if name.startswith("destructiveChanges") and name.endswith(".xml"):
+        return "DestructiveChanges", name
+
+    for folder, c_type in BUNDLE_FOLDERS.items():
+        if folder in parts[:-2]:
+            return c_type, parts[parts.index(folder) + 1]
+
+    if name.startswith(".") or name.endswith(COMPANION_SUFFIXES):
+        return None
+
+    for suffix, c_type in METADATA_SUFFIXES:
+        if name.endswith(suffix):
+            full_name = name[: -len(suffix)]
+            if len(parts) > 2 and parts[-2] in OBJECT_CHILD_FOLDERS:
+                full_name = f"{parts[-3]}.{full_name}"
+            return c_type, full_name
+
+    return "Unknown", name.split(".")[0]
+
+
+def folder_components(folder):
+    components = set()
+    for root, dirs, files in os.walk(folder):
+        for file_name in files:
+            item = component(os.path.relpath(os.path.join(root, file_name), folder))
+            if item:
+                components.add(item)
+
+    return components
+
+
+def plan(folders):
+    # Ordered list of deploys, each a list of folders.
+    deploys = []
+    current = []
+    seen = set()
+
+    for folder in folders:
+        components = folder_components(folder)
+
+        if any(c_type in ORDERED_TYPES for c_type, _ in components):
+            if current:
+                deploys.append(current)
+            deploys.append([folder])
+            current, seen = [], set()
+            continue
+
+        if components & seen:
+            deploys.append(current)
+            current, seen = [], set()
+
+        current.append(folder)
+        seen |= components
+
+    if current:
+        deploys.append(current)
+
+    return deploys
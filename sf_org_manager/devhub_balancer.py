@@ -0,0 +1,152 @@
+# devhub_balancer.py
+__version__ = "0.0.3"
+
+#
+# Spreads new scratch orgs over the Dev Hubs in DEVHUBS. Each hub's
+# remaining daily & active scratch org allocations (`sf org list limits`)
+# are cached for LIMITS_TTL seconds and shared by concurrent builds; a build
+# takes one of each from the hub with the most headroom. When every hub is
+# at its limits the build waits, re-reading the limits, until one frees up;
+# when no hub's limits can be read at all the build fails straight away.
+#
+
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import local_state
+from . import polling
+from . import sfdx_cli_utils as sfdx
+from .errors import BuildError
+
+# Config
+#
+# Allocations a new scratch org uses up.
+LIMITS = ("DailyScratchOrgs", "ActiveScratchOrgs")
+# Seconds cached limits are trusted before `sf org list limits` is run again.
+LIMITS_TTL = 300
+# Errors from `sf org create scratch` meaning the hub is at a limit.
+LIMIT_ERRORS = ("LIMIT_EXCEEDED",)
+LIMIT_MESSAGES = ("scratch org limit", "signup limit", "LIMIT_EXCEEDED")
+#
+
+
+def limits_file():
+    return local_state.state_path("devhubs", "limits.json")
+
+
+def default_devhub(cfg):
+    # The Dev Hub builds use without -v; None when balanced across DEVHUBS.
+    return None if cfg.get("DEVHUBS") else cfg["DEVHUB"]
+
+
+def fetch_limits(devhub):
+    py_obj = sfdx.org_limits(devhub)
+
+    if py_obj["status"] == 1:
+        logging.error(f"Unable to read {devhub} limits ~ MESSAGE: {py_obj['message']}")
+        logging.warning(f"{py_obj}")
+        return None
+
+    remaining = {limit["name"]: limit["remaining"] for limit in py_obj["result"]}
+    entry = {name: remaining.get(name, 0) for name in LIMITS}
+    entry["fetched"] = time.time()
+
+    return entry
+
+
+def headroom(entry):
+    return min(entry[name] for name in LIMITS)
+
+
+def is_limit_error(error):
+    name = getattr(error, "name", "")
+    message = str(error)
+
+    return name in LIMIT_ERRORS or any(text.lower() in message.lower() for text in LIMIT_MESSAGES)
+
+
+def refresh(devhubs, fresh=False):
+    # Re-read the limits of hubs whose cache is missing or older than LIMITS_TTL.
+    cached = local_state.read_json(limits_file(), {})
+    stale = [
+        devhub
+        for devhub in devhubs
+        if fresh or devhub not in cached or time.time() - cached[devhub]["fetched"] > LIMITS_TTL
+    ]
+    if not stale:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(stale)) as pool:
+        entries = dict(zip(stale, pool.map(fetch_limits, stale)))
+
+    with local_state.file_lock(limits_file()):
+        cached = local_state.read_json(limits_file(), {})
+        for devhub, entry in entries.items():
+            if entry is None:
+                cached.pop(devhub, None)
+            else:
+                cached[devhub] = entry
+        local_state.write_json(limits_file(), cached)
+
+
+def readable(devhubs):
+    # Hubs whose limits were read; refresh() drops the ones it could not read.
+    cached = local_state.read_json(limits_file(), {})
+    return [devhub for devhub in devhubs if devhub in cached]
+
+
+def unreadable_error(devhubs):
+    return BuildError(f"Unable to read the scratch org limits of any Dev Hub ~ {', '.join(devhubs)}")
+
+
+def reserve(devhubs):
+    # The hub with the most headroom, its cached allocations taken by one;
+    # None when every hub is at its limits.
+    with local_state.file_lock(limits_file()):
+        cached = local_state.read_json(limits_file(), {})
+        candidates = [devhub for devhub in devhubs if devhub in cached and headroom(cached[devhub]) > 0]
+        if not candidates:
+            return None
+
+        devhub = max(candidates, key=lambda hub: headroom(cached[hub]))
+        for name in LIMITS:
+            cached[devhub][name] = cached[devhub][name] - 1
+        local_state.write_json(limits_file(), cached)
+
+    logging.info(f"Dev Hub {devhub}, {headroom(cached[devhub])} scratch orgs left")
+    return devhub
+
+
+def saturated(devhub):
+    # `sf org create scratch` hit a limit the cache missed.
+    with local_state.file_lock(limits_file()):
+        cached = local_state.read_json(limits_file(), {})
+        cached[devhub] = {**{name: 0 for name in LIMITS}, "fetched": time.time()}
+        local_state.write_json(limits_file(), cached)
+
+
+def choose(devhubs):
+    refresh(devhubs)
+    devhub = reserve(devhubs)
+    if devhub:
+        return devhub
+    if not readable(devhubs):
+        raise unreadable_error(devhubs)
+
+    logging.error(f"~~~ Every Dev Hub is at its scratch org limits, waiting ~ {', '.join(devhubs)} ~~~")
+
+    def check():
+        refresh(devhubs, fresh=True)
+        if not readable(devhubs):
+            raise unreadable_error(devhubs)
+        return reserve(devhubs)
+
+    try:
+        devhub = polling.poll(check, lambda hub: hub is not None, "devhub", description="Dev Hub allocation")
+    except TimeoutError as e:
+        raise BuildError(str(e)) from e
+
+    logging.error(f"~~~ Dev Hub {devhub} has room ~~~")
+    return devhub
@@ -0,0 +1,24 @@
+# errors.py
+__version__ = "0.0.3"
+
+#
+# Exceptions raised by the build in place of exiting, so a caller can tell
+# a failed sf command from a bad config, and retry the transient ones.
+#
+
+
+class BuildError(Exception):
+    pass
+
+
+class SfdxError(BuildError):
+    # A failed sf command, from its `--json` result.
+    def __init__(self, name, message, py_obj=None):
+        super().__init__(f"{name} ~ {message}")
+        self.name = name
+        self.message = message
+        self.py_obj = py_obj
+
+    @classmethod
+    def from_result(cls, py_obj):
+        return cls(py_obj.get("name") or "SfdxError", py_obj.get("message") or "", py_obj)
@@ -0,0 +1,1243 @@
+# fake_sf.py
+__version__ = "0.0.3"
+
+#
+# Stand-in for the Salesforce `sf` CLI. Answers the commands wrapped by
+# sfdx_cli_utils with realistic `--json` payloads so org_builder can be run
+# (and timed) without a Dev Hub.
+#
+# Behaviour is controlled with environment variables:
+#
+#   FAKE_SF_HOME              State directory (orgs, installs). Default: <tmp>/fake_sf
+#   FAKE_SF_LATENCY           Seconds per call, "0.5" or "apex:run=2,*=0.1"
+#   FAKE_SF_FAIL              Failure injection, "apex:run=UNABLE_TO_LOCK_ROW@0.5,project:deploy:start"
+#   FAKE_SF_INSTALL_SECONDS   Time a package install stays IN_PROGRESS. Default: 5
+#   FAKE_SF_PACKAGE_DEPENDS   Package dependencies, "04tB=04tA,04tC=04tA+04tB"
+#   FAKE_SF_COMMUNITY_SECONDS Time before a new community shows up in queries. Default: 3
+#   FAKE_SF_RECORD            Directory to record real responses into (needs FAKE_SF_REAL_CMD)
+#   FAKE_SF_REAL_CMD          The real `sf` executable used when recording
+#   FAKE_SF_REPLAY            Directory of recorded responses to replay
+#   FAKE_SF_API_URL           instanceUrl handed out by `org display user`, e.g. the
+#                             stub REST API started with `sf-fake --serve-api 8080`
+#   FAKE_SF_API_LATENCY       Seconds per stub REST API request
+#   FAKE_SF_DATA_RECORDS      Records returned per object by `data export tree`. Default: 250
+#   FAKE_SF_SNAPSHOT_SECONDS  Time an org snapshot stays "In Progress". Default: 5
+#   FAKE_SF_DEPLOY_SECONDS    Time a `project deploy start --async` stays InProgress. Default: 5
+#   FAKE_SF_UNREACHABLE       Orgs (aliases or usernames) whose auth no longer works,
+#                             e.g. deleted outside the CLI, "old-org,test-1@example.com"
+#   FAKE_SF_HUBS              Dev Hubs & their daily/active scratch org limits,
+#                             "my-dev-hub-org=200/100,second-hub=6/3"
+#
+# Like the real CLI, the orgs are also written as alias & auth files to
+# FAKE_SF_HOME/.sfdx; set SF_ORG_BUILDER_AUTH_HOME=$FAKE_SF_HOME so
+# local_auth reads them.
+#
+
+import hashlib
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import threading
+import uuid
+
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from . import local_state
+
+
+def fake_home():
+    home = os.environ.get("FAKE_SF_HOME", os.path.join(tempfile.gettempdir(), "fake_sf"))
+    os.makedirs(home, exist_ok=True)
+    return home
+
+
+def parse_args(argv):
+    words = []
+    flags = {}
+
+    idx = 0
+    while idx < len(argv) and not argv[idx].startswith("-"):
+        words.extend(argv[idx].split(":"))
+        idx = idx + 1
+
+    # The longest run of words naming a command is the topic, the rest are
+    # positional arguments, e.g. `alias set name=value`.
+    cut = len(words)
+    while cut > 0 and ":".join(words[:cut]) not in COMMANDS:
+        cut = cut - 1
+    topic = words[:cut] or words
+    flags["_args"] = words[cut:] if cut else []
+
+    while idx < len(argv):
+        flag = argv[idx]
+        value = True
+        if idx + 1 < len(argv) and not argv[idx + 1].startswith("-"):
+            value = argv[idx + 1]
+            idx = idx + 1
+        flags.setdefault(flag, []).append(value)
+        idx = idx + 1
+
+    return ":".join(topic), flags
+
+
+def flag(flags, *names, default=None):
+    for name in names:
+        if name in flags:
+            return flags[name][-1]
+    return default
+
+
+def flag_list(flags, *names):
+    values = []
+    for name in names:
+        values.extend(flags.get(name, []))
+    return values
+
+
+def setting_for(command, setting):
+    # "apex:run=2,*=0.1" -> per command value, "0.5" -> value for every command.
+    if not setting:
+        return None
+
+    fallback = None
+    for item in setting.split(","):
+        if "=" not in item:
+            fallback = item
+            continue
+        key, value = item.split("=", 1)
+        if key == command:
+            return value
+        if key == "*":
+            fallback = value
+
+    return fallback
+
+
+def injected_failure(command):
+    for item in os.environ.get("FAKE_SF_FAIL", "").split(","):
+        if not item:
+            continue
+        spec, _, probability = item.partition("@")
+        key, _, error_name = spec.partition("=")
+        if key not in (command, "*"):
+            continue
+        if random.random() < float(probability or 1):
+            return error_name or "FakeInjectedError"
+
+    return None
+
+
+#
+# State
+#
+
+
+def hub_limits():
+    # alias -> (daily, active) scratch org limits.
+    limits = {}
+    for item in (os.environ.get("FAKE_SF_HUBS") or "my-dev-hub-org=200/100").split(","):
+        alias, _, value = item.strip().partition("=")
+        daily, _, active = (value or "200/100").partition("/")
+        limits[alias] = (int(daily), int(active or daily))
+    return limits
+
+
+def load_state():
+    path = os.path.join(fake_home(), "state.json")
+    if os.path.isfile(path):
+        with open(path, "r") as jsonfile:
+            state = json.load(jsonfile)
+    else:
+        state = {
+            "orgs": {},
+            "hubs": {
+                "my-dev-hub-org": {"username": "user@dev-hub-org.com", "orgId": new_id("00D")},
+            },
+            "installs": {},
+        }
+
+    for alias in hub_limits():
+        state["hubs"].setdefault(alias, {"username": f"user@{alias}.com", "orgId": new_id("00D")})
+
+    return state
+
+
+def save_state(state):
+    local_state.write_json(os.path.join(fake_home(), "state.json"), state)
+    write_auth_files(state)
+
+
+def auth_file(org):
+    auth = {
+        "accessToken": org.get("accessToken", "00D!fake"),
+        "instanceUrl": org.get("instanceUrl", "https://fake.my.salesforce.com"),
+        "loginUrl": "https://test.salesforce.com",
+        "orgId": org["orgId"],
+        "username": org["username"],
+        "clientId": "PlatformCLI",
+        "isDevHub": org.get("isDevHub", False),
+    }
+    if not org.get("isDevHub"):
+        auth["devHubUsername"] = org["devHubUsername"]
+        auth["expirationDate"] = org["expirationDate"]
+        auth["tracksSource"] = True
+
+    return auth
+
+
+def write_if_changed(path, data):
+    # Unchanged files keep their mtime, so readers can tell nothing moved.
+    if local_state.read_json(path) != data:
+        local_state.write_json(path, data)
+
+
+def write_auth_files(state):
+    sfdx_dir = os.path.join(fake_home(), ".sfdx")
+    os.makedirs(sfdx_dir, exist_ok=True)
+
+    orgs = [{"alias": alias, **hub, "isDevHub": True} for alias, hub in state["hubs"].items()]
+    orgs += list(state["orgs"].values())
+
+    for org in orgs:
+        write_if_changed(os.path.join(sfdx_dir, f"{org['username']}.json"), auth_file(org))
+
+    usernames = {f"{org['username']}.json" for org in orgs}
+    for file_name in os.listdir(sfdx_dir):
+        if "@" in file_name and file_name.endswith(".json") and file_name not in usernames:
+            os.remove(os.path.join(sfdx_dir, file_name))
+
+    write_if_changed(os.path.join(sfdx_dir, "alias.json"), {"orgs": {org["alias"]: org["username"] for org in orgs if org["alias"]}})
+
+    config_path = os.path.join(fake_home(), ".sf", "config.json")
+    if not os.path.isfile(config_path) and state["hubs"]:
+        os.makedirs(os.path.dirname(config_path), exist_ok=True)
+        local_state.write_json(config_path, {"target-dev-hub": next(iter(state["hubs"]))})
+
+
+def new_id(prefix):
+    return prefix + uuid.uuid4().hex[:15].upper()
+
+
+def find_org(state, target):
+    for org in state["orgs"].values():
+        if target in (org["alias"], org["username"]):
+            return org
+
+    for alias, hub in state["hubs"].items():
+        if target in (alias, hub["username"]):
+            return {"alias": alias, **hub, "packages": [], "isDevHub": True}
+
+    return None
+
+
+def is_expired(org):
+    return org.get("expirationDate", "9999-12-31") < date.today().isoformat()
+
+
+def is_unreachable(org):
+    names = [name.strip() for name in os.environ.get("FAKE_SF_UNREACHABLE", "").split(",") if name.strip()]
+    return org.get("alias") in names or org["username"] in names
+
+
+#
+# Commands
+#
+
+
+def error(name, message, exit_code=1):
+    return exit_code, {
+        "status": exit_code,
+        "name": name,
+        "message": message,
+        "exitCode": exit_code,
+        "commandName": "FakeSf",
+        "warnings": [],
+    }
+
+
+def ok(result):
+    return 0, {"status": 0, "result": result, "warnings": []}
+
+
+def require_org(state, flags, *names):
+    target = flag(flags, *names)
+    org = find_org(state, target)
+    if org is None:
+        return None, error("NoOrgFound", f"No authorization information found for {target}.")
+    return org, None
+
+
+def cmd_org_create_scratch(state, flags):
+    alias = flag(flags, "-a", "--alias")
+    hub = flag(flags, "-v", "--target-dev-hub", default="my-dev-hub-org")
+    if hub not in state["hubs"]:
+        return error("NoOrgFound", f"No authorization information found for {hub}.")
+
+    daily, active = hub_usage(state, hub)
+    max_daily, max_active = hub_limits().get(hub, (200, 100))
+    if active >= max_active:
+        return error("LIMIT_EXCEEDED", "The signup request failed because this organization has reached its active scratch org limit")
+    if daily >= max_daily:
+        return error("LIMIT_EXCEEDED", "The signup request failed because this organization has reached its daily scratch org signup limit")
+    state["hubs"][hub].setdefault("signups", []).append(date.today().isoformat())
+
+    username = f"test-{uuid.uuid4().hex[:12]}@example.com"
+    org = {
+        "alias": alias or "",
+        "username": username,
+        "orgId": new_id("00D"),
+        "instanceUrl": f"https://fake-{uuid.uuid4().hex[:8]}.scratch.my.salesforce.com",
+        "accessToken": new_id("00D") + "!" + uuid.uuid4().hex,
+        "devHubUsername": state["hubs"][hub]["username"],
+        "expirationDate": (date.today() + timedelta(days=int(flag(flags, "-y", "--duration-days", default=7)))).isoformat(),
+        "scratchDef": flag(flags, "-f", "--definition-file", default=""),
+        "packages": [],
+        "permsets": [],
+    }
+
+    snapshot_name = flag(flags, "--snapshot")
+    if snapshot_name:
+        snapshot = state.get("snapshots", {}).get(snapshot_name)
+        if snapshot is None or snapshot_status(snapshot) != "Active":
+            return error("SnapshotNotActive", f"Snapshot {snapshot_name} is not available.")
+        org.update(json.loads(json.dumps(snapshot["content"])))
+
+    for other in list(state["orgs"].values()):
+        if alias and other["alias"] == alias:
+            other["alias"] = ""
+
+    state["orgs"][username] = org
+
+    return ok(
+        {
+            "username": username,
+            "orgId": org["orgId"],
+            "scratchOrgInfo": {
+                "Id": new_id("2SR"),
+                "Status": "Active",
+                "SignupUsername": username,
+                "ExpirationDate": org["expirationDate"],
+            },
+            "warnings": [],
+        }
+    )
+
+
+def hub_usage(state, hub):
+    # (signups today, active scratch orgs) of a Dev Hub alias.
+    today = date.today().isoformat()
+    username = state["hubs"][hub]["username"]
+    daily = sum(1 for signup in state["hubs"][hub].get("signups", []) if signup == today)
+    active = sum(1 for org in state["orgs"].values() if org["devHubUsername"] == username and not is_expired(org))
+    return daily, active
+
+
+def cmd_org_list_limits(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    limits = [
+        {"name": "DailyApiRequests", "max": 5000000, "remaining": 4999000},
+        {"name": "DataStorageMB", "max": 200, "remaining": 190},
+    ]
+    if org.get("isDevHub"):
+        daily, active = hub_usage(state, org["alias"])
+        max_daily, max_active = hub_limits().get(org["alias"], (200, 100))
+        limits += [
+            {"name": "ActiveScratchOrgs", "max": max_active, "remaining": max(max_active - active, 0)},
+            {"name": "DailyScratchOrgs", "max": max_daily, "remaining": max(max_daily - daily, 0)},
+        ]
+
+    return ok(limits)
+
+
+# Org fields that belong to the org itself rather than what was built in it.
+ORG_IDENTITY = ("alias", "username", "orgId", "instanceUrl", "accessToken", "devHubUsername", "expirationDate")
+
+
+def snapshot_status(snapshot):
+    return "Active" if time.time() >= snapshot["ready_at"] else "In Progress"
+
+
+def snapshot_result(snapshot):
+    return {
+        "Id": snapshot["id"],
+        "SnapshotName": snapshot["name"],
+        "Description": snapshot["description"],
+        "Status": snapshot_status(snapshot),
+        "SourceOrg": snapshot["sourceOrg"],
+        "CreatedDate": snapshot["created"],
+    }
+
+
+def cmd_org_create_snapshot(state, flags):
+    hub = flag(flags, "-v", "--target-dev-hub", default="my-dev-hub-org")
+    if hub not in state["hubs"]:
+        return error("NoOrgFound", f"No authorization information found for {hub}.")
+
+    org, err = require_org(state, flags, "-o", "--source-org")
+    if err:
+        return err
+
+    name = flag(flags, "-n", "--name")
+    if name in state.setdefault("snapshots", {}):
+        return error("DUPLICATE_VALUE", f"A snapshot named {name} already exists.")
+
+    seconds = float(os.environ.get("FAKE_SF_SNAPSHOT_SECONDS", 5))
+    state["snapshots"][name] = {
+        "id": new_id("0Oo"),
+        "name": name,
+        "description": flag(flags, "-d", "--description", default=""),
+        "sourceOrg": org["orgId"],
+        "created": date.today().isoformat(),
+        "ready_at": time.time() + seconds,
+        "content": {k: v for k, v in org.items() if k not in ORG_IDENTITY},
+    }
+
+    return ok(snapshot_result(state["snapshots"][name]))
+
+
+def cmd_org_get_snapshot(state, flags):
+    name = flag(flags, "-s", "--snapshot")
+    snapshot = state.get("snapshots", {}).get(name)
+    if snapshot is None:
+        return error("NoResultsError", f"No snapshot found with name or ID {name}.")
+
+    return ok(snapshot_result(snapshot))
+
+
+def cmd_org_delete_snapshot(state, flags):
+    name = flag(flags, "-s", "--snapshot")
+    snapshot = state.get("snapshots", {}).pop(name, None)
+    if snapshot is None:
+        return error("NoResultsError", f"No snapshot found with name or ID {name}.")
+
+    return ok(f"Successfully deleted snapshot {name}.")
+
+
+def cmd_package_install(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    package_id = flag(flags, "-p", "--package")
+    request_id = new_id("0Hf")
+    seconds = float(os.environ.get("FAKE_SF_INSTALL_SECONDS", 5))
+    state["installs"][request_id] = {
+        "org": org["username"],
+        "package": package_id,
+        "ready_at": time.time() + seconds,
+    }
+
+    return ok(
+        {
+            "Id": request_id,
+            "Status": "IN_PROGRESS",
+            "SubscriberPackageVersionKey": package_id,
+            "Errors": None,
+        }
+    )
+
+
+def package_depends(package_id):
+    # FAKE_SF_PACKAGE_DEPENDS="04tB=04tA,04tC=04tA+04tB"
+    for item in os.environ.get("FAKE_SF_PACKAGE_DEPENDS", "").split(","):
+        key, _, deps = item.partition("=")
+        if key == package_id:
+            return deps.split("+")
+
+    return []
+
+
+def cmd_package_install_report(state, flags):
+    request_id = flag(flags, "-i", "--request-id")
+    install = state["installs"].get(request_id)
+    if install is None:
+        return error("InvalidIdError", f"Invalid package install request id {request_id}.")
+
+    status = "IN_PROGRESS"
+    errors = None
+    if time.time() >= install["ready_at"]:
+        status = "SUCCESS"
+        org = state["orgs"].get(install["org"], {"packages": []})
+        missing = [dep for dep in package_depends(install["package"]) if dep not in org["packages"]]
+        if missing:
+            status = "ERROR"
+            errors = {"errors": [{"message": f"Missing dependent package version {missing[0]}"}]}
+        elif install["package"] not in org["packages"]:
+            org["packages"].append(install["package"])
+
+    return ok(
+        {"Id": request_id, "Status": status, "SubscriberPackageVersionKey": install["package"], "Errors": errors}
+    )
+
+
+def cmd_package_installed_list(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    return ok(
+        [
+            {
+                "Id": new_id("0A3"),
+                "SubscriberPackageName": f"Package {package_id[-4:]}",
+                "SubscriberPackageNamespace": None,
+                "SubscriberPackageVersionId": package_id,
+                "SubscriberPackageVersionName": "Release",
+                "SubscriberPackageVersionNumber": "1.0.0.1",
+            }
+            for package_id in org["packages"]
+        ]
+    )
+
+
+def component_type(file_name):
+    name = os.path.basename(file_name)
+    for suffix, c_type in (
+        (".cls", "ApexClass"),
+        (".trigger", "ApexTrigger"),
+        (".object-meta.xml", "CustomObject"),
+        (".field-meta.xml", "CustomField"),
+        (".permissionset-meta.xml", "PermissionSet"),
+        (".layout-meta.xml", "Layout"),
+        (".flow-meta.xml", "Flow"),
+        (".js", "LightningComponentBundle"),
+    ):
+        if name.endswith(suffix):
+            return c_type
+
+    return "Unknown"
+
+
+COMPANION_SUFFIXES = (".cls-meta.xml", ".trigger-meta.xml", ".js-meta.xml", ".html", ".css")
+
+
+def source_components(folders):
+    components = []
+    for folder in folders:
+        for root, _dirs, files in os.walk(folder):
+            for file_name in sorted(files):
+                if file_name.startswith(".") or file_name.endswith(COMPANION_SUFFIXES):
+                    continue
+                path = os.path.join(root, file_name)
+                components.append(
+                    {
+                        "changed": True,
+                        "created": True,
+                        "componentType": component_type(path),
+                        "fileName": os.path.relpath(path),
+                        "fullName": file_name.split(".")[0],
+                        "problem": None,
+                        "success": True,
+                    }
+                )
+
+    return components
+
+
+def cmd_project_deploy_start(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    folders = flag_list(flags, "-d", "--source-dir")
+    if not folders:
+        folders = ["force-app"]
+
+    missing = [folder for folder in folders if not os.path.exists(folder)]
+    if missing:
+        return error("ExpectedSourceFilesError", f"{missing[0]}: File or folder not found")
+
+    components = source_components(folders)
+    if not components:
+        return error("NothingToDeploy", "No local changes to deploy.")
+
+    deploy_id = new_id("0Af")
+    if flag(flags, "--async"):
+        seconds = float(os.environ.get("FAKE_SF_DEPLOY_SECONDS", 5))
+        state.setdefault("deploys", {})[deploy_id] = {
+            "org": org["username"],
+            "components": components,
+            "ready_at": time.time() + seconds,
+            "canceled": False,
+        }
+        return ok({"id": deploy_id, "status": "Queued", "success": False, "done": False, "files": []})
+
+    return ok(deploy_result(deploy_id, components))
+
+
+def deploy_result(deploy_id, components):
+    return {
+        "id": deploy_id,
+        "status": "Succeeded",
+        "success": True,
+        "done": True,
+        "numberComponentsDeployed": len(components),
+        "numberComponentErrors": 0,
+        "details": {"componentSuccesses": components, "componentFailures": []},
+        "files": [],
+    }
+
+
+def cmd_project_deploy_report(state, flags):
+    deploy_id = flag(flags, "-i", "--job-id")
+    deploy = state.get("deploys", {}).get(deploy_id)
+    if deploy is None:
+        return error("InvalidIdError", f"Invalid deploy ID: {deploy_id}.")
+
+    if deploy["canceled"]:
+        return ok({"id": deploy_id, "status": "Canceled", "success": False, "done": True, "files": []})
+    if time.time() < deploy["ready_at"]:
+        return ok({"id": deploy_id, "status": "InProgress", "success": False, "done": False, "files": []})
+
+    return ok(deploy_result(deploy_id, deploy["components"]))
+
+
+def cmd_project_deploy_cancel(state, flags):
+    deploy_id = flag(flags, "-i", "--job-id")
+    deploy = state.get("deploys", {}).get(deploy_id)
+    if deploy is None:
+        return error("InvalidIdError", f"Invalid deploy ID: {deploy_id}.")
+    if deploy["canceled"] or time.time() >= deploy["ready_at"]:
+        return error("CannotCancelDeployError", f"Can't cancel deploy {deploy_id} because it's already completed.")
+
+    deploy["canceled"] = True
+
+    return ok({"id": deploy_id, "status": "Canceling", "success": False, "done": False, "files": []})
+
+
+def cmd_project_retrieve_start(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    if flag(flags, "--async"):
+        retrieve_id = new_id("09S")
+        state.setdefault("retrieves", {})[retrieve_id] = {"org": org["username"]}
+        return ok({"id": retrieve_id, "done": False, "status": "Queued", "success": False, "files": []})
+
+    return ok({"done": True, "status": "Succeeded", "success": True, "files": []})
+
+
+def cmd_project_retrieve_resume(state, flags):
+    # Returns once the retrieve is done; use FAKE_SF_LATENCY for its time.
+    retrieve_id = flag(flags, "-i", "--job-id")
+    if retrieve_id not in state.get("retrieves", {}):
+        return error("InvalidIdError", f"Invalid retrieve ID: {retrieve_id}.")
+
+    return ok({"id": retrieve_id, "done": True, "status": "Succeeded", "success": True, "files": []})
+
+
+def cmd_apex_run(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    apex_file = flag(flags, "-f", "--file")
+    if apex_file and not os.path.isfile(apex_file):
+        return error("Error", f"ENOENT: no such file or directory, open '{apex_file}'")
+
+    return ok(
+        {
+            "success": True,
+            "compiled": True,
+            "compileProblem": "",
+            "exceptionMessage": "",
+            "exceptionStackTrace": "",
+            "line": -1,
+            "column": -1,
+            "logs": "58.0 APEX_CODE,DEBUG\nExecute Anonymous: // fake\n",
+        }
+    )
+
+
+def cmd_org_assign_permset(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    successes = []
+    failures = []
+    for pset in flag_list(flags, "-n", "--name"):
+        if pset in org.get("permsets", []):
+            failures.append({"name": pset, "message": "Duplicate PermissionSetAssignment."})
+            continue
+        org.setdefault("permsets", []).append(pset)
+        successes.append({"name": pset, "value": org["username"]})
+
+    result = {"successes": successes, "failures": failures}
+    if failures:
+        return 1, {"status": 1, "result": result, "name": "PermsetAssignmentError", "message": "", "warnings": []}
+
+    return ok(result)
+
+
+def org_summary(org, connected=True):
+    summary = {
+        "alias": org["alias"],
+        "username": org["username"],
+        "orgId": org["orgId"],
+        "instanceUrl": org.get("instanceUrl", "https://fake.my.salesforce.com"),
+        "loginUrl": "https://test.salesforce.com",
+        "isDevHub": org.get("isDevHub", False),
+        "lastUsed": date.today().isoformat(),
+    }
+
+    if org.get("isDevHub"):
+        summary["connectedStatus"] = "Connected" if connected else "Unknown"
+    else:
+        summary["devHubUsername"] = org["devHubUsername"]
+        summary["expirationDate"] = org["expirationDate"]
+        summary["isExpired"] = is_expired(org)
+        summary["status"] = "Expired" if summary["isExpired"] else "Active"
+
+    return summary
+
+
+def cmd_org_list(state, flags):
+    hubs = [org_summary({"alias": alias, **hub, "isDevHub": True}) for alias, hub in state["hubs"].items()]
+    scratch = [org_summary(org) for org in state["orgs"].values()]
+
+    if "--all" not in flags:
+        scratch = [org for org in scratch if not org["isExpired"]]
+
+    return ok({"other": [], "sandboxes": [], "nonScratchOrgs": hubs, "devHubs": hubs, "scratchOrgs": scratch})
+
+
+def cmd_org_display_user(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+    if is_unreachable(org) or is_expired(org):
+        return error(
+            "RefreshTokenAuthError",
+            "Error authenticating with the refresh token due to: expired access/refresh token",
+        )
+
+    return ok(
+        {
+            "accessToken": org.get("accessToken", "00D!fake"),
+            "alias": org["alias"],
+            "id": new_id("005"),
+            "instanceUrl": os.environ.get("FAKE_SF_API_URL") or org.get("instanceUrl", "https://fake.my.salesforce.com"),
+            "loginUrl": "https://test.salesforce.com",
+            "orgId": org["orgId"],
+            "profileName": "System Administrator",
+            "username": org["username"],
+        }
+    )
+
+
+def cmd_org_open(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    return ok({"orgId": org["orgId"], "url": f"{org.get('instanceUrl')}/secur/frontdoor.jsp", "username": org["username"]})
+
+
+def cmd_community_create(state, flags):
+    org, err = require_org(state, flags, "-u", "-o", "--target-org")
+    if err:
+        return err
+
+    name = flag(flags, "-n", "--name")
+    seconds = float(os.environ.get("FAKE_SF_COMMUNITY_SECONDS", 3))
+    org.setdefault("communities", {})[name] = {"status": "UnderConstruction", "ready_at": time.time() + seconds}
+
+    return ok({"message": "Your Site is being created.", "name": name, "action": "Create"})
+
+
+def cmd_community_publish(state, flags):
+    org, err = require_org(state, flags, "-u", "-o", "--target-org")
+    if err:
+        return err
+
+    name = flag(flags, "-n", "--name")
+    org.setdefault("communities", {})[name] = {"status": "Live", "ready_at": 0}
+
+    return ok(
+        {
+            "id": new_id("0DM"),
+            "message": "We're publishing your changes now.",
+            "name": name,
+            "status": "Live",
+            "url": f"{org.get('instanceUrl')}/{name.lower()}",
+        }
+    )
+
+
+def cmd_alias_set(state, flags):
+    results = []
+    for item in flags["_args"]:
+        alias, _, target = item.partition("=")
+        org = find_org(state, target)
+        if org is None or org.get("isDevHub"):
+            return error("NoOrgFound", f"No authorization information found for {target}.")
+        for other in state["orgs"].values():
+            if other["alias"] == alias:
+                other["alias"] = ""
+        org["alias"] = alias
+        results.append({"alias": alias, "value": org["username"], "success": True})
+
+    return ok(results)
+
+
+def cmd_alias_unset(state, flags):
+    results = []
+    for alias in flags["_args"]:
+        for org in state["orgs"].values():
+            if org["alias"] == alias:
+                org["alias"] = ""
+                results.append({"alias": alias, "value": org["username"], "success": True})
+
+    return ok(results)
+
+
+def cmd_org_delete_scratch(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+    if org.get("isDevHub"):
+        return error("NotScratchOrg", f"{org['username']} is not a scratch org.")
+    if is_unreachable(org):
+        return error("ScratchOrgNotFound", f"Attempting to delete an expired or deleted org {org['username']}.")
+
+    del state["orgs"][org["username"]]
+
+    return ok({"orgId": org["orgId"], "username": org["username"]})
+
+
+def cmd_org_logout(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    if org.get("isDevHub"):
+        del state["hubs"][org["alias"]]
+    else:
+        del state["orgs"][org["username"]]
+
+    return ok([org["username"]])
+
+
+def query_network(org, soql):
+    name = re.search(r"Name\s*=\s*'([^']*)'", soql)
+    records = []
+    for network, community in org.get("communities", {}).items():
+        if name and name.group(1) != network:
+            continue
+        if time.time() < community["ready_at"]:
+            continue
+        records.append({"attributes": {"type": "Network"}, "Id": new_id("0DB"), "Name": network, "Status": community["status"]})
+
+    return records
+
+
+def query_subscriber_package_version(org, soql):
+    package_id = re.search(r"Id\s*=\s*'([^']*)'", soql)
+    if package_id is None:
+        return []
+
+    return [
+        {
+            "attributes": {"type": "SubscriberPackageVersion"},
+            "Id": package_id.group(1),
+            "Dependencies": {"ids": [{"subscriberPackageVersionId": dep} for dep in package_depends(package_id.group(1))]},
+        }
+    ]
+
+
+QUERY_OBJECTS = {
+    "Network": query_network,
+    "SubscriberPackageVersion": query_subscriber_package_version,
+}
+
+
+def cmd_data_query(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    soql = flag(flags, "-q", "--query", default="")
+    sobject = re.search(r"\bFROM\s+(\w+)", soql, re.IGNORECASE)
+    if sobject is None:
+        return error("MalformedQuery", f"unexpected token: {soql}")
+
+    handler = QUERY_OBJECTS.get(sobject.group(1))
+    records = handler(org, soql) if handler else []
+
+    return ok({"records": records, "totalSize": len(records), "done": True})
+
+
+def cmd_data_export_tree(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    soql = flag(flags, "-q", "--query", default="")
+    match = re.search(r"SELECT\s+(.+?)\s+FROM\s+(\w+)", soql, re.IGNORECASE)
+    if match is None:
+        return error("MalformedQuery", f"unexpected token: {soql}")
+
+    fields = [f.strip() for f in match.group(1).split(",") if f.strip() != "Id"]
+    sobject = match.group(2)
+    count = int(os.environ.get("FAKE_SF_DATA_RECORDS", 250))
+    records = [
+        {
+            "attributes": {"type": sobject, "referenceId": f"{sobject}Ref{idx + 1}"},
+            **{f: f"{f} {idx}" for f in fields},
+        }
+        for idx in range(count)
+    ]
+
+    output_dir = flag(flags, "-d", "--output-dir", default=".")
+    prefix = flag(flags, "-x", "--prefix")
+    name = f"{prefix}-{sobject}" if prefix else sobject
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, f"{name}.json"), "w") as jsonfile:
+        json.dump({"records": records}, jsonfile)
+
+    if flag(flags, "-p", "--plan"):
+        plan = [{"sobject": sobject, "saveRefs": False, "resolveRefs": False, "files": [f"{name}.json"]}]
+        with open(os.path.join(output_dir, f"{name}-plan.json"), "w") as jsonfile:
+            json.dump(plan, jsonfile)
+
+    return ok(records)
+
+
+def cmd_data_import_tree(state, flags):
+    org, err = require_org(state, flags, "-o", "--target-org")
+    if err:
+        return err
+
+    files = [f for value in flag_list(flags, "-f", "--files") for f in value.split(",")]
+    plan_file = flag(flags, "-p", "--plan")
+    if plan_file:
+        with open(plan_file, "r") as jsonfile:
+            plan = json.load(jsonfile)
+        files += [os.path.join(os.path.dirname(plan_file), f) for entry in plan for f in entry["files"]]
+
+    results = []
+    for path in files:
+        if not os.path.isfile(path):
+            return error("Error", f"ENOENT: no such file or directory, open '{path}'")
+        with open(path, "r") as jsonfile:
+            records = json.load(jsonfile)["records"]
+        if len(records) > 200:
+            return error("DataImportError", f"Data file {path} has {len(records)} records, the limit is 200.")
+        for record in records:
+            sobject = record["attributes"]["type"]
+            data = org.setdefault("data", {})
+            data[sobject] = data.get(sobject, 0) + 1
+            results.append({"refId": record["attributes"].get("referenceId"), "type": sobject, "id": new_id("001")})
+
+    return ok(results)
+
+
+COMMANDS = {
+    "alias:set": cmd_alias_set,
+    "alias:unset": cmd_alias_unset,
+    "apex:run": cmd_apex_run,
+    "community:create": cmd_community_create,
+    "community:publish": cmd_community_publish,
+    "data:export:tree": cmd_data_export_tree,
+    "data:import:tree": cmd_data_import_tree,
+    "data:query": cmd_data_query,
+    "force:community:create": cmd_community_create,
+    "force:community:publish": cmd_community_publish,
+    "org:assign:permset": cmd_org_assign_permset,
+    "org:create:scratch": cmd_org_create_scratch,
+    "org:create:snapshot": cmd_org_create_snapshot,
+    "org:delete:scratch": cmd_org_delete_scratch,
+    "org:delete:snapshot": cmd_org_delete_snapshot,
+    "org:display:user": cmd_org_display_user,
+    "org:get:snapshot": cmd_org_get_snapshot,
+    "org:list": cmd_org_list,
+    "org:list:limits": cmd_org_list_limits,
+    "org:logout": cmd_org_logout,
+    "org:open": cmd_org_open,
+    "package:install": cmd_package_install,
+    "package:install:report": cmd_package_install_report,
+    "package:installed:list": cmd_package_installed_list,
+    "project:deploy:cancel": cmd_project_deploy_cancel,
+    "project:deploy:report": cmd_project_deploy_report,
+    "project:deploy:start": cmd_project_deploy_start,
+    "project:retrieve:resume": cmd_project_retrieve_resume,
+    "project:retrieve:start": cmd_project_retrieve_start,
+}
+
+
+#
+# Stub REST API
+#
+
+
+def api_query_permission_set(state, org, soql):
+    names = re.search(r"Name\s+IN\s*\(([^)]*)\)", soql, re.IGNORECASE)
+    records = []
+    for name in re.findall(r"'([^']*)'", names.group(1) if names else ""):
+        pset_id = "0PS" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:15].upper()
+        state.setdefault("permset_ids", {})[pset_id] = name
+        records.append({"attributes": {"type": "PermissionSet"}, "Id": pset_id, "Name": name})
+
+    return records
+
+
+def api_query_installed_packages(state, org, soql):
+    return [
+        {
+            "attributes": {"type": "InstalledSubscriberPackage"},
+            "Id": new_id("0A3"),
+            "SubscriberPackageId": "033" + package_id[3:],
+            "SubscriberPackage": {"Name": f"Package {package_id[-4:]}", "NamespacePrefix": None},
+            "SubscriberPackageVersion": {
+                "Id": package_id,
+                "Name": "Release",
+                "MajorVersion": 1,
+                "MinorVersion": 0,
+                "PatchVersion": 0,
+                "BuildNumber": 1,
+            },
+        }
+        for package_id in org["packages"]
+    ]
+
+
+API_QUERY_OBJECTS = {
+    "InstalledSubscriberPackage": api_query_installed_packages,
+    "PermissionSet": api_query_permission_set,
+}
+
+
+def api_query(state, org, params):
+    soql = params.get("q", [""])[0]
+    sobject = re.search(r"\bFROM\s+(\w+)", soql, re.IGNORECASE)
+    if sobject is None:
+        return 400, [{"errorCode": "MALFORMED_QUERY", "message": f"unexpected token: {soql}"}]
+
+    if sobject.group(1) in API_QUERY_OBJECTS:
+        records = API_QUERY_OBJECTS[sobject.group(1)](state, org, soql)
+    else:
+        handler = QUERY_OBJECTS.get(sobject.group(1))
+        records = handler(org, soql) if handler else []
+
+    return 200, {"records": records, "totalSize": len(records), "done": True}
+
+
+def api_execute_anonymous(state, org, params):
+    failure = injected_failure("apex:run")
+
+    return 200, {
+        "line": -1,
+        "column": -1,
+        "compiled": True,
+        "success": failure is None,
+        "compileProblem": None,
+        "exceptionMessage": f"{failure}: Injected failure for apex:run" if failure else None,
+        "exceptionStackTrace": "AnonymousBlock: line 1, column 1" if failure else None,
+    }
+
+
+def api_composite_sobjects(state, org, body):
+    results = []
+    for record in body["records"]:
+        name = state.get("permset_ids", {}).get(record.get("PermissionSetId"))
+        if record["attributes"]["type"] != "PermissionSetAssignment" or name is None:
+            results.append({"success": False, "errors": [{"statusCode": "INVALID_ID_FIELD", "message": "Invalid id"}]})
+        elif name in org.setdefault("permsets", []):
+            results.append(
+                {"success": False, "errors": [{"statusCode": "DUPLICATE_VALUE", "message": "duplicate value found"}]}
+            )
+        else:
+            org["permsets"].append(name)
+            results.append({"id": new_id("0Pa"), "success": True, "errors": []})
+
+    return 200, results
+
+
+def api_package_install_request(state, org, request_id):
+    exit_code, payload = cmd_package_install_report(state, {"-i": [request_id]})
+    if exit_code:
+        return 404, [{"errorCode": "NOT_FOUND", "message": payload["message"]}]
+
+    return 200, payload["result"]
+
+
+def api_route(state, org, method, path, params, body):
+    if method == "GET" and path in ("query", "tooling/query"):
+        return api_query(state, org, params)
+    if method == "GET" and path == "tooling/executeAnonymous":
+        return api_execute_anonymous(state, org, params)
+    if method == "POST" and path == "composite/sobjects":
+        return api_composite_sobjects(state, org, body)
+    if method == "GET" and path.startswith("tooling/sobjects/PackageInstallRequest/"):
+        return api_package_install_request(state, org, path.rsplit("/", 1)[1])
+
+    return 404, [{"errorCode": "NOT_FOUND", "message": f"The requested resource does not exist: {path}"}]
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_api("GET")
+
+    def do_POST(self):
+        self.handle_api("POST")
+
+    def handle_api(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        url = urlparse(self.path)
+        path = re.sub(r"^/services/data/v[\d.]+/", "", url.path).rstrip("/")
+        token = self.headers.get("Authorization", "").replace("Bearer ", "", 1)
+
+        latency = os.environ.get("FAKE_SF_API_LATENCY")
+        if latency:
+            time.sleep(float(latency))
+
+        with local_state.file_lock(os.path.join(fake_home(), "state.json")):
+            state = load_state()
+            org = next((o for o in state["orgs"].values() if o.get("accessToken") == token), None)
+            if org is None:
+                status, payload = 401, [{"errorCode": "INVALID_SESSION_ID", "message": "Session expired or invalid"}]
+            else:
+                status, payload = api_route(state, org, method, path, parse_qs(url.query), body)
+                save_state(state)
+
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_api_server(port=0):
+    # Serves the stub REST API on a background thread, returns the server.
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeApiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+#
+# Record / replay
+#
+
+
+def recording_key(argv):
+    return hashlib.sha1(" ".join(argv).encode("utf-8")).hexdigest()
+
+
+def replay(argv):
+    replay_dir = os.environ.get("FAKE_SF_REPLAY")
+    if not replay_dir:
+        return None
+
+    path = os.path.join(replay_dir, f"{recording_key(argv)}.json")
+    if not os.path.isfile(path):
+        return None
+
+    with open(path, "r") as jsonfile:
+        return json.load(jsonfile)
+
+
+def record(argv):
+    out = subprocess.run(
+        [os.environ["FAKE_SF_REAL_CMD"], *argv],
+        capture_output=True,
+        encoding="utf-8",
+    )
+
+    recording = {"args": argv, "returncode": out.returncode, "stdout": out.stdout, "stderr": out.stderr}
+
+    record_dir = os.environ["FAKE_SF_RECORD"]
+    os.makedirs(record_dir, exist_ok=True)
+    with open(os.path.join(record_dir, f"{recording_key(argv)}.json"), "w") as jsonfile:
+        json.dump(recording, jsonfile, indent=2)
+
+    return recording
+
+
+def simulate(argv):
+    command, flags = parse_args(argv)
+
+    latency = setting_for(command, os.environ.get("FAKE_SF_LATENCY"))
+    if latency:
+        time.sleep(float(latency))
+
+    handler = COMMANDS.get(command)
+    if handler is None:
+        return error("CommandNotFound", f"Command {command} not found.", 127)
+
+    failure = injected_failure(command)
+    if failure:
+        return error(failure, f"Injected failure for {command}")
+
+    with local_state.file_lock(os.path.join(fake_home(), "state.json")):
+        state = load_state()
+        exit_code, payload = handler(state, flags)
+        save_state(state)
+
+    return exit_code, payload
+
+
+def install_shim(directory):
+    # Write an executable that sfdx_cli_utils.SFDX_CMD can point at.
+    os.makedirs(directory, exist_ok=True)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    if sys.platform == "win32":
+        path = os.path.join(directory, "sf.cmd")
+        with open(path, "w") as shim:
+            shim.write(f'@set PYTHONPATH={package_root};%PYTHONPATH%\r\n@"{sys.executable}" -m sf_org_manager.fake_sf %*\r\n')
+    else:
+        path = os.path.join(directory, "sf")
+        with open(path, "w") as shim:
+            shim.write(f'#!/bin/sh\nPYTHONPATH="{package_root}:$PYTHONPATH" exec "{sys.executable}" -m sf_org_manager.fake_sf "$@"\n')
+        os.chmod(path, 0o755)
+
+    return path
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if argv[:1] == ["--serve-api"]:
+        server = ThreadingHTTPServer(("127.0.0.1", int(argv[1]) if len(argv) > 1 else 8080), FakeApiHandler)
+        print(f"Fake REST API on http://127.0.0.1:{server.server_address[1]}", flush=True)
+        server.serve_forever()
+        return 0
+
+    recording = replay(argv)
+    if recording is None and os.environ.get("FAKE_SF_RECORD"):
+        recording = record(argv)
+
+    if recording is not None:
+        sys.stdout.write(recording["stdout"])
+        sys.stderr.write(recording["stderr"])
+        return recording["returncode"]
+
+    exit_code, payload = simulate(argv)
+    print(json.dumps(payload, indent=2))
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# fleet.py
+__version__ = "0.0.3"
+
+#
+# Builds many scratch orgs at once. Each org is built by its own
+# org_builder process, with its own log, so a failure in one org does not
+# stop the others.
+#
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import yaml
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def requested(args):
+    return bool(args.count or args.org or args.fleet)
+
+
+def fleet_orgs(args):
+    orgs = []
+
+    if args.count:
+        for n in range(1, args.count + 1):
+            orgs.append((args.alias_pattern.format(n=n), args.scratch_def))
+
+    for item in args.org or []:
+        alias, _, scratch_def = item.partition("=")
+        orgs.append((alias, scratch_def or args.scratch_def))
+
+    if args.fleet:
+        with open(args.fleet, "r") as ymlfile:
+            for item in yaml.safe_load(ymlfile) or []:
+                orgs.append((item["alias"], item.get("scratch_def") or args.scratch_def))
+
+    aliases = [alias for alias, _ in orgs]
+    duplicates = sorted({alias for alias in aliases if aliases.count(alias) > 1})
+    if duplicates:
+        logging.error(f"Duplicate fleet aliases {duplicates}")
+        sys.exit(1)
+
+    return orgs
+
+
+def child_cmd(args, alias, scratch_def):
+    cmd = [
+        sys.executable,
+        "-m",
+        "sf_org_manager.org_builder",
+        "-c",
+        args.config,
+        "-a",
+        alias,
+        "-f",
+        scratch_def,
+        "-d",
+        str(args.duration),
+    ]
+
+    if args.devhub:
+        cmd += ["-v", args.devhub]
+
+    if args.email:
+        cmd += ["-e", args.email]
+    if args.skip:
+        cmd.append("--skip")
+    if args.redeploy:
+        cmd.append("--redeploy")
+    if args.resume:
+        cmd.append("--resume")
+    if args.snapshot:
+        cmd.append("--snapshot")
+    if args.trace:
+        root, ext = os.path.splitext(args.trace)
+        cmd += ["--trace", f"{root}-{alias}{ext or '.json'}"]
+    if args.debug:
+        cmd.append("--debug")
+
+    return cmd
+
+
+def build_org(cmd, alias, scratch_def, log_dir):
+    log_file = os.path.join(log_dir, f"{alias}.log")
+    logging.error(f"~~~ Building ({alias}) ~~~")
+
+    start = time.perf_counter()
+    with open(log_file, "w") as log:
+        out = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT)
+
+    result = {
+        "alias": alias,
+        "scratch_def": scratch_def,
+        "exit_code": out.returncode,
+        "status": "Complete" if out.returncode == 0 else "Failed",
+        "seconds": round(time.perf_counter() - start, 1),
+        "log": log_file,
+    }
+
+    with open(os.path.join(log_dir, f"{alias}.json"), "w") as jsonfile:
+        json.dump(result, jsonfile, indent=2)
+
+    logging.error(f"~~~ {result['status']} ({alias}) in {result['seconds']}s ~~~")
+
+    return result
+
+
+def print_results(results):
+    print()
+    print(f"{'Alias':<30} {'Scratch Def':<40} {'Status':<10} {'Seconds':>8}  Log")
+    print(f"{'-----':<30} {'-----------':<40} {'------':<10} {'-------':>8}  ---")
+    for r in results:
+        print(f"{r['alias']:<30} {r['scratch_def']:<40} {r['status']:<10} {r['seconds']:>8}  {r['log']}")
+    print()
+
+
+def run(args):
+    orgs = fleet_orgs(args)
+    os.makedirs(args.log_dir, exist_ok=True)
+
+    logging.error(f"~~~ Building {len(orgs)} Scratch Orgs, {args.workers} at a time ~~~")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            pool.submit(build_org, child_cmd(args, alias, scratch_def), alias, scratch_def, args.log_dir)
+            for alias, scratch_def in orgs
+        ]
+        results = [future.result() for future in futures]
+
+    with open(os.path.join(args.log_dir, "fleet.json"), "w") as jsonfile:
+        json.dump(results, jsonfile, indent=2)
+
+    print_results(results)
+
+    return 1 if any(r["exit_code"] != 0 for r in results) else 0
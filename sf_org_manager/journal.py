@@ -0,0 +1,126 @@
+# journal.py
+__version__ = "0.0.3"
+
+#
+# Records each completed build step of an alias, with a fingerprint of its
+# inputs, so an interrupted build can be resumed at the first step that is
+# unfinished or whose inputs changed.
+#
+
+import hashlib
+import json
+import logging
+import os
+
+from . import local_state
+from .scheduler import Step
+
+# Config
+#
+# Steps that run on every build, even when resuming.
+ALWAYS_RUN = ("details",)
+#
+
+
+def journal_file(alias):
+    return local_state.state_path("journals", f"{alias}.json")
+
+
+def value_fingerprint(value, org_names=()):
+    # The org's alias & username are left out, so an org built from a
+    # snapshot of another org can reuse its journal.
+    if isinstance(value, str) and value in org_names:
+        return '"<org>"'
+    if isinstance(value, str) and os.path.isfile(value):
+        return f"file:{local_state.hash_files(value)}"
+    if isinstance(value, str) and os.path.isdir(value):
+        return f"folder:{local_state.hash_folder(value)}"
+    if isinstance(value, (list, tuple)):
+        return json.dumps([value_fingerprint(item, org_names) for item in value])
+
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def fingerprint(s, org_names=()):
+    # timed() steps carry the function and arguments they wrap.
+    func, args = getattr(s.func, "inputs", (s.func, s.args))
+
+    digest = hashlib.sha256(func.__name__.encode("utf-8"))
+    for arg in args:
+        digest.update(value_fingerprint(arg, org_names).encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+def all_completed(steps, completed, alias, username):
+    return bool(steps) and all(completed.get(s.name) == fingerprint(s, (alias, username)) for s in steps)
+
+
+def start(alias, username, resume):
+    # Completed steps that may be skipped, and a fresh journal otherwise.
+    path = journal_file(alias)
+
+    with local_state.file_lock(path):
+        journal = local_state.read_json(path, {})
+        if resume and journal.get("username") == username:
+            return journal.get("steps", {})
+
+        local_state.write_json(path, {"username": username, "steps": {}})
+
+    return {}
+
+
+def completed_steps(alias, username):
+    journal = local_state.read_json(journal_file(alias), {})
+    if journal.get("username") != username:
+        return {}
+
+    return journal.get("steps", {})
+
+
+def seed(alias, username, steps):
+    # Start the journal of a new org with the steps already done in it,
+    # e.g. by the build its snapshot was taken from.
+    path = journal_file(alias)
+
+    with local_state.file_lock(path):
+        local_state.write_json(path, {"username": username, "steps": dict(steps)})
+
+
+def record(alias, username, name, step_fingerprint):
+    path = journal_file(alias)
+
+    with local_state.file_lock(path):
+        journal = local_state.read_json(path, {})
+        if journal.get("username") != username:
+            journal = {"username": username, "steps": {}}
+        journal["steps"][name] = step_fingerprint
+        local_state.write_json(path, journal)
+
+
+def journaled(alias, username, steps, graph, completed):
+    # Wrap each step to record its completion. A step is skipped if it
+    # completed with the same inputs and every step it depends on is skipped.
+    fingerprints = {s.name: fingerprint(s, (alias, username)) for s in steps}
+    skipped = {}
+
+    def can_skip(name):
+        if name not in skipped:
+            skipped[name] = (
+                name not in ALWAYS_RUN
+                and completed.get(name) == fingerprints[name]
+                and all(can_skip(dep) for dep in graph[name])
+            )
+        return skipped[name]
+
+    def wrap(s):
+        def run():
+            if can_skip(s.name):
+                logging.error(f"~~~ Skipping {s.name}, complete in last run ~~~")
+                return
+            s.func(*s.args)
+            record(alias, username, s.name, fingerprints[s.name])
+
+        return Step(s.name, run, group=s.group, depends=s.depends)
+
+    return [wrap(s) for s in steps]
@@ -0,0 +1,179 @@
+# local_auth.py
+__version__ = "0.0.3"
+
+#
+# Reads the sf CLI's alias & auth files (~/.sfdx/alias.json and one
+# ~/.sfdx/<username>.json per authorized org) to answer "which orgs exist,
+# and who is the user behind this alias" without starting the CLI. Nothing
+# here talks to an org, so connection status still needs `sf org list`.
+#
+
+import json
+import logging
+import os
+import threading
+
+from datetime import date
+
+# Home folder the CLI keeps .sfdx & .sf in. Point SF_ORG_BUILDER_AUTH_HOME
+# at another folder for fixtures or the fake sf CLI.
+AUTH_HOME_ENV = "SF_ORG_BUILDER_AUTH_HOME"
+
+# Files in .sfdx that are not org auth files.
+NOT_AUTH_FILES = ("alias.json", "sfdx-config.json", "key.json", "stash.json")
+
+_index = None
+_index_key = None
+_lock = threading.Lock()
+
+
+def auth_home():
+    return os.environ.get(AUTH_HOME_ENV) or os.path.expanduser("~")
+
+
+def sfdx_dir():
+    return os.path.join(auth_home(), ".sfdx")
+
+
+def available():
+    return os.path.isdir(sfdx_dir())
+
+
+def read_json(path):
+    try:
+        with open(path, "r") as jsonfile:
+            return json.load(jsonfile)
+    except (OSError, ValueError):
+        return None
+
+
+def auth_files(folder):
+    with os.scandir(folder) as entries:
+        return sorted(
+            entry.path
+            for entry in entries
+            if entry.name.endswith(".json") and "@" in entry.name and entry.name not in NOT_AUTH_FILES
+        )
+
+
+def files_key(folder):
+    # Changes whenever an alias, auth or config file is added, removed or written.
+    paths = [os.path.join(folder, "alias.json"), *auth_files(folder), *config_files()]
+    key = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        key.append((path, stat.st_mtime_ns, stat.st_size))
+
+    return tuple(key)
+
+
+def config_files():
+    # Global config first, the project's config wins.
+    return [os.path.join(auth_home(), ".sf", "config.json"), os.path.join(".sf", "config.json")]
+
+
+def defaults():
+    config = {}
+    for path in config_files():
+        config.update(read_json(path) or {})
+
+    return config.get("target-org"), config.get("target-dev-hub")
+
+
+def org_entry(auth, aliases):
+    username = auth["username"]
+    org = {
+        "alias": aliases.get(username, ""),
+        "username": username,
+        "orgId": auth.get("orgId", ""),
+        "instanceUrl": auth.get("instanceUrl", ""),
+        "loginUrl": auth.get("loginUrl", ""),
+        "isDevHub": auth.get("isDevHub", False),
+        "isScratch": "expirationDate" in auth or "devHubUsername" in auth,
+    }
+
+    if org["isScratch"]:
+        org["devHubUsername"] = auth.get("devHubUsername", "")
+        org["expirationDate"] = auth.get("expirationDate", "")
+        org["isExpired"] = bool(org["expirationDate"]) and org["expirationDate"] < date.today().isoformat()
+        org["status"] = "Expired" if org["isExpired"] else "Active"
+
+    return org
+
+
+def build_index(folder):
+    alias_map = (read_json(os.path.join(folder, "alias.json")) or {}).get("orgs", {})
+
+    # Several aliases can point at one username, the CLI shows the last set.
+    aliases = {username: alias for alias, username in alias_map.items()}
+
+    orgs = {}
+    for path in auth_files(folder):
+        auth = read_json(path)
+        if not auth or "username" not in auth:
+            logging.debug(f"Skipping auth file {path}")
+            continue
+        orgs[auth["username"]] = org_entry(auth, aliases)
+
+    target_org, target_dev_hub = defaults()
+    for org in orgs.values():
+        if target_dev_hub in (org["alias"], org["username"]):
+            org["defaultMarker"] = "(D)"
+        if target_org in (org["alias"], org["username"]):
+            org["defaultMarker"] = "(U)"
+
+    return {"orgs": orgs, "aliases": alias_map}
+
+
+def index():
+    # alias & username -> org, rebuilt when the files change.
+    global _index, _index_key
+
+    folder = sfdx_dir()
+    key = files_key(folder)
+
+    with _lock:
+        if _index is None or key != _index_key:
+            logging.debug(f"Indexing auth files in {folder}")
+            _index = build_index(folder)
+            _index_key = key
+
+        return _index
+
+
+def resolve(target):
+    # The org for an alias or username, or None.
+    if not available():
+        return None
+
+    idx = index()
+    username = idx["aliases"].get(target, target)
+    org = idx["orgs"].get(username)
+
+    return dict(org) if org else None
+
+
+def org_list():
+    # Shaped like `sf org list --all --json`, without connectedStatus. None
+    # when there is no .sfdx folder to read.
+    if not available():
+        return None
+
+    orgs = [dict(org) for org in index()["orgs"].values()]
+    scratch_orgs = [org for org in orgs if org["isScratch"]]
+    non_scratch_orgs = [org for org in orgs if not org["isScratch"]]
+
+    return {
+        "status": 0,
+        "result": {
+            "other": [],
+            "sandboxes": [],
+            "nonScratchOrgs": non_scratch_orgs,
+            "devHubs": [org for org in non_scratch_orgs if org["isDevHub"]],
+            "scratchOrgs": scratch_orgs,
+        },
+        "warnings": [],
+    }
@@ -0,0 +1,121 @@
+# local_state.py
+__version__ = "0.0.3"
+
+#
+# Files kept between runs (org pool, manifests, caches) live in a per user
+# folder. Writes are atomic and can be guarded by a cross-process lock.
+#
+
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+
+from contextlib import contextmanager
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+def home_dir():
+    home = os.environ.get("SF_ORG_BUILDER_HOME")
+
+    if not home and platform.system() == "Windows":
+        home = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "sf_org_manager")
+    if not home and platform.system() == "Darwin":
+        home = os.path.join(os.path.expanduser("~/Library/Caches"), "sf_org_manager")
+    if not home:
+        home = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "sf_org_manager")
+
+    os.makedirs(home, exist_ok=True)
+    return home
+
+
+def state_dir(*parts):
+    path = os.path.join(home_dir(), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def state_path(*parts):
+    path = os.path.join(home_dir(), *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+@contextmanager
+def file_lock(path):
+    # Exclusive lock on <path>.lock, held across processes.
+    with open(f"{path}.lock", "a+") as lock_file:
+        if sys.platform == "win32":
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def read_json(path, default=None):
+    if not os.path.isfile(path):
+        return default
+
+    try:
+        with open(path, "r") as jsonfile:
+            return json.load(jsonfile)
+    except ValueError:
+        return default
+
+
+def write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as jsonfile:
+            json.dump(data, jsonfile, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def hash_files(*paths):
+    # Hash of the files' content, in order.
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+
+    return digest.hexdigest()
+
+
+def hash_folder(folder):
+    # Hash of every file's relative path and content under folder.
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, folder).replace(os.sep, "/").encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+
+    return digest.hexdigest()
+
+
+def project_folders(dir_path):
+    # The packageDirectories of the sfdx-project.json in dir_path.
+    project = read_json(os.path.join(dir_path, "sfdx-project.json"), {})
+    folders = [os.path.join(dir_path, d["path"]) for d in project.get("packageDirectories", []) if "path" in d]
+
+    return [folder for folder in folders if os.path.isdir(folder)]
@@ -0,0 +1,159 @@
+# maintenance.py
+__version__ = "0.0.3"
+
+#
+# `sf-orgs --maintain`. Checks every authorized org's connection at once,
+# at most --workers sf commands at a time, then cleans up the dead ones:
+# expired & unreachable scratch orgs are deleted (freeing their Dev Hub
+# allocation), or logged out when the Dev Hub no longer knows them.
+# Unreachable non-scratch orgs are only logged out with --logout-unreachable.
+# An org is only unreachable when its auth is rejected; any other failure
+# (network, timeout) leaves it Unknown and kept. Ends with a summary table.
+#
+
+import asyncio
+import logging
+
+from collections import Counter
+
+from . import local_auth
+from . import retry
+from . import sfdx_cli_utils as sfdx
+from .errors import SfdxError
+
+# Config
+#
+TGREEN = "\033[1;32m"
+TRED = "\033[1;31m"
+TYELLOW = "\033[1;33m"
+ENDC = "\033[m"
+# sf errors meaning the org's auth is gone, rather than a passing outage.
+AUTH_ERRORS = ("NoOrgFound", "NamedOrgNotFound", "NoAuthInfoFound", "INVALID_SESSION_ID", "RefreshTokenAuthError")
+AUTH_MESSAGES = ("INVALID_SESSION_ID", "expired access/refresh token", "invalid_grant")
+# sf errors of a delete meaning the Dev Hub no longer knows the org.
+GONE_ERRORS = ("ScratchOrgNotFound", "NoOrgFound")
+#
+
+CONNECTED = "Connected"
+EXPIRED = "Expired"
+UNREACHABLE = "Unreachable"
+UNKNOWN = "Unknown"
+
+
+def all_orgs():
+    py_obj = local_auth.org_list() or sfdx.org_list(fresh=True)
+    result = py_obj["result"]
+
+    orgs = [dict(org, isScratch=False) for org in result.get("nonScratchOrgs", [])]
+    orgs += [dict(org, isScratch=True) for org in result.get("scratchOrgs", [])]
+
+    return orgs
+
+
+def is_auth_error(py_obj):
+    message = py_obj.get("message") or ""
+    return py_obj.get("name") in AUTH_ERRORS or any(m in message for m in AUTH_MESSAGES)
+
+
+def is_gone_error(py_obj):
+    return py_obj.get("name") in GONE_ERRORS or "expired or deleted" in (py_obj.get("message") or "")
+
+
+async def check_org(org):
+    # Expired scratch orgs are not worth a CLI call.
+    if org.get("isExpired"):
+        return EXPIRED, ""
+
+    py_obj = await sfdx.user_details_async(org["username"])
+    if py_obj["status"] == 0:
+        return CONNECTED, ""
+    # A timeout or dropped connection says nothing about the org.
+    if is_auth_error(py_obj) and not retry.retryable(SfdxError.from_result(py_obj)):
+        return UNREACHABLE, py_obj.get("message", "")
+
+    logging.info(f"Unable to check {org['username']}, keeping it ~ {py_obj.get('message')}")
+    return UNKNOWN, py_obj.get("message", "")
+
+
+def plan_action(org, health, args):
+    if health in (CONNECTED, UNKNOWN):
+        return None
+    if org["isScratch"]:
+        return "delete"
+    if args.logout_unreachable:
+        return "logout"
+
+    return None
+
+
+async def clean_org(org, action):
+    if action == "delete":
+        py_obj = await sfdx.delete_org_async(org["username"])
+        if py_obj["status"] == 0:
+            return "Deleted"
+        # Only an org the Dev Hub no longer knows is logged out instead.
+        if not is_gone_error(py_obj):
+            logging.error(f"Unable to delete {org['username']} ~ MESSAGE: {py_obj.get('message')}")
+            return "Failed"
+        logging.info(f"Unable to delete {org['username']} ~ {py_obj.get('message')}, logging out")
+
+    py_obj = await sfdx.logout_org_async(org["username"])
+    if py_obj["status"] == 0:
+        return "Logged out"
+
+    logging.error(f"Unable to log out {org['username']} ~ MESSAGE: {py_obj.get('message')}")
+    return "Failed"
+
+
+async def maintain_org(org, args):
+    health, message = await check_org(org)
+    action = plan_action(org, health, args)
+
+    if action is None:
+        outcome = "Kept"
+    elif args.dry_run:
+        outcome = f"Would {action}"
+    else:
+        outcome = await clean_org(org, action)
+
+    return {**org, "health": health, "message": message, "outcome": outcome}
+
+
+async def maintain_async(orgs, args):
+    return await asyncio.gather(*[maintain_org(org, args) for org in orgs])
+
+
+def color_for(text):
+    if text in (CONNECTED, "Kept", "Deleted", "Logged out"):
+        return TGREEN
+    if text.startswith("Would") or text == UNKNOWN:
+        return TYELLOW
+    return TRED
+
+
+def print_summary(results):
+    print()
+    print(f"{'Alias':<30} {'Username':<45} {'Expiration':<12} {'Health':<12} {'Action':<12}")
+    print(f"{'-----':<30} {'--------':<45} {'----------':<12} {'------':<12} {'------':<12}")
+    for r in results:
+        print(
+            f"{r.get('alias', ''):<30} {r['username']:<45} {r.get('expirationDate', ''):<12} "
+            f"{color_for(r['health'])}{r['health']:<12}{ENDC} {color_for(r['outcome'])}{r['outcome']:<12}{ENDC}"
+        )
+    print()
+
+    counts = Counter(r["outcome"] for r in results)
+    print(", ".join(f"{outcome} {count}" for outcome, count in sorted(counts.items())))
+    print()
+
+
+def run(args):
+    sfdx.set_max_concurrent_cmds(args.workers)
+
+    orgs = all_orgs()
+    logging.error(f"~~~ Checking {len(orgs)} orgs, {args.workers} at a time ~~~")
+
+    results = asyncio.run(maintain_async(orgs, args))
+    print_summary(results)
+
+    return 1 if any(r["outcome"] == "Failed" for r in results) else 0
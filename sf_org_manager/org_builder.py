@@ -5,9 +5,29 @@ import argparse
 import logging
 import os
 import sys
+import time
 import yaml
 
+from collections import Counter
+from contextlib import contextmanager
+
+from . import build_history
+from . import data_snapshot
+from . import deploy_planner
+from . import devhub_balancer
+from . import fleet
+from . import journal
+from . import local_auth
+from . import local_state
+from . import org_snapshot
+from . import package_installer
+from . import polling
+from . import retry
 from . import sfdx_cli_utils as sfdx
+from . import source_manifest
+from . import tracing
+from .errors import BuildError, SfdxError
+from .scheduler import Step, resolve, run_steps
 
 # Set the Log level
 #
@@ -16,13 +36,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger()
 
-parser = argparse.ArgumentParser(
-    prog="org_builder",
-    description="""
-Python wrapper for a number of Salesforce CLI (sfdx) commands,
- to build and setup Scratch Orgs.
-    """,
-)
+# Config
+#
+# Max permission sets assigned by one `sf org assign permset` call.
+PSET_BATCH_SIZE = 50
+#
+
+# (step, seconds) for each step of the last main() run.
+STEP_TIMINGS = []
+# step -> (stage, target) for the build history.
+STEP_KEYS = {}
+
+# Default ordering of the build stages. Entries in the config STEP_DEPENDS
+# are added to these, keyed by stage or step name.
+BUILD_DEPENDS = {
+    "packages": [],
+    "pre_deploy": ["packages"],
+    "package_p_sets": ["packages"],
+    "source_push": ["pre_deploy"],
+    "src_folders": ["source_push"],
+    "p_sets": ["src_folders"],
+    "community": ["src_folders"],
+    "build_data": ["src_folders", "package_p_sets"],
+    "site_publish": ["community", "build_data"],
+    "post_deploy": ["build_data", "site_publish", "p_sets", "package_p_sets"],
+    "details": ["post_deploy"],
+}
 
 
 def get_config(config_file):
@@ -36,7 +75,14 @@ def get_config(config_file):
     return cfg
 
 
-def setup_args(cfg):
+def setup_args(cfg, config_file="./org_config.yml"):
+    parser = argparse.ArgumentParser(
+        prog="org_builder",
+        description="""
+Python wrapper for a number of Salesforce CLI (sfdx) commands,
+ to build and setup Scratch Orgs.
+    """,
+    )
     parser.add_argument(
         "-a",
         "--alias",
@@ -53,8 +99,8 @@ def setup_args(cfg):
     parser.add_argument(
         "-v",
         "--devhub",
-        help=f"Target dev hub username or alias. Default: {cfg['DEVHUB']}",
-        default=cfg["DEVHUB"],
+        help=f"Target dev hub username or alias. Default: {devhub_balancer.default_devhub(cfg) or 'DEVHUBS'}",
+        default=devhub_balancer.default_devhub(cfg),
         type=str,
     )
     parser.add_argument(
@@ -63,29 +109,97 @@ def setup_args(cfg):
         help="Email address that will be applied to the org's admin user",
         type=str,
     )
+    parser.add_argument(
+        "-f",
+        "--scratch-def",
+        help=f"Scratch org definition file. Default: {cfg['SCRATCH_DEF']}",
+        default=cfg["SCRATCH_DEF"],
+        type=str,
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        help=f"Config file. Default: {config_file}",
+        default=config_file,
+        type=str,
+    )
     parser.add_argument("--debug", help="Turn on debug messages", action="store_true")
     parser.add_argument("--skip", help="Skip source deploy", action="store_true")
+    parser.add_argument(
+        "--resume", help="Skip the steps completed by the last run, unless their inputs changed", action="store_true"
+    )
+    parser.add_argument(
+        "--redeploy", help="Deploy every source folder, even if unchanged since the last deploy", action="store_true"
+    )
+    parser.add_argument("--trace", help="Write a Chrome trace of the build steps & sf commands to this file", type=str)
+    parser.add_argument(
+        "--snapshot",
+        help="Create the org from the latest matching org snapshot, and snapshot it once built",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stats", help="Show p50/p95 step times of past builds (of --alias, if given)", action="store_true"
+    )
+    parser.add_argument(
+        "--plan", help="Show the steps a new org would run, with times estimated from past builds", action="store_true"
+    )
 
+    fleet_args = parser.add_argument_group("fleet", "Build many scratch orgs in parallel")
+    fleet_args.add_argument("--count", help="Number of orgs to build from --alias-pattern", type=int)
+    fleet_args.add_argument(
+        "--alias-pattern",
+        help="Alias of each org, {n} is replaced by 1..count. Default: scratch-{n}",
+        default="scratch-{n}",
+        type=str,
+    )
+    fleet_args.add_argument(
+        "--org",
+        help="ALIAS or ALIAS=SCRATCH_DEF of an org to build, can be repeated",
+        action="append",
+        type=str,
+    )
+    fleet_args.add_argument("--fleet", help="YAML list of {alias, scratch_def} orgs to build", type=str)
+    fleet_args.add_argument("--workers", help="Orgs built at the same time. Default: 4", default=4, type=int)
+    fleet_args.add_argument(
+        "--log-dir",
+        help="Folder for the log and result of each org. Default: fleet_logs",
+        default="fleet_logs",
+        type=str,
+    )
 
-def check_install(org_alias, status_id):
-    py_obj = sfdx.check_install(org_alias, status_id)
+    return parser
 
-    if py_obj["status"] == 1:
-        message = py_obj["message"]
-        logging.error(f"MESSAGE: {message}")
-        logging.warning(f"{py_obj}")
-        sys.exit(1)
 
-    if py_obj["status"] == 0:
-        status = py_obj["result"]["Status"]
+@contextmanager
+def step(name):
+    logging.error(f"~~~ {name} ~~~")
+    start = time.perf_counter()
+    try:
+        with tracing.span(name, "step"):
+            yield
+    finally:
+        STEP_TIMINGS.append((name, time.perf_counter() - start))
+
 
-    logging.error(f"Checking package install status ~ {status}")
+def timed(title, func, *args):
+    def run():
+        with step(title):
+            func(*args)
 
-    return status
+    run.title = title
+    run.inputs = (func, args)
+    return run
+
+
+def step_key(s):
+    # "src_folders:force-app+other" -> ("src_folders", "force-app+other")
+    stage, _, target = s.name.partition(":")
+    return stage, target
 
 
 def check_org(org_alias):
-    py_obj = sfdx.org_list()
+    # The CLI's local alias & auth files answer this without starting sf.
+    py_obj = local_auth.org_list() or sfdx.org_list(fresh=True)
 
     scratch_orgs = py_obj["result"]["scratchOrgs"]
 
@@ -103,7 +217,46 @@ def check_org(org_alias):
     return "", False
 
 
-def create_sratch_org(org_alias, duration, devhub, email, config):
+def community_ready(py_obj):
+    if py_obj["status"] == 1:
+        message = py_obj["message"]
+        logging.error(f"MESSAGE: {message}")
+        logging.warning(f"{py_obj}")
+        raise SfdxError.from_result(py_obj)
+
+    records = py_obj["result"]["records"]
+    if records:
+        logging.error(f"Checking community status ~ {records[0]['Status']}")
+
+    return len(records) > 0
+
+
+def create_community(org_alias, community, template):
+    py_obj = sfdx.create_community(org_alias, community, template)
+
+    if py_obj["status"] == 1:
+        message = py_obj["message"]
+        logging.error(f"MESSAGE: {message}")
+        logging.warning(f"{py_obj}")
+        raise SfdxError.from_result(py_obj)
+
+    if py_obj["status"] == 0:
+        logging.info(f"MESSAGE: {py_obj['result']['message']}")
+        try:
+            polling.poll(
+                lambda: sfdx.community_status(org_alias, community),
+                community_ready,
+                "community",
+                description=f"Community {community}",
+                transient=retry.retryable,
+            )
+        except TimeoutError as e:
+            raise BuildError(str(e)) from e
+
+    return True
+
+
+def create_sratch_org(org_alias, duration, devhub, email, config, snapshot=None):
     preview = config.get("PREVIEW", False)
 
     py_obj = sfdx.create_sratch_org(
@@ -114,13 +267,14 @@ def create_sratch_org(org_alias, duration, devhub, email, config):
         config["USE_NAMESPACE"],
         email,
         preview,
+        snapshot,
     )
 
     if py_obj["status"] == 1:
         message = py_obj["message"]
         logging.error(f"MESSAGE: {message}")
         logging.warning(f"{py_obj}")
-        sys.exit(1)
+        raise SfdxError.from_result(py_obj)
 
     if py_obj["status"] == 0:
         username = py_obj["result"]["username"]
@@ -135,66 +289,96 @@ def execute_script(org_alias, apex_file):
         message = py_obj["message"]
         logging.error(f"MESSAGE: {message}")
         logging.warning(f"{py_obj}")
-        sys.exit(1)
+        raise SfdxError.from_result(py_obj)
 
     if py_obj["status"] == 0:
-        logging.debug(f"{py_obj}")
+        logging.debug("%s", py_obj)
 
     return True
 
 
-def install_package(org_alias, package_id):
-    py_obj = sfdx.install_package(org_alias, package_id)
+def install_permission_set(org_alias, pset):
+    py_obj = sfdx.install_permission_set(org_alias, pset)
 
     if py_obj["status"] == 1:
-        message = py_obj["message"]
+        message = py_obj["result"]["failures"][0]["message"] if "result" in py_obj else py_obj["message"]
         logging.error(f"MESSAGE: {message}")
         logging.warning(f"{py_obj}")
-        sys.exit(1)
 
     if py_obj["status"] == 0:
-        install_status = py_obj["result"]["Status"]
-        while install_status == "IN_PROGRESS":
-            install_status = check_install(org_alias, py_obj["result"]["Id"])
+        logging.info("%s", py_obj)
 
     return True
 
 
-def install_permission_set(org_alias, pset):
-    py_obj = sfdx.install_permission_set(org_alias, pset)
+def install_permission_sets(org_alias, psets):
+    failed = []
 
-    if py_obj["status"] == 1:
-        message = py_obj["result"]["failures"][0]["message"]
-        logging.error(f"MESSAGE: {message}")
-        logging.warning(f"{py_obj}")
+    for idx in range(0, len(psets), PSET_BATCH_SIZE):
+        batch = psets[idx : idx + PSET_BATCH_SIZE]
+        py_obj = sfdx.install_permission_sets(org_alias, batch)
 
-    if py_obj["status"] == 0:
-        logging.info(f"{py_obj}")
+        if "result" not in py_obj.keys():
+            logging.error(f"MESSAGE: {py_obj.get('message')}")
+            logging.warning(f"{py_obj}")
+            failed += batch
+            continue
+
+        for item in py_obj["result"].get("successes", []):
+            logging.info(f"Assigned Permission Set ({item['name']}) ~ {item['value']}")
+
+        for item in py_obj["result"].get("failures", []):
+            if "Duplicate" in item["message"]:
+                logging.info(f"Permission Set ({item['name']}) already assigned")
+            else:
+                logging.error(f"Permission Set ({item['name']}) MESSAGE: {item['message']}")
+                failed.append(item["name"])
+
+    for pset in failed:
+        logging.error(f"~~~ Installing Permission Set ({pset}) ~~~")
+        install_permission_set(org_alias, pset)
 
     return True
 
 
-def install_source(org_alias, src_folder):
-    py_obj = sfdx.install_source(org_alias, src_folder)
+def as_list(items):
+    # sf returns a single component as an object rather than a list.
+    if items is None:
+        return []
+    if isinstance(items, dict):
+        return [items]
+    return items
+
+
+def log_deploy_details(details):
+    # Every failure, but only a count per component type of the successes.
+    for item in as_list(details.get("componentFailures")):
+        logging.error(f"Type: {item['componentType']}, Error: {item['problem']}, Item: {item['fileName']}")
+
+    successes = as_list(details.get("componentSuccesses"))
+    if successes:
+        counts = Counter(item.get("componentType", "Unknown") for item in successes)
+        summary = ", ".join(f"{c_type} {count}" for c_type, count in sorted(counts.items()))
+        logging.info(f"Deployed {len(successes)} components ~ {summary}")
+
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        for item in successes:
+            logging.debug(f"Type: {item['componentType']}, Filename: {item['fileName']}, Name: {item['fullName']}")
+
+
+def install_sources(org_alias, src_folders):
+    py_obj = sfdx.install_sources(org_alias, src_folders)
 
     if py_obj["status"] == 1:
         if "message" in py_obj.keys():
             logging.info(f"MESSAGE: {py_obj['message']}")
             if py_obj["name"] != "NothingToDeploy":
-                sys.exit(1)
+                raise SfdxError.from_result(py_obj)
 
         if "result" in py_obj.keys():
             if "details" in py_obj["result"].keys():
-                message = py_obj["result"]["details"]
-                for item in message["componentFailures"]:
-                    logging.error(
-                        f"Type: {item['componentType']}, Error: {item['problem']}, Item: {item['fileName']}"
-                    )
-                for item in message["componentSuccesses"]:
-                    logging.debug(
-                        f"Type: {item['componentType']}, Filename: {item['fileName']}, Name: {item['fullName']}"
-                    )
-            sys.exit(1)
+                log_deploy_details(py_obj["result"]["details"])
+            raise SfdxError.from_result(py_obj)
 
     if py_obj["status"] == 0:
         if "result" in py_obj.keys():
@@ -202,11 +386,25 @@ def install_source(org_alias, src_folder):
                 logging.info(f"STATUS: {py_obj['result']['status']}")
 
             if "details" in py_obj["result"].keys():
-                message = py_obj["result"]["details"]
-                for item in message["componentSuccesses"]:
-                    logging.info(
-                        f"Type: {item['componentType']}, Filename: {item['fileName']}, Name: {item['fullName']}"
-                    )
+                log_deploy_details(py_obj["result"]["details"])
+
+    return True
+
+
+def deploy_sources(org_alias, username, redeploy, src_folders):
+    hashes = {src_folder: local_state.hash_folder(src_folder) for src_folder in src_folders}
+
+    changed = []
+    for src_folder in src_folders:
+        if not redeploy and source_manifest.is_deployed(username, src_folder, hashes[src_folder]):
+            logging.error(f"Source unchanged since last deploy, skipping ~ {src_folder}")
+        else:
+            changed.append(src_folder)
+
+    if changed:
+        install_sources(org_alias, changed)
+        for src_folder in changed:
+            source_manifest.record(username, src_folder, hashes[src_folder])
 
     return True
 
@@ -220,7 +418,7 @@ def package_list(org_alias):
         message = py_obj["message"]
         logging.error(f"MESSAGE: {message}")
         logging.warning(f"{py_obj}")
-        sys.exit(1)
+        raise SfdxError.from_result(py_obj)
 
     if py_obj["status"] == 0:
         for item in py_obj["result"]:
@@ -239,7 +437,7 @@ def publish_community(org_alias, community):
         message = py_obj["message"]
         logging.error(f"MESSAGE: {message}")
         logging.warning(f"{py_obj}")
-        sys.exit(1)
+        raise SfdxError.from_result(py_obj)
 
     if py_obj["status"] == 0:
         logging.error(f"Name \t: {py_obj['result']['name']}")
@@ -249,9 +447,12 @@ def publish_community(org_alias, community):
     return True
 
 
-def source_push(org_alias):
+def source_push(org_alias, project_folders):
+    # The project's packageDirectories are deployed through source tracking;
+    # they are passed so a change to them changes the step's journal entry.
+    logging.info(f"Project source ~ {', '.join(project_folders)}")
     py_obj = sfdx.source_push(org_alias, True)
-    logging.debug(f"{py_obj}")
+    logging.debug("%s", py_obj)
 
     if py_obj["status"] == 1:
         if "message" in py_obj.keys():
@@ -259,17 +460,9 @@ def source_push(org_alias):
 
         if "result" in py_obj.keys():
             if "details" in py_obj["result"].keys():
-                message = py_obj["result"]["details"]
-                for item in message["componentFailures"]:
-                    logging.error(
-                        f"Type: {item['componentType']}, Error: {item['problem']}, Item: {item['fileName']}"
-                    )
-                for item in message["componentSuccesses"]:
-                    logging.debug(
-                        f"Type: {item['componentType']}, Filename: {item['fileName']}, Name: {item['fullName']}"
-                    )
+                log_deploy_details(py_obj["result"]["details"])
 
-        sys.exit(1)
+        raise SfdxError.from_result(py_obj)
 
     if py_obj["status"] == 0:
         if "result" in py_obj.keys():
@@ -277,11 +470,7 @@ def source_push(org_alias):
                 logging.info(f"STATUS: {py_obj['result']['status']}")
 
             if "details" in py_obj["result"].keys():
-                message = py_obj["result"]["details"]
-                for item in message["componentSuccesses"]:
-                    logging.info(
-                        f"Type: {item['componentType']}, Filename: {item['fileName']}, Name: {item['fullName']}"
-                    )
+                log_deploy_details(py_obj["result"]["details"])
 
     return True
 
@@ -293,7 +482,7 @@ def user_details(org_alias):
         message = py_obj["message"]
         logging.error(f"MESSAGE: {message}")
         logging.warning(f"{py_obj}")
-        sys.exit(1)
+        raise SfdxError.from_result(py_obj)
 
     if py_obj["status"] == 0:
         logging.error(f"OrgId \t: {py_obj['result']['orgId']}")
@@ -302,14 +491,208 @@ def user_details(org_alias):
         logging.error(f"Alias \t: {py_obj['result']['alias']}")
 
 
-def main(config_file="./org_config.yml"):
+def install_packages(org_alias, username, package_ids, package_depends=None):
+    with step("Check Installed Packages"):
+        installed = package_list(org_alias)
+
+    missing = [pckg for pckg in package_ids if pckg not in installed]
+    if missing:
+        try:
+            durations = package_installer.install_packages(username, missing, package_depends)
+        except ValueError as e:
+            raise BuildError(f"PACKAGE_DEPENDS: {e}") from e
+
+        for pckg, seconds in durations.items():
+            STEP_TIMINGS.append((f"Installing Packages {pckg}", seconds))
+            STEP_KEYS[f"Installing Packages {pckg}"] = ("packages", pckg)
+
+
+def chain(group, items, title, func, *args):
+    # Steps of one stage run in config order.
+    steps = []
+    for item in items:
+        depends = [steps[-1].name] if steps else []
+        steps.append(
+            Step(
+                f"{group}:{item}",
+                timed(title.format(item), func, *args, item),
+                group=group,
+                depends=depends,
+            )
+        )
+
+    return steps
+
+
+def deploy_chain(group, batches, args, username, dir_path):
+    # One step per planned deploy, run in order.
+    steps = []
+    for batch in batches:
+        depends = [steps[-1].name] if steps else []
+        title = f"Installing Source ({', '.join(batch)})"
+        folders = [f"{dir_path}/{folder}" for folder in batch]
+        steps.append(
+            Step(
+                f"{group}:{'+'.join(batch)}",
+                timed(title, deploy_sources, args.alias, username, args.redeploy, folders),
+                group=group,
+                depends=depends,
+            )
+        )
+
+    return steps
+
+
+def step_refs(cfg):
+    refs = set()
+    for name, deps in (cfg.get("STEP_DEPENDS") or {}).items():
+        refs.add(name)
+        refs.update(deps)
+
+    return refs
+
+
+def plan_deploys(cfg, stage, folders, dir_path):
+    # Folders of a stage named in STEP_DEPENDS keep a deploy each.
+    refs = step_refs(cfg)
+    if not cfg.get("MERGE_DEPLOYS", True) or any(ref.startswith(f"{stage}:") for ref in refs):
+        return [[folder] for folder in folders]
+
+    batches = deploy_planner.plan([f"{dir_path}/{folder}" for folder in folders])
+    return [[path[len(dir_path) + 1 :] for path in batch] for batch in batches]
+
+
+def plan_source_deploys(args, cfg, dir_path):
+    pre_deploy = plan_deploys(cfg, "pre_deploy", cfg["PRE_DEPLOY"], dir_path)
+    src_folders = plan_deploys(cfg, "src_folders", cfg["SRC_FOLDERS"], dir_path)
+    post_deploy = plan_deploys(cfg, "post_deploy", cfg["POST_DEPLOY"], dir_path)
+
+    # Without the default source deploy nothing runs between PRE_DEPLOY and
+    # SRC_FOLDERS, so they can share deploys unless STEP_DEPENDS needs them apart.
+    refs = step_refs(cfg)
+    separate = "pre_deploy" in refs or any(ref.startswith(("pre_deploy:", "src_folders:")) for ref in refs)
+    if args.skip and cfg["PRE_DEPLOY"] and cfg["SRC_FOLDERS"] and cfg.get("MERGE_DEPLOYS", True) and not separate:
+        batches = plan_deploys(cfg, "src_folders", cfg["PRE_DEPLOY"] + cfg["SRC_FOLDERS"], dir_path)
+        pre_deploy = [batch for batch in batches if set(batch) <= set(cfg["PRE_DEPLOY"])]
+        src_folders = [batch for batch in batches if batch not in pre_deploy]
+
+    return pre_deploy, src_folders, post_deploy
+
+
+def build_data_steps(args, cfg, username, dir_path, completed):
+    # Seed data comes from a snapshot of an earlier build's data when there
+    # is one for these scripts & source; the apex runs (and is snapshotted)
+    # otherwise.
+    refs = step_refs(cfg)
+    if not cfg.get("DATA_SNAPSHOT_QUERIES") or any(ref.startswith("build_data:") for ref in refs):
+        return chain("build_data", cfg["BUILD_DATA_CMD"], "Running Build data({})", execute_script, args.alias)
+
+    key = data_snapshot.snapshot_key(cfg, dir_path, args.skip)
+    steps = chain("build_data", cfg["BUILD_DATA_CMD"], "Running Build data({})", execute_script, args.alias)
+    title = f"Exporting Build data snapshot({key})"
+    steps.append(
+        Step(
+            "build_data:export",
+            timed(title, data_snapshot.export, args.alias, key, cfg["DATA_SNAPSHOT_QUERIES"]),
+            group="build_data",
+            depends=[steps[-1].name],
+        )
+    )
+
+    # Unless the org already ran the scripts, e.g. the org it is a snapshot of.
+    if data_snapshot.exists(key) and not journal.all_completed(steps, completed, args.alias, username):
+        title = f"Importing Build data snapshot({key})"
+        import_step = timed(title, data_snapshot.import_snapshot, args.alias, key)
+        return [Step("build_data:snapshot", import_step, group="build_data")]
+
+    return steps
+
+
+def build_steps(args, cfg, username, dir_path, completed=None):
+    steps = []
+    pre_deploy, src_folders, post_deploy = plan_source_deploys(args, cfg, dir_path)
+
+    if cfg["PACKAGE_IDS"]:
+        steps.append(
+            Step(
+                "packages",
+                install_packages,
+                args.alias,
+                username,
+                cfg["PACKAGE_IDS"],
+                cfg.get("PACKAGE_DEPENDS"),
+            )
+        )
+
+    steps += deploy_chain("pre_deploy", pre_deploy, args, username, dir_path)
+
+    if cfg["PACKAGE_P_SETS"]:
+        title = f"Installing Permission Sets ({', '.join(cfg['PACKAGE_P_SETS'])})"
+        steps.append(
+            Step("package_p_sets", timed(title, install_permission_sets, args.alias, cfg["PACKAGE_P_SETS"]))
+        )
+
+    if not args.skip:
+        project_folders = local_state.project_folders(dir_path)
+        steps.append(Step("source_push", timed("Source Deploy", source_push, args.alias, project_folders)))
+
+    steps += deploy_chain("src_folders", src_folders, args, username, dir_path)
+
+    if cfg["P_SETS"]:
+        title = f"Installing Permission Sets ({', '.join(cfg['P_SETS'])})"
+        steps.append(Step("p_sets", timed(title, install_permission_sets, args.alias, cfg["P_SETS"])))
+
+    if cfg["TMPLT_NAME"]:
+        title = f"Create Community({cfg['SITE_NAME']})"
+        steps.append(
+            Step("community", timed(title, create_community, args.alias, cfg["SITE_NAME"], cfg["TMPLT_NAME"]))
+        )
+
+    if cfg["BUILD_DATA_CMD"]:
+        steps += build_data_steps(args, cfg, username, dir_path, completed or {})
+
+    if cfg["SITE_NAME"]:
+        title = f"Publish Community({cfg['SITE_NAME']})"
+        steps.append(Step("site_publish", timed(title, publish_community, args.alias, cfg["SITE_NAME"])))
+
+    steps += deploy_chain("post_deploy", post_deploy, args, username, dir_path)
+
+    steps.append(Step("details", timed("Details", user_details, args.alias)))
+
+    return steps
+
+
+def build_depends(cfg):
+    depends = {group: list(deps) for group, deps in BUILD_DEPENDS.items()}
+
+    for name, deps in (cfg.get("STEP_DEPENDS") or {}).items():
+        depends.setdefault(name, []).extend(deps)
+
+    return depends
+
+
+def main(config_file="./org_config.yml", argv=None):
     logging.debug("main()")
 
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("-c", "--config", default=config_file)
+    config_file = pre_parser.parse_known_args(argv)[0].config
+
     cfg = get_config(config_file)
     dir_path = os.getcwd()
 
-    setup_args(cfg)
-    args = parser.parse_args()
+    parser = setup_args(cfg, config_file)
+    args = parser.parse_args(argv)
+
+    if fleet.requested(args):
+        sys.exit(fleet.run(args))
+
+    if args.stats:
+        sys.exit(build_history.print_stats(args.alias))
+
+    if args.plan:
+        cfg["SCRATCH_DEF"] = args.scratch_def
+        sys.exit(plan(args, cfg, dir_path))
 
     if args.alias is None:
         parser.print_help()
@@ -319,76 +702,204 @@ def main(config_file="./org_config.yml"):
         logging.error("~~~ Setting up DEBUG ~~~")
         logger.setLevel(logging.INFO)
 
+    STEP_TIMINGS.clear()
+    STEP_KEYS.clear()
+
+    if cfg.get("POLL_TIMEOUT"):
+        polling.set_timeout(cfg["POLL_TIMEOUT"])
+
+    if cfg.get("STEP_RETRIES") is not None:
+        retry.set_step_retries(cfg["STEP_RETRIES"])
+
+    if cfg.get("API_BACKEND"):
+        try:
+            sfdx.set_api_backend(cfg["API_BACKEND"])
+        except ValueError as e:
+            logging.error(f"API_BACKEND: {e}")
+            sys.exit(1)
+
+    cfg["SCRATCH_DEF"] = args.scratch_def
+
     logging.error("~~~ Setting up Scratch Org ~~~")
     logging.error(f"{args}")
 
-    logging.error("~~~ Check if Org Already Exists ~~~")
-    username, org_exists = check_org(args.alias)
-
-    if not org_exists:
-        logging.error("~~~ Create New Scratch Org ~~~")
-        username = create_sratch_org(
-            args.alias,
-            args.duration,
-            args.devhub,
-            args.email,
-            cfg,
-        )
+    if args.trace:
+        tracing.start()
+
+    started = time.time()
+    status = "failed"
+    try:
+        with tracing.span(f"Build {args.alias}", "build", org=args.alias):
+            build(args, cfg, dir_path)
+        status = "complete"
+    except BuildError as e:
+        logging.error(f"~~~ Build failed ~ {e} ~~~")
+        sys.exit(1)
+    finally:
+        if cfg.get("BUILD_HISTORY", True):
+            build_history.record(
+                args.alias,
+                args.devhub,
+                os.path.abspath(config_file),
+                started,
+                time.time() - started,
+                status,
+                STEP_TIMINGS,
+                STEP_KEYS,
+            )
+        if args.trace:
+            tracing.write_chrome_trace(args.trace)
+            tracing.stop()
+            logging.error(f"Trace written to {args.trace}")
 
-    if cfg["PACKAGE_IDS"]:
-        logging.error("~~~ Check Installed Packages ~~~")
-        installed = package_list(args.alias)
 
-        for pckg in cfg["PACKAGE_IDS"]:
-            if pckg not in installed:
-                logging.error(f"~~~ Installing Packages {pckg} ~~~")
-                install_package(username, pckg)
+def setup_step_names(args):
+    names = ["Check if Org Already Exists"]
+    if args.devhub is None:
+        names.append("Choose Dev Hub")
+    if args.snapshot:
+        names.append("Find Org Snapshot")
+    names.append("Create New Scratch Org")
 
-    if cfg["PRE_DEPLOY"]:
-        for fldr in cfg["PRE_DEPLOY"]:
-            logging.error(f"~~~ Installing Source ({fldr}) ~~~")
-            install_source(args.alias, f"{dir_path}/{fldr}")
+    return names
 
-    if cfg["PACKAGE_P_SETS"]:
-        for pset in cfg["PACKAGE_P_SETS"]:
-            logging.error(f"~~~ Installing Permission Set ({pset}) ~~~")
-            install_permission_set(args.alias, pset)
 
-    if args.skip:
-        logging.error("~~~ Skip Source Deploy ~~~")
+def package_estimate(package_ids):
+    # Packages install side by side, after one installed package check.
+    check = build_history.estimate("setup", "Check Installed Packages")
+    installs = [e for e in (build_history.estimate("packages", pckg) for pckg in package_ids) if e]
+    if not installs:
+        return None
+
+    check = check or (0, 0)
+    return check[0] + max(e[0] for e in installs), check[1] + max(e[1] for e in installs)
+
+
+def critical_path(graph, seconds):
+    # Time until the last step ends, every step starting once its depends end.
+    ends = {}
+
+    def end(name):
+        if name not in ends:
+            ends[name] = seconds[name] + max((end(dep) for dep in graph[name]), default=0)
+        return ends[name]
+
+    return max((end(name) for name in graph), default=0)
+
+
+def plan(args, cfg, dir_path):
+    # A build of a new org, no steps skipped, estimated from the build history.
+    steps = build_steps(args, cfg, None, dir_path, {})
+    try:
+        graph = resolve(steps, build_depends(cfg))
+    except ValueError as e:
+        logging.error(f"STEP_DEPENDS: {e}")
+        return 1
+
+    # Setup steps run one after another, the build steps as scheduled.
+    setup = [(name, build_history.estimate("setup", name)) for name in setup_step_names(args)]
+    if args.snapshot:
+        finish = [("Save Org Snapshot", build_history.estimate("setup", "Save Org Snapshot"))]
     else:
-        logging.error("~~~ Source Deploy ~~~")
-        source_push(args.alias)
+        finish = []
 
-    if cfg["SRC_FOLDERS"]:
-        for fldr in cfg["SRC_FOLDERS"]:
-            logging.error(f"~~~ Installing Source ({fldr}) ~~~")
-            install_source(args.alias, f"{dir_path}/{fldr}")
+    estimates = {}
+    for s in steps:
+        if s.name == "packages":
+            estimates[s.name] = package_estimate(cfg["PACKAGE_IDS"])
+        else:
+            estimates[s.name] = build_history.estimate(*step_key(s))
 
-    if cfg["P_SETS"]:
-        for pset in cfg["P_SETS"]:
-            logging.error(f"~~~ Installing Permission Set ({pset}) ~~~")
-            install_permission_set(args.alias, pset)
+    titles = {"packages": f"Installing Packages ({', '.join(cfg['PACKAGE_IDS'] or [])})"}
+    rows = setup + [(getattr(s.func, "title", titles.get(s.name, s.name)), estimates[s.name]) for s in steps] + finish
 
-    if cfg["TMPLT_NAME"]:
-        logging.error(f"~~~ Create Community({cfg['SITE_NAME']}) ~~~")
-        # create_community(org_alias, SITE_NAME, TMPLT_NAME)
+    print()
+    print(f"{'Step':<70} {'p50':>10} {'p95':>10}")
+    print(f"{'----':<70} {'---':>10} {'---':>10}")
+    for name, estimate in rows:
+        p50, p95 = estimate or (None, None)
+        print(f"{name[:70]:<70} {build_history.format_seconds(p50):>10} {build_history.format_seconds(p95):>10}")
+    print()
 
-    if cfg["BUILD_DATA_CMD"]:
-        for script in cfg["BUILD_DATA_CMD"]:
-            logging.error(f"~~~ Running Build data({script}) ~~~")
-            execute_script(args.alias, script)
+    totals = []
+    for idx in (0, 1):
+        seconds = {name: (estimate or (0, 0))[idx] for name, estimate in estimates.items()}
+        serial = sum((estimate or (0, 0))[idx] for _, estimate in setup + finish)
+        totals.append(serial + critical_path(graph, seconds))
 
-    if cfg["SITE_NAME"]:
-        logging.error(f"~~~ Publish Community({cfg['SITE_NAME']}) ~~~")
-        publish_community(args.alias, cfg["SITE_NAME"])
+    unknown = sum(1 for _, estimate in rows if estimate is None)
+    print(f"Estimated build time: p50 {build_history.format_seconds(totals[0])}, p95 {build_history.format_seconds(totals[1])}")
+    if unknown:
+        print(f"{unknown} steps have no history and are not counted")
+    print()
+
+    return 0
+
+
+def build(args, cfg, dir_path):
+
+    with step("Check if Org Already Exists"):
+        username, org_exists = check_org(args.alias)
+
+    # Without -v each new org goes to the DEVHUBS hub with the most headroom.
+    balanced = args.devhub is None
+    if balanced and org_exists:
+        args.devhub = (local_auth.resolve(args.alias) or {}).get("devHubUsername") or cfg["DEVHUB"]
+
+    snapshot = None
+    while not org_exists:
+        if balanced:
+            with step("Choose Dev Hub"):
+                args.devhub = devhub_balancer.choose(cfg["DEVHUBS"])
 
-    if cfg["POST_DEPLOY"]:
-        for fldr in cfg["POST_DEPLOY"]:
-            logging.error(f"~~~ Installing Source ({fldr}) ~~~")
-            install_source(args.alias, f"{dir_path}/{fldr}")
+        if args.snapshot:
+            with step("Find Org Snapshot"):
+                snapshot = org_snapshot.find(org_snapshot.snapshot_key(cfg, args.devhub, dir_path), args.devhub)
 
-    logging.error("~~~ Details ~~~")
-    user_details(args.alias)
+        try:
+            with step("Create New Scratch Org"):
+                username = create_sratch_org(
+                    args.alias,
+                    args.duration,
+                    args.devhub,
+                    args.email,
+                    cfg,
+                    snapshot["name"] if snapshot else None,
+                )
+            break
+        except SfdxError as e:
+            if not (balanced and devhub_balancer.is_limit_error(e)):
+                raise
+            logging.error(f"~~~ Dev Hub {args.devhub} is at its scratch org limits ~~~")
+            devhub_balancer.saturated(args.devhub)
+
+    snapshot_key = org_snapshot.snapshot_key(cfg, args.devhub, dir_path) if args.snapshot else None
+
+    # Only the steps whose inputs changed since the snapshot are run.
+    if snapshot:
+        org_snapshot.seed(snapshot, args.alias, username)
+
+    completed = journal.start(args.alias, username, args.resume or snapshot is not None)
+
+    steps = build_steps(args, cfg, username, dir_path, completed)
+    depends = build_depends(cfg)
+    STEP_KEYS.update({s.func.title: step_key(s) for s in steps if hasattr(s.func, "title")})
+
+    try:
+        graph = resolve(steps, depends)
+    except ValueError as e:
+        raise BuildError(f"STEP_DEPENDS: {e}") from e
+
+    steps = retry.retrying(journal.journaled(args.alias, username, steps, graph, completed))
+
+    run_steps(steps, depends, cfg.get("MAX_PARALLEL_STEPS", 4))
+
+    if args.snapshot:
+        with step("Save Org Snapshot"):
+            org_snapshot.save(snapshot_key, args.devhub, args.alias, username)
 
     logging.error("~~~ Scratch Org Complete ~~~")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,687 @@
+# org_daemon.py
+__version__ = "0.0.3"
+
+#
+# Long running builder service. Builds are submitted over a local HTTP API
+# as jobs into a SQLite queue, and run by a pool of workers, each starting
+# an org_builder process. At most DEVHUB_MAX_BUILDS builds per Dev Hub run
+# at once; a job without a Dev Hub gets one of DEVHUBS when it is claimed,
+# and counts against that hub's cap. Job status & build logs can be read,
+# and followed, over the API or with `sf-org_daemon status / log`.
+#
+#   POST   /jobs              Submit a build, {"alias": ..., "project": ...}
+#   GET    /jobs              Jobs, newest first (?status=queued)
+#   GET    /jobs/<id>         One job
+#   GET    /jobs/<id>/log     Build log (?follow=1 streams it until the job ends)
+#   DELETE /jobs/<id>         Cancel a queued or running job
+#   GET    /status            Workers, Dev Hub caps and running builds
+#
+
+import argparse
+import json
+import logging
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError, URLError
+from urllib.parse import parse_qs, urlparse
+from urllib.request import Request, urlopen
+
+from . import devhub_balancer
+from . import fleet
+from . import local_state
+from .org_builder import get_config
+
+# Set the Log level
+#
+logging.basicConfig(
+    level=logging.ERROR, format="%(asctime)s - %(message)s", datefmt="%d-%b-%y %H:%M:%S"
+)
+logger = logging.getLogger()
+#
+
+# Config
+#
+DAEMON_PORT = 8765
+DAEMON_WORKERS = 4
+# Builds running at once per Dev Hub, unless set in the config DEVHUB_MAX_BUILDS.
+DEVHUB_MAX_BUILDS = 2
+# Seconds between reads of a followed log.
+FOLLOW_INTERVAL = 0.5
+#
+
+FINISHED = ("complete", "failed", "cancelled")
+
+# Options every job names, and defaults for the rest, as `submit` sends them.
+JOB_OPTIONS_REQUIRED = ("config", "scratch_def", "duration")
+JOB_OPTION_DEFAULTS = {
+    "devhub": None,
+    "email": None,
+    "skip": False,
+    "resume": False,
+    "redeploy": False,
+    "snapshot": False,
+    "trace": None,
+    "debug": False,
+}
+
+# Dev Hub of queued jobs that leave the choice to the DEVHUBS balancer.
+BALANCED = "DEVHUBS"
+
+RUNNING_SQL = "SELECT devhub, COUNT(*) FROM jobs WHERE status IN ('running', 'cancelling') GROUP BY devhub"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    alias TEXT NOT NULL,
+    devhub TEXT NOT NULL,
+    project TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    exit_code INTEGER,
+    log TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+def db_file():
+    return local_state.state_path("daemon", "jobs.db")
+
+
+def log_file(job_id):
+    return os.path.join(local_state.state_dir("daemon", "logs"), f"{job_id}.log")
+
+
+def job_request(body):
+    # (alias, project, options) of a POST /jobs body; ValueError if malformed.
+    if not isinstance(body, dict):
+        raise ValueError("the body is not a JSON object")
+
+    alias, project, options = body.get("alias"), body.get("project"), body.get("options", {})
+    if not isinstance(alias, str) or not alias:
+        raise ValueError("alias is required")
+    if not isinstance(project, str) or not os.path.isdir(project):
+        raise ValueError(f"project {project!r} is not a folder")
+    if not isinstance(options, dict):
+        raise ValueError("options is not a JSON object")
+
+    missing = [name for name in JOB_OPTIONS_REQUIRED if name not in options]
+    if missing:
+        raise ValueError(f"options {', '.join(missing)} required")
+
+    return alias, project, {**JOB_OPTION_DEFAULTS, **options}
+
+
+def as_job(row):
+    job = dict(row)
+    job["options"] = json.loads(job["options"])
+    return job
+
+
+class JobQueue:
+    # Jobs persisted in SQLite, so queued jobs outlive the daemon.
+    def __init__(self, path=None):
+        self.path = path or db_file()
+        # One connection shared by the workers & HTTP handler threads; every
+        # use of it holds the lock (re-entered by claim).
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def submit(self, alias, devhub, project, options):
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO jobs (alias, devhub, project, options, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (alias, devhub, project, json.dumps(options), time.time()),
+            )
+            job_id = cur.lastrowid
+            self._db.execute("UPDATE jobs SET log = ? WHERE id = ?", (log_file(job_id), job_id))
+
+        return job_id
+
+    def claim(self, caps, default_cap, devhubs=(), choose=None):
+        # Oldest queued job whose Dev Hub is under its cap, marked running. A
+        # BALANCED job takes choose(hubs) of the DEVHUBS under their caps, and
+        # waits while it returns None.
+        def under_cap(devhub):
+            return running.get(devhub, 0) < caps.get(devhub, default_cap)
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                running = self.running()
+                for row in self._db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id").fetchall():
+                    devhub = row["devhub"]
+                    if devhub == BALANCED and devhubs and choose:
+                        free = [hub for hub in devhubs if under_cap(hub)]
+                        devhub = choose(free) if free else None
+                    if devhub is not None and under_cap(devhub):
+                        self._db.execute(
+                            "UPDATE jobs SET status = 'running', devhub = ?, started = ? WHERE id = ?",
+                            (devhub, time.time(), row["id"]),
+                        )
+                        self._db.execute("COMMIT")
+                        return self.get(row["id"])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+        return None
+
+    def finish(self, job_id, status, exit_code):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, exit_code = ?, finished = ? WHERE id = ? AND status IN ('running', 'cancelling')",
+                (status, exit_code, time.time(), job_id),
+            )
+
+    def cancel(self, job_id):
+        # True if the job was queued, and so will not run.
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+        return cur.rowcount == 1
+
+    def cancelling(self, job_id):
+        # A running job, to be marked cancelled once its build stops.
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'cancelling' WHERE id = ? AND status = 'running'", (job_id,))
+
+    def requeue_running(self):
+        # Jobs a stopped daemon left running are run again.
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE status = 'cancelling'", (time.time(),)
+            )
+            requeued = 0
+            for row in self._db.execute("SELECT * FROM jobs WHERE status = 'running'").fetchall():
+                # Balanced jobs choose their Dev Hub again.
+                devhub = row["devhub"] if json.loads(row["options"]).get("devhub") else BALANCED
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', started = NULL, devhub = ? WHERE id = ?", (devhub, row["id"])
+                )
+                requeued = requeued + 1
+        return requeued
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return as_job(row) if row else None
+
+    def jobs(self, status=None, limit=100):
+        with self._lock:
+            if status:
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [as_job(row) for row in rows]
+
+    def running(self):
+        # Builds per Dev Hub, cancelled builds count until they stop.
+        with self._lock:
+            return dict(self._db.execute(RUNNING_SQL).fetchall())
+
+
+def start_build(cmd, cwd, log):
+    # In a process group of its own, so a cancel reaches the sf commands too.
+    if sys.platform == "win32":
+        group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group = {"start_new_session": True}
+
+    return subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT, **group)
+
+
+def terminate_build(proc):
+    # The build and every process it started.
+    try:
+        if sys.platform == "win32":
+            proc.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        # Already gone.
+        pass
+
+
+class Builder:
+    # The worker pool.
+    def __init__(self, queue, workers, caps, default_cap, devhubs=()):
+        self.queue = queue
+        self.workers = workers
+        self.caps = caps
+        self.default_cap = default_cap
+        self.devhubs = list(devhubs)
+        self._wake = threading.Condition()
+        self._procs = {}
+        self._stopping = False
+
+    def start(self):
+        requeued = self.queue.requeue_running()
+        if requeued:
+            logging.error(f"~~~ Requeued {requeued} jobs left running ~~~")
+
+        for n in range(self.workers):
+            threading.Thread(target=self.work, name=f"worker-{n + 1}", daemon=True).start()
+
+    def wake(self):
+        with self._wake:
+            self._wake.notify_all()
+
+    def stop(self):
+        self._stopping = True
+        for proc in list(self._procs.values()):
+            terminate_build(proc)
+        self.wake()
+
+    def choose_devhub(self, free):
+        # The free hub with the most scratch org headroom, one allocation
+        # taken; None while they are all at their limits. When no hub's
+        # limits can be read the job runs unpinned, and its build fails.
+        if not devhub_balancer.readable(free):
+            return BALANCED
+        return devhub_balancer.reserve(free)
+
+    def work(self):
+        while not self._stopping:
+            if self.devhubs:
+                # Outside the queue lock, `sf org list limits` takes a while.
+                devhub_balancer.refresh(self.devhubs)
+            job = self.queue.claim(self.caps, self.default_cap, self.devhubs, self.choose_devhub)
+            if job is None:
+                with self._wake:
+                    self._wake.wait(timeout=1)
+                continue
+
+            try:
+                self.run_job(job)
+            except Exception as e:
+                logging.error(f"~~~ Job {job['id']} ({job['alias']}) could not run ~ {e!r} ~~~")
+                if not self._stopping:
+                    self.queue.finish(job["id"], "failed", None)
+            # A finished build may free a Dev Hub slot for another worker.
+            self.wake()
+
+    def run_job(self, job):
+        options = argparse.Namespace(**job["options"])
+        if job["devhub"] != BALANCED:
+            options.devhub = job["devhub"]
+        cmd = fleet.child_cmd(options, job["alias"], options.scratch_def)
+
+        logging.error(f"~~~ Building job {job['id']} ({job['alias']}) on {job['devhub']} ~~~")
+        with open(job["log"], "w") as log:
+            proc = start_build(cmd, job["project"], log)
+            self._procs[job["id"]] = proc
+            try:
+                exit_code = proc.wait()
+            finally:
+                del self._procs[job["id"]]
+
+        # Stopped with the daemon: left running, so the next start requeues it.
+        if self._stopping and exit_code != 0:
+            logging.error(f"~~~ Job {job['id']} ({job['alias']}) stopped, queued again on restart ~~~")
+            return
+
+        if self.queue.get(job["id"])["status"] == "cancelling":
+            status = "cancelled"
+        else:
+            status = "complete" if exit_code == 0 else "failed"
+
+        self.queue.finish(job["id"], status, exit_code)
+        logging.error(f"~~~ Job {job['id']} ({job['alias']}) {status} ~~~")
+
+    def cancel(self, job_id):
+        if self.queue.cancel(job_id):
+            return True
+
+        proc = self._procs.get(job_id)
+        if proc is None:
+            return False
+
+        self.queue.cancelling(job_id)
+        terminate_build(proc)
+        return True
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    builder = None
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        job = None
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.builder.queue.get(int(parts[1])) if parts[1].isdigit() else None
+            if job is None:
+                self.send_json(404, {"message": f"No job {parts[1]}"})
+                return None, None, None
+
+        return parts, parse_qs(url.query), job
+
+    def do_GET(self):
+        parts, query, job = self.route()
+        if parts is None:
+            return
+
+        if parts == ["status"]:
+            builder = self.builder
+            self.send_json(
+                200,
+                {
+                    "workers": builder.workers,
+                    "caps": builder.caps,
+                    "default_cap": builder.default_cap,
+                    "running": builder.queue.running(),
+                    "queued": len(builder.queue.jobs("queued", limit=100000)),
+                },
+            )
+        elif parts == ["jobs"]:
+            self.send_json(200, self.builder.queue.jobs(query.get("status", [None])[0]))
+        elif len(parts) == 2:
+            self.send_json(200, job)
+        elif len(parts) == 3 and parts[2] == "log":
+            self.stream_log(job, query.get("follow", ["0"])[0] == "1")
+        else:
+            self.send_json(404, {"message": f"Unknown path {self.path}"})
+
+    def stream_log(self, job, follow):
+        # Without a Content-Length the body runs until the connection closes.
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.end_headers()
+
+        offset = 0
+        while True:
+            finished = self.builder.queue.get(job["id"])["status"] in FINISHED
+            if os.path.isfile(job["log"]):
+                with open(job["log"], "rb") as log:
+                    log.seek(offset)
+                    data = log.read()
+                if data:
+                    self.wfile.write(data)
+                    self.wfile.flush()
+                    offset = offset + len(data)
+            if not follow or finished:
+                break
+            time.sleep(FOLLOW_INTERVAL)
+
+    def do_POST(self):
+        parts, _, _ = self.route()
+        if parts != ["jobs"]:
+            self.send_json(404, {"message": f"Unknown path {self.path}"})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            alias, project, options = job_request(body)
+        except ValueError as e:
+            self.send_json(400, {"message": f"Bad job ~ {e}"})
+            return
+
+        # Builds balanced across DEVHUBS get their Dev Hub when claimed.
+        job_id = self.builder.queue.submit(alias, options.get("devhub") or BALANCED, project, options)
+        self.builder.wake()
+        self.send_json(201, self.builder.queue.get(job_id))
+
+    def do_DELETE(self):
+        parts, _, job = self.route()
+        if parts is None:
+            return
+
+        if len(parts) != 2 or not self.builder.cancel(job["id"]):
+            self.send_json(409, {"message": f"Job {job['id']} is {job['status']}"})
+            return
+
+        self.send_json(200, self.builder.queue.get(job["id"]))
+
+
+def serve(args, cfg):
+    caps = cfg.get("DEVHUB_MAX_BUILDS") or {}
+    default_cap = args.devhub_cap
+    if isinstance(caps, int):
+        caps, default_cap = {}, caps
+
+    builder = Builder(JobQueue(), args.workers, caps, default_cap, cfg.get("DEVHUBS") or [])
+    builder.start()
+
+    handler = type("Handler", (DaemonHandler,), {"builder": builder})
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    server.daemon_threads = True
+
+    def shutdown(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+
+    logging.error(f"~~~ Org builder daemon on http://127.0.0.1:{server.server_address[1]}, {args.workers} workers ~~~")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        builder.stop()
+        server.server_close()
+
+    return 0
+
+
+#
+# Client
+#
+
+
+def call(args, method, path, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = Request(f"http://127.0.0.1:{args.port}{path}", data=data, method=method)
+    request.add_header("Content-Type", "application/json")
+
+    try:
+        with urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+    except HTTPError as e:
+        message = json.loads(e.read() or b"{}").get("message", e.reason)
+        logging.error(f"MESSAGE: {message}")
+        sys.exit(1)
+    except URLError as e:
+        logging.error(f"No org builder daemon on port {args.port} ~ {e.reason}")
+        sys.exit(1)
+
+
+def follow_log(args, job_id):
+    with urlopen(f"http://127.0.0.1:{args.port}/jobs/{job_id}/log?follow=1") as response:
+        for line in response:
+            sys.stdout.write(line.decode("utf-8", "replace"))
+            sys.stdout.flush()
+
+
+def submit(args, cfg):
+    options = {
+        "config": os.path.abspath(args.config),
+        "scratch_def": args.scratch_def,
+        "duration": args.duration,
+        "devhub": args.devhub,
+        "email": args.email,
+        "skip": args.skip,
+        "resume": args.resume,
+        "redeploy": args.redeploy,
+        "snapshot": args.snapshot,
+        "trace": None,
+        "debug": args.debug,
+    }
+    job = call(args, "POST", "/jobs", {"alias": args.alias, "project": os.getcwd(), "options": options})
+    print(f"Job {job['id']} ({job['alias']}) {job['status']}")
+
+    if not args.wait:
+        return 0
+
+    follow_log(args, job["id"])
+    job = call(args, "GET", f"/jobs/{job['id']}")
+    print(f"Job {job['id']} ({job['alias']}) {job['status']}")
+
+    return 0 if job["status"] == "complete" else 1
+
+
+def print_jobs(jobs):
+    print()
+    print(f"{'Id':>5} {'Alias':<30} {'Dev Hub':<25} {'Status':<10} {'Seconds':>8}")
+    print(f"{'--':>5} {'-----':<30} {'-------':<25} {'------':<10} {'-------':>8}")
+    for job in jobs:
+        seconds = ""
+        if job["started"]:
+            seconds = f"{(job['finished'] or time.time()) - job['started']:.0f}"
+        print(f"{job['id']:>5} {job['alias']:<30} {job['devhub']:<25} {job['status']:<10} {seconds:>8}")
+    print()
+
+
+def status(args, cfg):
+    if args.job:
+        print_jobs([call(args, "GET", f"/jobs/{args.job}")])
+    else:
+        print_jobs(call(args, "GET", "/jobs"))
+
+    return 0
+
+
+def log(args, cfg):
+    if args.follow:
+        follow_log(args, args.job)
+        return 0
+
+    with urlopen(f"http://127.0.0.1:{args.port}/jobs/{args.job}/log") as response:
+        sys.stdout.write(response.read().decode("utf-8", "replace"))
+
+    return 0
+
+
+def cancel(args, cfg):
+    job = call(args, "DELETE", f"/jobs/{args.job}")
+    print(f"Job {job['id']} ({job['alias']}) {job['status']}")
+
+    return 0
+
+
+def setup_args(cfg, config_file):
+    parser = argparse.ArgumentParser(
+        prog="org_daemon",
+        description="""
+Run org builds as jobs of a long running local service.
+    """,
+    )
+    parser.add_argument("-c", "--config", help=f"Config file. Default: {config_file}", default=config_file)
+    parser.add_argument(
+        "-p",
+        "--port",
+        help=f"Daemon port. Default: {cfg.get('DAEMON_PORT', DAEMON_PORT)}",
+        default=cfg.get("DAEMON_PORT", DAEMON_PORT),
+        type=int,
+    )
+    parser.add_argument("--debug", help="Turn on debug messages", action="store_true")
+
+    commands = parser.add_subparsers(dest="command", metavar="{serve,submit,status,log,cancel}")
+
+    serve_args = commands.add_parser("serve", help="Run the daemon")
+    serve_args.add_argument(
+        "--workers",
+        help=f"Builds run at the same time. Default: {cfg.get('DAEMON_WORKERS', DAEMON_WORKERS)}",
+        default=cfg.get("DAEMON_WORKERS", DAEMON_WORKERS),
+        type=int,
+    )
+    serve_args.add_argument(
+        "--devhub-cap",
+        help=f"Builds run at the same time per Dev Hub. Default: {DEVHUB_MAX_BUILDS}",
+        default=DEVHUB_MAX_BUILDS,
+        type=int,
+    )
+
+    submit_args = commands.add_parser("submit", help="Queue a build of the current project")
+    submit_args.add_argument("-a", "--alias", help="Scratch Org user alias", required=True)
+    submit_args.add_argument(
+        "-f",
+        "--scratch-def",
+        help=f"Scratch org definition file. Default: {cfg['SCRATCH_DEF']}",
+        default=cfg["SCRATCH_DEF"],
+    )
+    submit_args.add_argument(
+        "-d",
+        "--duration",
+        help=f"Number of days org will last [1..30]. Default: {cfg['DURATION']}",
+        default=cfg["DURATION"],
+        type=int,
+    )
+    submit_args.add_argument(
+        "-v",
+        "--devhub",
+        help=f"Target dev hub username or alias. Default: {devhub_balancer.default_devhub(cfg) or 'DEVHUBS'}",
+        default=devhub_balancer.default_devhub(cfg),
+    )
+    submit_args.add_argument("-e", "--email", help="Email address that will be applied to the org's admin user")
+    submit_args.add_argument("--skip", help="Skip source deploy", action="store_true")
+    submit_args.add_argument("--resume", help="Skip the steps completed by the last run", action="store_true")
+    submit_args.add_argument("--redeploy", help="Deploy every source folder", action="store_true")
+    submit_args.add_argument("--snapshot", help="Build from / save an org snapshot", action="store_true")
+    submit_args.add_argument("--wait", help="Follow the build log until the job ends", action="store_true")
+
+    status_args = commands.add_parser("status", help="List jobs, or show one")
+    status_args.add_argument("job", help="Job id", nargs="?", type=int)
+
+    log_args = commands.add_parser("log", help="Print a job's build log")
+    log_args.add_argument("job", help="Job id", type=int)
+    log_args.add_argument("--follow", help="Keep printing until the job ends", action="store_true")
+
+    cancel_args = commands.add_parser("cancel", help="Cancel a queued or running job")
+    cancel_args.add_argument("job", help="Job id", type=int)
+
+    return parser
+
+
+def main(config_file="./org_config.yml", argv=None):
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("-c", "--config", default=config_file)
+    config_file = pre_parser.parse_known_args(argv)[0].config
+
+    cfg = get_config(config_file)
+    parser = setup_args(cfg, config_file)
+    args = parser.parse_args(argv)
+
+    if args.debug:
+        logging.error("~~~ Setting up DEBUG ~~~")
+        logger.setLevel(logging.INFO)
+
+    commands = {"serve": serve, "submit": submit, "status": status, "log": log, "cancel": cancel}
+    if args.command is None:
+        parser.print_help()
+        sys.exit(0)
+
+    sys.exit(commands[args.command](args, cfg))
+
+
+if __name__ == "__main__":
+    main()
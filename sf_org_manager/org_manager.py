@@ -1,21 +1,31 @@
 # org_manager.py
 __version__ = "0.0.3"
 
+#
+# The org list is drawn at once from the CLI's auth files (or the last
+# cached `sf org list`), while `sf org list` runs in the background. When it
+# returns, the rows that changed are redrawn in place above the prompt.
+# sfdx_cli_utils is only imported off the listing path, for a quick start.
+#
+
 import argparse
-import json
 import logging
-import os
 import sys
 import threading
 import traceback
 
-from . import sfdx_cli_utils as sfdx
+from . import local_auth
 
 # Config
 #
 TGREEN = "\033[1;32m"
 TRED = "\033[1;31m"
+TYELLOW = "\033[1;33m"
 ENDC = "\033[m"
+# Marks rows not yet confirmed by `sf org list`.
+STALE_MARK = "~"
+# sf commands run at once by --maintain, unless set with --workers.
+MAINTAIN_WORKERS = 8
 #
 #
 
@@ -40,6 +50,37 @@ Python wrapper for Salesforce CLI (sfdx) that list Salesforce orgs.
 
 def setup_args():
     logging.debug("setup_args()")
+    parser.add_argument(
+        "--status",
+        help="Wait for the sf CLI's live connection status before listing",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--no-refresh",
+        help="Only list the orgs in the CLI's auth files, without running sf",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--maintain",
+        help="Check every org and delete / log out the expired & unreachable ones",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--dry-run",
+        help="With --maintain, only show what would be cleaned up",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--logout-unreachable",
+        help="With --maintain, also log out unreachable orgs that are not scratch orgs",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--workers",
+        help=f"With --maintain, sf commands run at once. Default: {MAINTAIN_WORKERS}",
+        default=MAINTAIN_WORKERS,
+        type=int,
+    )
     parser.add_argument("--debug", help="Turn on debug messages", action="store_true")
 
 
@@ -57,7 +98,7 @@ def clean_org_data(org):
         org.update(dm)
 
     if "status" not in org:
-        s = {"status": "Active"}
+        s = {"status": org.get("connectedStatus", "Active")}
         org.update(s)
 
     if "expirationDate" not in org:
@@ -67,18 +108,23 @@ def clean_org_data(org):
     return org
 
 
-def get_org_list():
-    if os.path.isfile("./org_list.json"):
-        with open("./org_list.json", "r") as jsonfile:
-            org_list = json.load(jsonfile)
+def get_org_list(status=False):
+    # Served from the sf command cache, refreshed in the background once stale.
+    from . import sfdx_cli_utils as sfdx
+
+    return sfdx.org_list(fresh=status)
+
 
-        t = threading.Thread(target=update_org_list)
-        t.start()
+def get_cached_org_list():
+    # Without running sf: the CLI's alias & auth files, else the last cached
+    # `sf org list`. None on a first run with neither.
+    py_obj = local_auth.org_list()
+    if py_obj:
+        return py_obj
 
-    else:
-        org_list = update_org_list()
+    from . import sfdx_cli_utils as sfdx
 
-    return org_list
+    return sfdx.org_list_cached()
 
 
 def get_orgs_map(orgs):
@@ -124,17 +170,21 @@ def get_orgs_map(orgs):
     return orgs, defaultusername
 
 
-def print_org_details(idx, o):
+def org_details(idx, o, stale=False):
     color = TGREEN
-    if o["status"] != "Active":
+    if o["status"] not in ("Active", "Connected"):
         color = TRED
 
-    print(
-        f"{idx:>3} {o['defaultMarker']:<3} {o['alias']:<30} {o['username']:<45} {o['expirationDate']:<12} {color}{o['status']:<10}{ENDC}"
-    )
+    mark = f" {TYELLOW}{STALE_MARK}{ENDC}" if stale else ""
+
+    return f"{idx:>3} {o['defaultMarker']:<3} {o['alias']:<30} {o['username']:<45} {o['expirationDate']:<12} {color}{o['status']:<10}{ENDC}{mark}"
 
 
-def print_org_list(orgs):
+def print_org_details(idx, o, stale=False):
+    print(org_details(idx, o, stale))
+
+
+def print_org_list(orgs, stale=False):
     print(
         f"{'idx':>3} {'':<3} {'Alias':<30} {'Username':<45} {'Expiration':<12} {'Status':<10}"
     )
@@ -143,19 +193,114 @@ def print_org_list(orgs):
     )
 
     for idx, o in orgs.items():
-        print_org_details(idx, o)
-
-
-def show_org_list(orgs):
-    print()
-    print_org_list(orgs)
+        print_org_details(idx, o, stale)
+
+
+class OrgListView:
+    # The drawn org list. Lines are rewritten relative to the prompt line the
+    # cursor is on: the rows, a blank line, the legend, a blank line, prompt.
+    def __init__(self, orgs, stale):
+        self.orgs = orgs
+        self.stale = stale
+        self.added = 0
+        self._lock = threading.Lock()
+        self._live = sys.stdout.isatty()
+        self._prompted = False
+        self._result = None
+
+    def legend(self):
+        if self.stale:
+            return f"{TYELLOW}{STALE_MARK}{ENDC} from the CLI's auth files, refreshing from sf org list ..."
+        return ""
+
+    def draw(self):
+        print()
+        print_org_list(self.orgs, self.stale)
+        print()
+        print(self.legend())
+
+    def rewrite(self, lines_up, text):
+        # Save the cursor, rewrite the line, restore: typed input is kept.
+        sys.stdout.write(f"\0337\033[{lines_up}A\r\033[2K{text}\0338")
+        sys.stdout.flush()
+
+    def close(self):
+        # Nothing is redrawn once the list is left.
+        with self._lock:
+            self._live = False
+
+    def prompted(self):
+        # Line positions are known once the prompt is shown.
+        with self._lock:
+            self._prompted = True
+            if self._result is not None:
+                self.apply(self._result)
+
+    def refreshed(self, py_obj):
+        with self._lock:
+            self._result = py_obj
+            if self._prompted:
+                self.apply(py_obj)
+
+    def apply(self, py_obj):
+        # Under self._lock.
+        if py_obj.get("status") != 0:
+            if self._live:
+                self.rewrite(2, f"{TRED}Refresh failed ~ {py_obj.get('message')}{ENDC}")
+            return
+
+        fresh, _ = get_orgs_map(py_obj)
+        by_username = {o["username"]: o for o in fresh.values()}
+
+        rows = list(self.orgs)
+        for pos, idx in enumerate(rows):
+            o = self.orgs[idx]
+            new = by_username.pop(o["username"], None) or dict(o, status="Removed")
+            self.orgs[idx] = new
+            if self._live:
+                self.rewrite(len(rows) - pos + 3, org_details(idx, new))
+
+        # New orgs can be chosen by their idx, and drawn with R.
+        for o in by_username.values():
+            self.orgs[max(self.orgs, default=0) + 1] = o
+        self.added = len(by_username)
+        self.stale = False
+
+        if self._live:
+            legend = f"{TGREEN}Refreshed{ENDC}"
+            if self.added:
+                legend = f"{legend} ~ {self.added} new orgs, enter 'R' to show them"
+            self.rewrite(2, legend)
+
+
+def refresh_in_background(view):
+    def refresh():
+        try:
+            py_obj = get_org_list(status=True)
+        except Exception as e:
+            py_obj = {"status": 1, "message": repr(e)}
+        view.refreshed(py_obj)
+
+    thread = threading.Thread(target=refresh, daemon=True)
+    thread.start()
+
+    return thread
+
+
+def show_org_list(view):
+    view.draw()
     print()
-    choice = input("Enter choice 'idx' or 'U' > ") or "Q"
+    sys.stdout.write("Enter choice 'idx' or 'U' or 'R' > ")
+    sys.stdout.flush()
+    view.prompted()
+    choice = input() or "Q"
 
     return choice
 
 
 def user_details(org_alias):
+    from . import sfdx_cli_utils as sfdx
+
     py_obj = sfdx.user_details(org_alias)
 
     if py_obj["status"] == 1:
@@ -174,12 +319,29 @@ def user_details(org_alias):
         print(f"Token \t\t: {py_obj['result']['accessToken']}")
 
 
-def update_org_list():
-    org_list = sfdx.org_list()
-    with open("./org_list.json", "w") as jsonfile:
-        json.dump(org_list, jsonfile)
+def choose_org(args):
+    # The instant list, refreshed in place, unless --status or --no-refresh.
+    org_list = None if args.status else get_cached_org_list()
+    refresh = not args.no_refresh and org_list is not None
+    if org_list is None:
+        if args.no_refresh:
+            logging.error("No orgs in the CLI's auth files")
+            sys.exit(1)
+        org_list = get_org_list(status=args.status)
+
+    orgs, defaultusername = get_orgs_map(org_list)
+    view = OrgListView(orgs, stale=refresh)
+    if refresh:
+        refresh_in_background(view)
 
-    return org_list
+    while True:
+        choice = show_org_list(view)
+        view.close()
+        if choice.upper() != "R":
+            break
+        view = OrgListView(view.orgs, stale=False)
+
+    return choice, view.orgs, defaultusername
 
 
 def main():
@@ -192,11 +354,13 @@ def main():
 
     logging.info(f"argv[0] ~ {sys.argv[0]}")
 
-    try:
-        org_list = get_org_list()
-        orgs, defaultusername = get_orgs_map(org_list)
+    if args.maintain:
+        from . import maintenance
 
-        choice = show_org_list(orgs)
+        sys.exit(maintenance.run(args))
+
+    try:
+        choice, orgs, defaultusername = choose_org(args)
 
         if choice.isnumeric():
             idx = int(choice)
@@ -217,6 +381,8 @@ def main():
         action = input(f"[O]pen '{username}' >  ") or "O"
 
         if action.upper() == "O" or action.upper() == "OPEN":
+            from . import sfdx_cli_utils as sfdx
+
             logging.error(f"~~~ Opening Org ({username}) ~~~")
             sfdx.org_open(org["username"])
         elif action.upper() == "Q" or action.upper() == "QUIT":
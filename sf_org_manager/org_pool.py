@@ -0,0 +1,332 @@
+# org_pool.py
+__version__ = "0.0.3"
+
+#
+# Keeps a pool of fully built scratch orgs ready to be claimed. Pool orgs
+# are keyed by a hash of the scratch definition and org_config.yml, so a
+# claim only hands over an org built from the current config.
+#
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from . import devhub_balancer
+from . import fleet
+from . import local_auth
+from . import local_state
+from . import sfdx_cli_utils as sfdx
+from .org_builder import get_config
+
+# Set the Log level
+#
+logging.basicConfig(
+    level=logging.ERROR, format="%(asctime)s - %(message)s", datefmt="%d-%b-%y %H:%M:%S"
+)
+logger = logging.getLogger()
+#
+
+# Config
+#
+# A pool org still "building" after this many seconds is assumed lost.
+BUILD_TIMEOUT_SEC = 4 * 60 * 60
+#
+
+
+def setup_args(cfg, config_file):
+    parser = argparse.ArgumentParser(
+        prog="org_pool",
+        description="""
+Keep a pool of fully built scratch orgs and hand them over instantly.
+    """,
+    )
+    parser.add_argument("-c", "--config", help=f"Config file. Default: {config_file}", default=config_file)
+    parser.add_argument(
+        "-f",
+        "--scratch-def",
+        help=f"Scratch org definition file. Default: {cfg['SCRATCH_DEF']}",
+        default=cfg["SCRATCH_DEF"],
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        help=f"Number of days pool orgs last [1..30]. Default: {cfg['DURATION']}",
+        default=cfg["DURATION"],
+        type=int,
+    )
+    parser.add_argument(
+        "-v",
+        "--devhub",
+        help=f"Target dev hub username or alias. Default: {devhub_balancer.default_devhub(cfg) or 'DEVHUBS'}",
+        default=devhub_balancer.default_devhub(cfg),
+    )
+    parser.add_argument(
+        "-s",
+        "--size",
+        help=f"Number of ready orgs to keep. Default: {cfg.get('POOL_SIZE', 2)}",
+        default=cfg.get("POOL_SIZE", 2),
+        type=int,
+    )
+    parser.add_argument(
+        "--min-days",
+        help=f"Drop orgs expiring within this many days. Default: {cfg.get('POOL_MIN_DAYS', 2)}",
+        default=cfg.get("POOL_MIN_DAYS", 2),
+        type=int,
+    )
+    parser.add_argument("--workers", help="Orgs built at the same time. Default: 2", default=2, type=int)
+    parser.add_argument("--debug", help="Turn on debug messages", action="store_true")
+    parser.set_defaults(email=None, skip=False, redeploy=False, resume=False, trace=None, snapshot=False)
+
+    commands = parser.add_subparsers(dest="command", metavar="{status,fill,claim,prune}")
+    commands.add_parser("status", help="List the orgs in the pool")
+    commands.add_parser("fill", help="Build orgs until the pool has --size ready orgs")
+    claim = commands.add_parser("claim", help="Hand over a ready org under a new alias")
+    claim.add_argument("alias", help="Alias for the claimed org")
+    claim.add_argument("--no-refill", help="Don't refill the pool in the background", action="store_true")
+    commands.add_parser("prune", help="Delete stale and soon to expire pool orgs")
+
+    return parser
+
+
+def pool_file():
+    return local_state.state_path("pool", "pool.json")
+
+
+def pool_key(args):
+    return local_state.hash_files(args.scratch_def, args.config)[:16]
+
+
+def load_pool():
+    return local_state.read_json(pool_file(), {"orgs": []})
+
+
+def is_stale(org, key, min_days):
+    if org["project"] != os.getcwd():
+        return False
+
+    if org["key"] != key:
+        return True
+
+    if org["state"] == "building":
+        return time.time() - org["created"] > BUILD_TIMEOUT_SEC
+
+    cutoff = (date.today() + timedelta(days=min_days)).isoformat()
+    return org["expirationDate"] < cutoff
+
+
+def take_stale(pool, key, min_days):
+    stale = [org for org in pool["orgs"] if is_stale(org, key, min_days)]
+    pool["orgs"] = [org for org in pool["orgs"] if org not in stale]
+    return stale
+
+
+def delete_orgs(orgs):
+    for org in orgs:
+        logging.error(f"~~~ Dropping pool org ({org['alias']}) ~~~")
+        if org.get("username"):
+            py_obj = sfdx.delete_org(org["username"])
+            if py_obj["status"] == 1:
+                logging.warning(f"MESSAGE: {py_obj['message']}")
+
+
+def pool_orgs(pool, key, state=None):
+    return [
+        org
+        for org in pool["orgs"]
+        if org["key"] == key and org["project"] == os.getcwd() and (state is None or org["state"] == state)
+    ]
+
+
+def fill(args):
+    key = pool_key(args)
+
+    with local_state.file_lock(pool_file()):
+        pool = load_pool()
+        stale = take_stale(pool, key, args.min_days)
+
+        new_orgs = []
+        for _ in range(args.size - len(pool_orgs(pool, key))):
+            new_orgs.append(
+                {
+                    "alias": f"pool-{key[:8]}-{uuid.uuid4().hex[:6]}",
+                    "username": "",
+                    "key": key,
+                    "project": os.getcwd(),
+                    "config": args.config,
+                    "scratch_def": args.scratch_def,
+                    "state": "building",
+                    "created": time.time(),
+                    "expirationDate": "",
+                }
+            )
+        pool["orgs"] += new_orgs
+        local_state.write_json(pool_file(), pool)
+
+    delete_orgs(stale)
+
+    if not new_orgs:
+        logging.error("~~~ Pool is full ~~~")
+        return 0
+
+    log_dir = local_state.state_dir("pool", "logs")
+    logging.error(f"~~~ Building {len(new_orgs)} pool orgs ~~~")
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool_workers:
+        results = list(
+            pool_workers.map(
+                lambda org: fleet.build_org(
+                    fleet.child_cmd(args, org["alias"], args.scratch_def), org["alias"], args.scratch_def, log_dir
+                ),
+                new_orgs,
+            )
+        )
+
+    built = {}
+    py_obj = local_auth.org_list() or sfdx.org_list(fresh=True)
+    if py_obj["status"] == 0:
+        built = {org.get("alias"): org for org in py_obj["result"]["scratchOrgs"]}
+
+    with local_state.file_lock(pool_file()):
+        pool = load_pool()
+        for result in results:
+            org = next((o for o in pool["orgs"] if o["alias"] == result["alias"]), None)
+            if org is None:
+                continue
+            if result["exit_code"] != 0 or result["alias"] not in built:
+                logging.error(f"~~~ Pool org failed ({result['alias']}) see {result['log']} ~~~")
+                pool["orgs"].remove(org)
+                continue
+            org["state"] = "ready"
+            org["username"] = built[result["alias"]]["username"]
+            org["expirationDate"] = built[result["alias"]]["expirationDate"]
+        local_state.write_json(pool_file(), pool)
+
+    return 1 if any(r["exit_code"] != 0 for r in results) else 0
+
+
+def refill_in_background(args):
+    cmd = [
+        sys.executable,
+        "-m",
+        "sf_org_manager.org_pool",
+        "-c",
+        args.config,
+        "-f",
+        args.scratch_def,
+        "-d",
+        str(args.duration),
+        "-s",
+        str(args.size),
+        "--min-days",
+        str(args.min_days),
+    ]
+
+    if args.devhub:
+        cmd += ["-v", args.devhub]
+    cmd.append("fill")
+
+    if sys.platform == "win32":
+        detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+
+    logging.error("~~~ Refilling the pool in the background ~~~")
+    with open(local_state.state_path("pool", "logs", "refill.log"), "a") as log:
+        subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, **detach)
+
+
+def claim(args):
+    key = pool_key(args)
+
+    with local_state.file_lock(pool_file()):
+        pool = load_pool()
+        stale = take_stale(pool, key, args.min_days)
+        ready = sorted(pool_orgs(pool, key, "ready"), key=lambda o: o["created"])
+        org = ready[0] if ready else None
+        if org:
+            pool["orgs"].remove(org)
+        local_state.write_json(pool_file(), pool)
+
+    if not args.no_refill:
+        refill_in_background(args)
+
+    delete_orgs(stale)
+
+    if org is None:
+        logging.error("~~~ No ready org in the pool, run 'sf-org_pool fill' ~~~")
+        return 1
+
+    py_obj = sfdx.alias_set(args.alias, org["username"])
+    if py_obj["status"] == 1:
+        logging.error(f"MESSAGE: {py_obj['message']}")
+        return 1
+    sfdx.alias_unset(org["alias"])
+
+    logging.error(f"~~~ Claimed ({args.alias}) ~~~")
+    print(f"Alias \t\t: {args.alias}")
+    print(f"Username \t: {org['username']}")
+    print(f"Expiration \t: {org['expirationDate']}")
+
+    return 0
+
+
+def prune(args):
+    with local_state.file_lock(pool_file()):
+        pool = load_pool()
+        stale = take_stale(pool, pool_key(args), args.min_days)
+        local_state.write_json(pool_file(), pool)
+
+    delete_orgs(stale)
+
+    return 0
+
+
+def status(args):
+    key = pool_key(args)
+    pool = load_pool()
+
+    print()
+    print(f"{'Alias':<30} {'Username':<45} {'Expiration':<12} {'State':<10} {'Current':<8}")
+    print(f"{'-----':<30} {'--------':<45} {'----------':<12} {'-----':<10} {'-------':<8}")
+    for org in pool["orgs"]:
+        if org["project"] != os.getcwd():
+            continue
+        current = "yes" if org["key"] == key else "no"
+        print(
+            f"{org['alias']:<30} {org['username']:<45} {org['expirationDate']:<12} {org['state']:<10} {current:<8}"
+        )
+    print()
+
+    return 0
+
+
+def main(config_file="./org_config.yml", argv=None):
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("-c", "--config", default=config_file)
+    config_file = pre_parser.parse_known_args(argv)[0].config
+
+    cfg = get_config(config_file)
+    parser = setup_args(cfg, config_file)
+    args = parser.parse_args(argv)
+
+    if args.debug:
+        logging.error("~~~ Setting up DEBUG ~~~")
+        logger.setLevel(logging.INFO)
+
+    commands = {"status": status, "fill": fill, "claim": claim, "prune": prune}
+    if args.command is None:
+        parser.print_help()
+        sys.exit(0)
+
+    sys.exit(commands[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
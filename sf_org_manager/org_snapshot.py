@@ -0,0 +1,172 @@
+# org_snapshot.py
+__version__ = "0.0.3"
+
+#
+# Scratch org snapshots. After a `--snapshot` build the org is saved as a
+# Dev Hub snapshot, together with the build journal and the source folders
+# deployed to it. A later `--snapshot` build with the same org shape
+# (scratch definition, packages, Dev Hub) and project source (the
+# sfdx-project packageDirectories) creates its org from the newest
+# ready snapshot, starts from that journal & source manifest, and so only
+# runs the steps & deploys whose inputs changed since.
+#
+
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+
+from . import journal
+from . import local_state
+from . import sfdx_cli_utils as sfdx
+from . import source_manifest
+
+# Config
+#
+# Snapshot names are at most 15 characters, starting with a letter.
+NAME_PREFIX = "OB"
+#
+
+READY = "Active"
+FAILED = ("Error", "Expired")
+
+
+def registry_file():
+    return local_state.state_path("snapshots", "snapshots.json")
+
+
+def snapshot_key(cfg, devhub, dir_path):
+    # The org shape (what a build cannot change a snapshot into) and the
+    # project source deployed by source tracking.
+    scratch_def = cfg["SCRATCH_DEF"]
+    key = {
+        "source": [local_state.hash_folder(folder) for folder in local_state.project_folders(dir_path)],
+        "scratch_def": local_state.hash_files(scratch_def) if os.path.isfile(scratch_def) else scratch_def,
+        "packages": cfg["PACKAGE_IDS"] or [],
+        "namespace": cfg["USE_NAMESPACE"],
+        "preview": cfg.get("PREVIEW", False),
+        "devhub": devhub,
+    }
+
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def new_name(key):
+    return f"{NAME_PREFIX}{key[:6]}{uuid.uuid4().hex[:15 - len(NAME_PREFIX) - 6]}"
+
+
+def update_registry(func):
+    # func(snapshots) changes the list of snapshots in place.
+    path = registry_file()
+
+    with local_state.file_lock(path):
+        snapshots = local_state.read_json(path, [])
+        func(snapshots)
+        local_state.write_json(path, snapshots)
+
+    return snapshots
+
+
+def refresh_status(snapshot):
+    py_obj = sfdx.get_snapshot(snapshot["devhub"], snapshot["name"])
+
+    if py_obj["status"] == 0:
+        return py_obj["result"]["Status"]
+    if py_obj.get("name") in ("NoResultsError", "SnapshotNotFound"):
+        return "Expired"
+
+    logging.warning(f"Snapshot {snapshot['name']} status unknown ~ {py_obj.get('message')}")
+    return snapshot["status"]
+
+
+def delete(snapshot):
+    py_obj = sfdx.delete_snapshot(snapshot["devhub"], snapshot["name"])
+    if py_obj["status"] == 1:
+        logging.warning(f"Unable to delete snapshot {snapshot['name']} ~ {py_obj.get('message')}")
+
+
+def find(key, devhub):
+    # Newest ready snapshot for key; older ones for key are deleted once a
+    # newer one is ready.
+    snapshots = local_state.read_json(registry_file(), [])
+    candidates = [s for s in snapshots if s["key"] == key and s["devhub"] == devhub]
+    candidates.sort(key=lambda s: s["created"], reverse=True)
+
+    statuses = {}
+    ready = None
+    for snapshot in candidates:
+        status = snapshot["status"] if snapshot["status"] == READY else refresh_status(snapshot)
+        statuses[snapshot["name"]] = status
+        if status == READY:
+            ready = snapshot
+            break
+
+    stale = [
+        s
+        for s in candidates
+        if statuses.get(s["name"]) in FAILED or (ready and s["created"] < ready["created"])
+    ]
+    for snapshot in stale:
+        logging.error(f"~~~ Removing snapshot {snapshot['name']} ~~~")
+        delete(snapshot)
+
+    def update(snapshots):
+        names = {s["name"] for s in stale}
+        snapshots[:] = [s for s in snapshots if s["name"] not in names]
+        for s in snapshots:
+            s["status"] = statuses.get(s["name"], s["status"])
+
+    update_registry(update)
+
+    if ready:
+        logging.error(f"~~~ Using snapshot {ready['name']} ~~~")
+    return ready
+
+
+def seed(snapshot, alias, username):
+    # The new org has what the snapshot's build did.
+    journal.seed(alias, username, snapshot["steps"])
+    source_manifest.seed(username, snapshot["folders"])
+
+
+def latest(key, devhub):
+    snapshots = [s for s in local_state.read_json(registry_file(), []) if s["key"] == key and s["devhub"] == devhub]
+
+    return max(snapshots, key=lambda s: s["created"], default=None)
+
+
+def save(key, devhub, alias, username):
+    # Snapshot the org unless the newest snapshot for key already has the
+    # same steps & source. The Dev Hub builds it in the background.
+    steps = journal.completed_steps(alias, username)
+    folders = source_manifest.deployed(username)
+
+    newest = latest(key, devhub)
+    if newest and newest["steps"] == steps and newest["folders"] == folders:
+        logging.error(f"~~~ Snapshot {newest['name']} is up to date ~~~")
+        return newest
+
+    name = new_name(key)
+    py_obj = sfdx.create_snapshot(devhub, username, name, f"org_builder {alias}")
+    if py_obj["status"] == 1:
+        # The build itself worked, a missing snapshot only costs the next build time.
+        logging.error(f"Unable to create snapshot ~ MESSAGE: {py_obj['message']}")
+        logging.warning(f"{py_obj}")
+        return None
+
+    snapshot = {
+        "name": name,
+        "key": key,
+        "devhub": devhub,
+        "status": py_obj["result"].get("Status", "In Progress"),
+        "created": time.time(),
+        "source_org": username,
+        "steps": steps,
+        "folders": folders,
+    }
+    update_registry(lambda snapshots: snapshots.append(snapshot))
+    logging.error(f"~~~ Snapshot {name} requested ({snapshot['status']}) ~~~")
+
+    return snapshot
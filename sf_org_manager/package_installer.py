@@ -0,0 +1,104 @@
+# package_installer.py
+__version__ = "0.0.3"
+
+#
+# Installs PACKAGE_IDS concurrently. Packages are submitted as soon as the
+# packages they depend on are installed, and every in-flight install is
+# tracked by the sfdx_cli_utils job poller.
+#
+
+import asyncio
+import logging
+
+from . import sfdx_cli_utils as sfdx
+from .errors import BuildError, SfdxError
+from .scheduler import check_cycles
+
+
+def same_package(a, b):
+    # Package version ids may be given in their 15 or 18 character form.
+    return a[:15] == b[:15]
+
+
+async def fetch_dependencies(org_alias, package_ids):
+    results = await asyncio.gather(*[sfdx.package_dependencies_async(org_alias, pckg) for pckg in package_ids])
+
+    depends = {}
+    for pckg, py_obj in zip(package_ids, results):
+        if py_obj.get("status") != 0 or not py_obj["result"]["records"]:
+            logging.warning(f"Unable to read dependencies of {pckg} ~ {py_obj.get('message', 'not found')}")
+            return None
+
+        ids = (py_obj["result"]["records"][0].get("Dependencies") or {}).get("ids") or []
+        depends[pckg] = [
+            other
+            for dep in ids
+            for other in package_ids
+            if same_package(dep["subscriberPackageVersionId"], other)
+        ]
+
+    return depends
+
+
+def listed_order(package_ids):
+    return {pckg: package_ids[:idx][-1:] for idx, pckg in enumerate(package_ids)}
+
+
+def install_error(package_id, py_obj):
+    if py_obj["status"] == 1:
+        message = py_obj["message"]
+    else:
+        errors = (py_obj["result"].get("Errors") or {}).get("errors") or []
+        message = "; ".join(e.get("message", "") for e in errors) or py_obj["result"]["Status"]
+
+    logging.error(f"Package install {package_id} failed ~ MESSAGE: {message}")
+    logging.warning(f"{py_obj}")
+    raise SfdxError(py_obj.get("name") or "PackageInstallError", message, py_obj)
+
+
+async def install_packages_async(org_alias, package_ids, package_depends=None):
+    depends = await fetch_dependencies(org_alias, package_ids)
+    if depends is None:
+        logging.error("~~~ Installing Packages in listed order ~~~")
+        depends = listed_order(package_ids)
+
+    for pckg, deps in (package_depends or {}).items():
+        if pckg in depends:
+            depends[pckg] += [d for d in deps if d in package_ids]
+
+    waiting = {pckg: set(depends[pckg]) for pckg in package_ids}
+    check_cycles(waiting)
+
+    installed = set()
+    in_flight = {}
+    durations = {}
+
+    while waiting or in_flight:
+        ready = [pckg for pckg, deps in waiting.items() if deps <= installed]
+        for pckg in ready:
+            logging.error(f"~~~ Installing Packages {pckg} ~~~")
+            del waiting[pckg]
+
+        jobs = await asyncio.gather(*[sfdx.install_package_job_async(org_alias, pckg) for pckg in ready])
+        for pckg, job in zip(ready, jobs):
+            in_flight[asyncio.ensure_future(job.wait_async())] = (pckg, job)
+
+        # The shared job poller reports on every install, on its own backoff.
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            pckg, job = in_flight.pop(future)
+            py_obj = future.result()
+            if py_obj.get("name") == "JobTimeoutError":
+                raise BuildError(f"Package install {pckg} not complete ~ {py_obj['message']}")
+            if py_obj["status"] == 1 or py_obj["result"]["Status"] != "SUCCESS":
+                install_error(pckg, py_obj)
+
+            logging.error(f"Checking package install status ~ {pckg} {job.status}")
+            installed.add(pckg)
+            durations[pckg] = job.seconds
+
+    return durations
+
+
+def install_packages(org_alias, package_ids, package_depends=None):
+    return asyncio.run(install_packages_async(org_alias, package_ids, package_depends))
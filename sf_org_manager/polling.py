@@ -0,0 +1,68 @@
+# polling.py
+__version__ = "0.0.3"
+
+#
+# Wait for Salesforce jobs with short first polls, exponential backoff
+# with jitter and an overall timeout.
+#
+
+import logging
+import random
+import time
+
+# Config
+#
+# Backoff profile per job type, seconds.
+POLL_PROFILES = {
+    "default": {"initial": 2, "factor": 2, "max_interval": 30, "timeout": 1800},
+    "package_install": {"initial": 2, "factor": 1.5, "max_interval": 30, "timeout": 3600},
+    "community": {"initial": 2, "factor": 1.5, "max_interval": 20, "timeout": 900},
+    "devhub": {"initial": 30, "factor": 1.5, "max_interval": 300, "timeout": 3600},
+}
+# Job types of the Salesforce jobs a build waits on, whose timeout the config
+# POLL_TIMEOUT sets; the others keep their own.
+BUILD_JOB_TYPES = ("default", "package_install", "community")
+JITTER = 0.2
+#
+
+
+def set_timeout(timeout: float):
+    # Overall timeout for the BUILD_JOB_TYPES, e.g. from the config POLL_TIMEOUT.
+    for job_type in BUILD_JOB_TYPES:
+        POLL_PROFILES[job_type]["timeout"] = timeout
+
+
+def profile(job_type: str):
+    return POLL_PROFILES.get(job_type, POLL_PROFILES["default"])
+
+
+def intervals(initial: float, factor: float, max_interval: float, jitter: float = JITTER):
+    interval = initial
+    while True:
+        yield interval * random.uniform(1 - jitter, 1 + jitter)
+        interval = min(interval * factor, max_interval)
+
+
+def poll(check, is_ready, job_type: str = "default", timeout: float = None, description: str = "", transient=None):
+    # Call check() until is_ready(result) is true; returns the last result.
+    # A check that fails with an error transient(error) accepts is retried.
+    settings = profile(job_type)
+    timeout = settings["timeout"] if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+
+    for delay in intervals(settings["initial"], settings["factor"], settings["max_interval"]):
+        try:
+            result = check()
+            if is_ready(result):
+                return result
+        except Exception as e:
+            if transient is None or not transient(e):
+                raise
+            logging.error(f"{description or job_type} check failed ~ {e}, checking again")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"{description or job_type} not ready after {timeout}s")
+
+        logging.info(f"{description or job_type} not ready, next check in {delay:.1f}s")
+        time.sleep(min(delay, remaining))
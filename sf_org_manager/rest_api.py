@@ -0,0 +1,243 @@
+# rest_api.py
+__version__ = "0.0.3"
+
+#
+# Minimal Salesforce REST / Tooling API client over pooled keep-alive
+# connections. Used instead of an `sf` process for the calls a build makes
+# most often; results are shaped like the `sf --json` output they replace.
+#
+
+import http.client
+import json
+import logging
+import queue
+import threading
+
+from urllib.parse import quote, urlencode, urlparse
+
+from . import tracing
+
+# Config
+#
+API_VERSION = "60.0"
+# Max open connections per org.
+POOL_SIZE = 4
+# Seconds to wait for a response.
+TIMEOUT_SEC = 120
+# Anonymous apex longer than this once URL-encoded is sent through the sf
+# CLI (URL length limit).
+MAX_APEX_LENGTH = 12000
+#
+
+
+class RestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status} ~ {message}")
+        self.status = status
+        self.message = message
+
+
+class SessionExpired(RestError):
+    pass
+
+
+class RestClient:
+    def __init__(self, instance_url, access_token, api_version=API_VERSION, pool_size=POOL_SIZE):
+        url = urlparse(instance_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.access_token = access_token
+        self.base_path = f"/services/data/v{api_version}"
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self):
+        if self.scheme == "http":
+            return http.client.HTTPConnection(self.host, self.port, timeout=TIMEOUT_SEC)
+        return http.client.HTTPSConnection(self.host, self.port, timeout=TIMEOUT_SEC)
+
+    def _send(self, conn, method, path, body):
+        headers = {
+            "Authorization": f"Bearer {self.access_token}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        }
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def request(self, method, path, body=None):
+        if not path.startswith("/"):
+            path = f"{self.base_path}/{path}"
+
+        name = path[len(self.base_path) + 1 :].split("?")[0]
+        with tracing.span(f"REST {method} {name}", "rest", org=self.host, path=path[:200]) as span_args, self._slots:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+
+            try:
+                try:
+                    status, data = self._send(conn, method, path, body)
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # The server closed an idle keep-alive connection.
+                    conn.close()
+                    conn = self._connect()
+                    status, data = self._send(conn, method, path, body)
+            except BaseException:
+                conn.close()
+                raise
+
+            self._pool.put_nowait(conn)
+            span_args["status"] = status
+            span_args["output_bytes"] = len(data)
+
+        logging.debug(f"REST {method} {path} ~ {status}")
+        py_obj = json.loads(data) if data else None
+
+        if status == 401:
+            raise SessionExpired(status, error_message(py_obj))
+        if status >= 400:
+            raise RestError(status, error_message(py_obj))
+
+        return py_obj
+
+    def query(self, soql, tooling=False):
+        path = f"{'tooling/' if tooling else ''}query/?{urlencode({'q': soql})}"
+        records = []
+        while path:
+            py_obj = self.request("GET", path)
+            records += py_obj["records"]
+            path = py_obj.get("nextRecordsUrl")
+
+        return records
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def error_message(py_obj):
+    if isinstance(py_obj, list) and py_obj:
+        return py_obj[0].get("message", "")
+    if isinstance(py_obj, dict):
+        return py_obj.get("message", "")
+    return ""
+
+
+def ok(result):
+    return {"status": 0, "result": result, "warnings": []}
+
+
+def failed(name, message, result=None):
+    py_obj = {"status": 1, "name": name, "message": message, "warnings": []}
+    if result is not None:
+        py_obj["result"] = result
+    return py_obj
+
+
+def soql_list(values):
+    return ", ".join("'" + v.replace("\\", "\\\\").replace("'", "\\'") + "'" for v in values)
+
+
+def anonymous_body(apex):
+    # The apex as it goes in the executeAnonymous query string.
+    return quote(apex, safe="")
+
+
+def fits_in_url(apex):
+    return len(anonymous_body(apex)) <= MAX_APEX_LENGTH
+
+
+def execute_anonymous(client, apex):
+    result = client.request("GET", f"tooling/executeAnonymous/?anonymousBody={anonymous_body(apex)}")
+
+    if not result["compiled"]:
+        return failed("ApexCompileError", f"{result['line']}:{result['column']} {result['compileProblem']}", result)
+    if not result["success"]:
+        return failed("ApexError", f"{result['exceptionMessage']}\n{result['exceptionStackTrace']}", result)
+
+    return ok(result)
+
+
+def assign_permission_sets(client, user_id, username, psets):
+    records = client.query(f"SELECT Id, Name FROM PermissionSet WHERE Name IN ({soql_list(psets)})")
+    ids = {record["Name"]: record["Id"] for record in records}
+
+    successes = []
+    failures = [{"name": pset, "message": f"Permission set {pset} not found"} for pset in psets if pset not in ids]
+
+    names = [pset for pset in psets if pset in ids]
+    if names:
+        body = {
+            "allOrNone": False,
+            "records": [
+                {
+                    "attributes": {"type": "PermissionSetAssignment"},
+                    "AssigneeId": user_id,
+                    "PermissionSetId": ids[name],
+                }
+                for name in names
+            ],
+        }
+        for name, saved in zip(names, client.request("POST", "composite/sobjects", body)):
+            if saved["success"]:
+                successes.append({"name": name, "value": username})
+            else:
+                message = "; ".join(e.get("message", "") for e in saved["errors"])
+                if any(e.get("statusCode") == "DUPLICATE_VALUE" for e in saved["errors"]):
+                    message = f"Duplicate PermissionSetAssignment. {message}"
+                failures.append({"name": name, "message": message})
+
+    result = {"successes": successes, "failures": failures}
+    if failures:
+        return failed("PermsetAssignmentError", "", result)
+
+    return ok(result)
+
+
+def installed_packages(client):
+    records = client.query(
+        "SELECT Id, SubscriberPackageId, SubscriberPackage.Name, SubscriberPackage.NamespacePrefix, "
+        "SubscriberPackageVersion.Id, SubscriberPackageVersion.Name, SubscriberPackageVersion.MajorVersion, "
+        "SubscriberPackageVersion.MinorVersion, SubscriberPackageVersion.PatchVersion, "
+        "SubscriberPackageVersion.BuildNumber FROM InstalledSubscriberPackage",
+        tooling=True,
+    )
+
+    packages = []
+    for record in records:
+        version = record["SubscriberPackageVersion"]
+        packages.append(
+            {
+                "Id": record["Id"],
+                "SubscriberPackageId": record["SubscriberPackageId"],
+                "SubscriberPackageName": record["SubscriberPackage"]["Name"],
+                "SubscriberPackageNamespace": record["SubscriberPackage"]["NamespacePrefix"],
+                "SubscriberPackageVersionId": version["Id"],
+                "SubscriberPackageVersionName": version["Name"],
+                "SubscriberPackageVersionNumber": (
+                    f"{version['MajorVersion']}.{version['MinorVersion']}.{version['PatchVersion']}.{version['BuildNumber']}"
+                ),
+            }
+        )
+
+    return ok(packages)
+
+
+def install_status(client, request_id):
+    record = client.request("GET", f"tooling/sobjects/PackageInstallRequest/{request_id}")
+
+    return ok(
+        {
+            "Id": record["Id"],
+            "Status": record["Status"],
+            "SubscriberPackageVersionKey": record.get("SubscriberPackageVersionKey"),
+            "Errors": record.get("Errors"),
+        }
+    )
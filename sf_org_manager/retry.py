@@ -0,0 +1,94 @@
+# retry.py
+__version__ = "0.0.3"
+
+#
+# Tells transient failures (row locks, timeouts, deploy queue contention,
+# dropped connections) from real ones, and re-runs a failed build step
+# after a bounded backoff when its failure was transient.
+#
+
+import logging
+import time
+
+from . import polling
+from . import rest_api
+from .errors import SfdxError
+from .scheduler import Step
+
+# Config
+#
+# sf error names worth another try.
+RETRYABLE_ERRORS = (
+    "UNABLE_TO_LOCK_ROW",
+    "ECONNRESET",
+    "ETIMEDOUT",
+    "ESOCKETTIMEDOUT",
+    "GenericTimeoutError",
+    "SERVER_UNAVAILABLE",
+    "ALREADY_IN_PROCESS",
+    # Dropped REST API connections.
+    "ConnectionResetError",
+    "RemoteDisconnected",
+    "BrokenPipeError",
+    "TimeoutError",
+)
+# Message fragments worth another try, for errors with a generic name.
+RETRYABLE_MESSAGES = (
+    "UNABLE_TO_LOCK_ROW",
+    "socket hang up",
+    "ECONNRESET",
+    "ETIMEDOUT",
+    "Request timed out",
+    "Another deployment is already in progress",
+    "deploy queue",
+    "Service Unavailable",
+)
+# REST API status codes worth another try.
+RETRYABLE_HTTP_STATUS = (502, 503, 504)
+# Retries of a failed step, and the backoff between them in seconds.
+STEP_RETRIES = 2
+RETRY_INITIAL = 5
+RETRY_MAX = 60
+#
+
+
+def set_step_retries(retries: int):
+    global STEP_RETRIES
+
+    STEP_RETRIES = retries
+
+
+def retryable(error):
+    if isinstance(error, SfdxError):
+        if (error.py_obj or {}).get("httpStatus") in RETRYABLE_HTTP_STATUS:
+            return True
+        return error.name in RETRYABLE_ERRORS or any(m in error.message for m in RETRYABLE_MESSAGES)
+    if isinstance(error, rest_api.SessionExpired):
+        return False
+    if isinstance(error, rest_api.RestError):
+        return error.status in RETRYABLE_HTTP_STATUS
+    if isinstance(error, ConnectionError):
+        return True
+
+    return False
+
+
+def retrying(steps):
+    # Wrap each step to run again when it fails with a retryable error; the
+    # steps that already finished are not re-run.
+    def wrap(s):
+        def run():
+            delays = polling.intervals(RETRY_INITIAL, 2, RETRY_MAX)
+            for attempt in range(STEP_RETRIES + 1):
+                try:
+                    return s.func(*s.args)
+                except Exception as e:
+                    if attempt == STEP_RETRIES or not retryable(e):
+                        raise
+                    delay = next(delays)
+                    logging.error(f"~~~ {s.name} failed ~ {e}, retry {attempt + 1} of {STEP_RETRIES} in {delay:.1f}s ~~~")
+                    time.sleep(delay)
+
+        return Step(s.name, run, group=s.group, depends=s.depends)
+
+    return [wrap(s) for s in steps]
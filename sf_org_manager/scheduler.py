@@ -0,0 +1,126 @@
+# scheduler.py
+__version__ = "0.0.3"
+
+#
+# Runs build steps as a DAG: a step starts as soon as every step it depends
+# on has finished, so independent steps run at the same time.
+#
+
+import asyncio
+import inspect
+import logging
+
+
+class Step:
+    def __init__(self, name, func, *args, group=None, depends=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.group = group or name
+        self.depends = list(depends or [])
+
+    def __repr__(self):
+        return f"Step({self.name}, group={self.group}, depends={self.depends})"
+
+
+def _expand(ref, steps, depends, seen=None):
+    # A reference names a step, or a group of steps. A group with no steps
+    # stands in for whatever that group itself depends on.
+    seen = seen or set()
+    if ref in seen:
+        return set()
+    seen.add(ref)
+
+    names = {s.name for s in steps if ref in (s.name, s.group)}
+    if names:
+        return names
+
+    if ref in depends:
+        expanded = set()
+        for dep in depends[ref]:
+            expanded |= _expand(dep, steps, depends, seen)
+        return expanded
+
+    raise ValueError(f"Unknown step or group '{ref}'")
+
+
+def resolve(steps, depends=None):
+    depends = depends or {}
+    graph = {}
+
+    for s in steps:
+        refs = list(s.depends) + depends.get(s.group, []) + (depends.get(s.name, []) if s.name != s.group else [])
+        deps = set()
+        for ref in refs:
+            deps |= _expand(ref, steps, depends)
+        deps.discard(s.name)
+        graph[s.name] = deps
+
+    check_cycles(graph)
+
+    return graph
+
+
+def check_cycles(graph):
+    remaining = {name: set(deps) for name, deps in graph.items()}
+
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Step dependency cycle between {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+async def _call(s):
+    try:
+        if inspect.iscoroutinefunction(s.func):
+            await s.func(*s.args)
+        else:
+            await asyncio.to_thread(s.func, *s.args)
+    except BaseException as e:
+        return e
+
+    return None
+
+
+async def run_steps_async(steps, depends=None, max_parallel=4):
+    graph = resolve(steps, depends)
+    by_name = {s.name: s for s in steps}
+
+    waiting = dict(graph)
+    finished = set()
+    running = {}
+    failure = None
+
+    while waiting or running:
+        if failure is None:
+            for name in [n for n, deps in waiting.items() if deps <= finished]:
+                if len(running) >= max_parallel:
+                    break
+                logging.debug(f"Starting step {name}")
+                running[asyncio.ensure_future(_call(by_name[name]))] = name
+                del waiting[name]
+
+        if not running:
+            break
+
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            name = running.pop(task)
+            error = task.result()
+            if error is not None and failure is None:
+                logging.error(f"Step {name} failed ~ {error!r}")
+                failure = error
+            finished.add(name)
+
+    if failure is not None:
+        raise failure
+
+    return finished
+
+
+def run_steps(steps, depends=None, max_parallel=4):
+    return asyncio.run(run_steps_async(steps, depends, max_parallel))
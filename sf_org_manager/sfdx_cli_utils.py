@@ -2,13 +2,24 @@
 __version__ = "0.0.3"
 
 
+import asyncio
+import concurrent.futures
+import io
 import json
 import logging
+import os
 import platform
 import subprocess
-import sys
+import tempfile
+import threading
 import time
 
+from . import cmd_cache
+from . import polling
+from . import rest_api
+from . import retry
+from . import tracing
+from .errors import SfdxError
 
 # sfdx command.
 if platform.system() == "Darwin":
@@ -18,86 +29,405 @@ if platform.system() == "Linux":
 if platform.system() == "Windows":
     SFDX_CMD = "sf.cmd"
 
+# Point at another executable, e.g. the fake_sf shim.
+SFDX_CMD = os.environ.get("SF_ORG_BUILDER_SF_CMD", SFDX_CMD)
+
 # Config
 #
-SLEEP_SEC = 120
+# Max number of sf commands running at once from this process.
+MAX_CONCURRENT_CMDS = int(os.environ.get("SF_ORG_BUILDER_MAX_CMDS", 4))
+# "rest" runs apex, permission set assignment, installed package lists and
+# package install reports over the REST API instead of `sf` processes.
+API_BACKEND = os.environ.get("SF_ORG_BUILDER_API", "cli")
+# Bytes read at a time while looking for the start of the JSON output.
+READ_CHUNK = 64 * 1024
 #
 
+# One set of slots for the whole process, taken by threads & every event loop.
+_cmd_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CMDS)
 
-def parse_output(cmd_output):
-    logging.debug("parse_output(cmd_output)")
-    logging.warning(f"ARGS: {cmd_output.args}")
+
+def set_max_concurrent_cmds(limit: int):
+    global MAX_CONCURRENT_CMDS, _cmd_slots
+
+    MAX_CONCURRENT_CMDS = limit
+    _cmd_slots = threading.BoundedSemaphore(limit)
+
+
+def set_api_backend(backend: str):
+    global API_BACKEND
+
+    if backend not in ("cli", "rest"):
+        raise ValueError(f"Unknown API backend '{backend}', expected cli or rest")
+    API_BACKEND = backend
+
+
+_rest_sessions = {}
+_rest_sessions_lock = threading.Lock()
+
+
+async def acquire_slot_async(slots):
+    # Waits for a slot on a worker thread, the event loop keeps running.
+    if slots.acquire(blocking=False):
+        return
+
+    acquire = asyncio.ensure_future(asyncio.to_thread(slots.acquire))
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # The thread still gets the slot, hand it back when it does.
+        acquire.add_done_callback(lambda _: slots.release())
+        raise
+
+
+def find_json_start(stdout):
+    # Offset of the first "{" in a binary file, read a chunk at a time.
+    offset = 0
+    while True:
+        chunk = stdout.read(READ_CHUNK)
+        if not chunk:
+            return None
+
+        idx = chunk.find(b"{")
+        if idx >= 0:
+            return offset + idx
+        offset = offset + len(chunk)
+
+
+def parse_stream(args, stdout, stderr):
+    # stdout is the binary temp file a command wrote. Only the search for the
+    # start of the JSON reads it a chunk at a time; the standard library has
+    # no incremental JSON decoder, so the JSON itself is read & decoded in one
+    # go, and a large result is held in memory once as text while it is.
+    logging.debug("parse_stream(args, stdout, stderr)")
+    logging.warning(f"ARGS: {args}")
 
     py_obj = {}
 
-    if cmd_output.stderr == "" and cmd_output.stdout == "":
-        logging.error(f"NO OUTPUT ~ {cmd_output}")
-        sys.exit(1)
+    stdout.seek(0, os.SEEK_END)
+    size = stdout.tell()
+    stdout.seek(0)
+
+    if stderr == "" and size == 0:
+        logging.error(f"NO OUTPUT ~ {args}")
+        raise SfdxError("NoOutput", f"No output from {' '.join(args[1:])}")
+
+    if stderr != "" and size == 0:
+        logging.error(f"STDERR: {stderr}")
+        if "Warning: sfdx-cli update available" not in str(stderr):
+            raise SfdxError("StderrOutput", str(stderr).strip())
 
-    if cmd_output.stderr != "" and cmd_output.stdout == "":
-        logging.error(f"STDERR: {cmd_output.stderr}")
-        if "Warning: sfdx-cli update available" not in str(cmd_output.stderr):
-            sys.exit(1)
+    if size:
+        start = find_json_start(stdout)
+        if start is None:
+            logging.error(f"NO JSON OUTPUT ~ {args}")
+            raise SfdxError("NoJsonOutput", f"No JSON output from {' '.join(args[1:])}")
 
-    if cmd_output.stdout != "":
-        js_str = cmd_output.stdout[cmd_output.stdout.index("{") :]
-        py_obj = json.loads(js_str)
+        stdout.seek(start)
+        py_obj = json.load(stdout)
 
-    logging.debug(json.dumps(py_obj, sort_keys=True, indent=3))
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(json.dumps(py_obj, sort_keys=True, indent=3))
 
     return py_obj
 
 
+def parse_output(cmd_output):
+    # Output already read into memory, e.g. a CompletedProcess.
+    stdout = io.BytesIO(cmd_output.stdout.encode("utf-8"))
+
+    return parse_stream(cmd_output.args, stdout, cmd_output.stderr)
+
+
+async def parse_output_async(cmd_output):
+    # Large deploy results take a while to decode, keep them off the event loop.
+    return await asyncio.to_thread(parse_output, cmd_output)
+
+
+def cmd_org(cmd: list):
+    for flag in ("-o", "--target-org", "-u", "-v", "--target-dev-hub"):
+        if flag in cmd[:-1]:
+            return cmd[cmd.index(flag) + 1]
+
+    return ""
+
+
+def trace_cmd(cmd, returncode, stdout, py_obj, queued, started, spawned, exited, parsed, tid=None):
+    # One span per command, with its phases as child spans.
+    if not tracing.enabled():
+        return
+
+    words = []
+    for word in cmd[1:]:
+        if word.startswith("-"):
+            break
+        words.append(word)
+
+    args = {
+        "cmd": " ".join(cmd[1:]),
+        "org": cmd_org(cmd),
+        "exit_status": returncode,
+        "sf_status": (py_obj or {}).get("status"),
+        "output_bytes": os.fstat(stdout.fileno()).st_size,
+    }
+    tracing.add_span(f"sf {' '.join(words)}", "sf", queued, parsed, args, tid)
+    if started > queued:
+        tracing.add_span("wait for slot", "sf.phase", queued, started, tid=tid)
+    tracing.add_span("process start", "sf.phase", started, spawned, tid=tid)
+    tracing.add_span("remote wait", "sf.phase", spawned, exited, tid=tid)
+    tracing.add_span("parse", "sf.phase", exited, parsed, tid=tid)
+
+
+def run_cmd(cmd: list):
+    # stdout goes to a temp file, so a large result is not held in a pipe
+    # buffer & a copy of it in memory while the command runs.
+    with tempfile.TemporaryFile() as stdout:
+        queued = time.perf_counter()
+        with _cmd_slots:
+            started = time.perf_counter()
+            proc = subprocess.Popen(
+                cmd,
+                stdout=stdout,
+                stderr=subprocess.PIPE,
+                encoding="utf-8",
+            )
+            spawned = time.perf_counter()
+            _, stderr = proc.communicate()
+            exited = time.perf_counter()
+
+        py_obj = None
+        try:
+            py_obj = parse_stream(cmd, stdout, stderr)
+        finally:
+            trace_cmd(cmd, proc.returncode, stdout, py_obj, queued, started, spawned, exited, time.perf_counter())
+
+        return py_obj
+
+
+async def run_cmd_async(cmd: list):
+    with tempfile.TemporaryFile() as stdout, tracing.lane() as tid:
+        queued = time.perf_counter()
+        slots = _cmd_slots
+        await acquire_slot_async(slots)
+        try:
+            started = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=stdout,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            spawned = time.perf_counter()
+            _, stderr = await proc.communicate()
+            exited = time.perf_counter()
+        finally:
+            slots.release()
+
+        py_obj = None
+        try:
+            py_obj = await asyncio.to_thread(parse_stream, cmd, stdout, stderr.decode("utf-8"))
+        finally:
+            trace_cmd(cmd, proc.returncode, stdout, py_obj, queued, started, spawned, exited, time.perf_counter(), tid)
+
+        return py_obj
+
+
+def run_cmd_cached(name: str, cmd: list, targets: list, fresh: bool = False, fetch=None):
+    return cmd_cache.cached(name, cmd, targets, fetch or (lambda: run_cmd(cmd)), fresh)
+
+
+async def run_cmd_cached_async(name: str, cmd: list, targets: list, fresh: bool = False):
+    return await cmd_cache.cached_async(name, cmd, targets, lambda: run_cmd_async(cmd), fresh)
+
+
+def run_cmd_invalidating(cmd: list, *targets):
+    # Commands that change an org drop the cached results about it.
+    try:
+        return run_cmd(cmd)
+    finally:
+        cmd_cache.invalidate(*targets)
+
+
+async def run_cmd_invalidating_async(cmd: list, *targets):
+    try:
+        return await run_cmd_async(cmd)
+    finally:
+        await asyncio.to_thread(cmd_cache.invalidate, *targets)
+
+
+def rest_session(org_alias: str, fresh: bool = False):
+    # One REST client per org, from the instance url & token of `sf org display user`.
+    with _rest_sessions_lock:
+        if not fresh and org_alias in _rest_sessions:
+            return _rest_sessions[org_alias]
+
+    py_obj = user_details(org_alias)
+    if py_obj["status"] != 0:
+        raise rest_api.RestError(0, py_obj.get("message", f"No user details for {org_alias}"))
+
+    user = py_obj["result"]
+    session = (rest_api.RestClient(user["instanceUrl"], user["accessToken"]), user)
+
+    with _rest_sessions_lock:
+        old = _rest_sessions.get(org_alias)
+        _rest_sessions[org_alias] = session
+    if old:
+        old[0].close()
+
+    return session
+
+
+def run_rest(org_alias: str, func):
+    # func(client, user) -> py_obj shaped like the `sf --json` output.
+    try:
+        try:
+            return func(*rest_session(org_alias))
+        except rest_api.SessionExpired:
+            return func(*rest_session(org_alias, True))
+    except rest_api.RestError as e:
+        logging.warning(f"REST call for {org_alias} failed ~ {e!r}")
+        return {"status": 1, "name": "RestError", "message": str(e), "httpStatus": e.status, "warnings": []}
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"REST call for {org_alias} failed ~ {e!r}")
+        return {"status": 1, "name": type(e).__name__, "message": str(e), "warnings": []}
+
+
+def run_rest_invalidating(org_alias: str, func):
+    try:
+        return run_rest(org_alias, func)
+    finally:
+        cmd_cache.invalidate(org_alias)
+
+
+def _alias_set_cmd(alias: str, username: str):
+    return [
+        SFDX_CMD,
+        "alias",
+        "set",
+        f"{alias}={username}",
+        "--json",
+    ]
+
+
+def alias_set(alias: str, username: str):
+    logging.debug(f"alias_set({alias}, {username})")
+
+    return run_cmd_invalidating(_alias_set_cmd(alias, username), cmd_cache.ORGS, alias, username)
+
+
+async def alias_set_async(alias: str, username: str):
+    logging.debug(f"alias_set_async({alias}, {username})")
+
+    return await run_cmd_invalidating_async(_alias_set_cmd(alias, username), cmd_cache.ORGS, alias, username)
+
+
+def _alias_unset_cmd(alias: str):
+    return [
+        SFDX_CMD,
+        "alias",
+        "unset",
+        f"{alias}",
+        "--json",
+    ]
+
+
+def alias_unset(alias: str):
+    logging.debug(f"alias_unset({alias})")
+
+    return run_cmd_invalidating(_alias_unset_cmd(alias), cmd_cache.ORGS, alias)
+
+
+async def alias_unset_async(alias: str):
+    logging.debug(f"alias_unset_async({alias})")
+
+    return await run_cmd_invalidating_async(_alias_unset_cmd(alias), cmd_cache.ORGS, alias)
+
+
+def _check_install_cmd(org_alias: str, status_id: str):
+    return [
+        SFDX_CMD,
+        "package",
+        "install",
+        "report",
+        "-o",
+        f"{org_alias}",
+        "-i",
+        f"{status_id}",
+        "--json",
+    ]
+
+
 def check_install(org_alias: str, status_id: str):
     logging.debug(f"check_install({org_alias}, {status_id})")
 
-    time.sleep(SLEEP_SEC)
-
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "package",
-            "install",
-            "report",
-            "-o",
-            f"{org_alias}",
-            "-i",
-            f"{status_id}",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    if API_BACKEND == "rest":
+        return run_rest(org_alias, lambda client, user: rest_api.install_status(client, status_id))
+
+    return run_cmd(_check_install_cmd(org_alias, status_id))
 
-    return parse_output(out)
+
+async def check_install_async(org_alias: str, status_id: str):
+    logging.debug(f"check_install_async({org_alias}, {status_id})")
+
+    if API_BACKEND == "rest":
+        return await asyncio.to_thread(check_install, org_alias, status_id)
+
+    return await run_cmd_async(_check_install_cmd(org_alias, status_id))
+
+
+def _community_status_cmd(org_alias: str, community: str):
+    return [
+        SFDX_CMD,
+        "data",
+        "query",
+        "-q",
+        f"SELECT Id, Name, Status FROM Network WHERE Name = '{community}'",
+        "-o",
+        f"{org_alias}",
+        "--json",
+    ]
+
+
+def community_status(org_alias: str, community: str):
+    logging.debug(f"community_status({org_alias}, {community})")
+
+    return run_cmd(_community_status_cmd(org_alias, community))
+
+
+async def community_status_async(org_alias: str, community: str):
+    logging.debug(f"community_status_async({org_alias}, {community})")
+
+    return await run_cmd_async(_community_status_cmd(org_alias, community))
+
+
+def _create_community_cmd(org_alias: str, community: str, template: str):
+    return [
+        SFDX_CMD,
+        "force:community:create",
+        "-u",
+        f"{org_alias}",
+        "-n",
+        f"{community}",
+        "-t",
+        f"{template}",
+        "-p",
+        "demosite",
+        "--json",
+    ]
 
 
 def create_community(org_alias: str, community: str, template: str):
     logging.debug(f"create_community({org_alias}, {community}, {template})")
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "force:community:create",
-            "-u",
-            f"{org_alias}",
-            "-n",
-            f"{community}",
-            "-t",
-            f"{template}",
-            "-p",
-            "demosite",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    return run_cmd_invalidating(_create_community_cmd(org_alias, community, template), org_alias)
 
-    time.sleep(120)
-    return parse_output(out)
 
+async def create_community_async(org_alias: str, community: str, template: str):
+    logging.debug(f"create_community_async({org_alias}, {community}, {template})")
 
-def create_sratch_org(
+    return await run_cmd_invalidating_async(_create_community_cmd(org_alias, community, template), org_alias)
+
+
+def _create_sratch_org_cmd(
     org_alias: str,
     duration: str,
     devhub: str,
@@ -105,11 +435,8 @@ def create_sratch_org(
     use_namepspace: bool,
     email: str = None,
     preview: bool = False,
+    snapshot: str = None,
 ):
-    logging.debug(
-        f"create_sratch_org({org_alias}, {duration}, {devhub}, {scratch_def}, {use_namepspace}, {email}, {preview})"
-    )
-
     cmd = [
         SFDX_CMD,
         "org",
@@ -138,78 +465,419 @@ def create_sratch_org(
         cmd.append("--release")
         cmd.append("preview")
 
-    out = subprocess.run(
-        cmd,
-        capture_output=True,
-        encoding="utf-8",
+    if snapshot:
+        cmd.append("--snapshot")
+        cmd.append(f"{snapshot}")
+
+    return cmd
+
+
+def create_sratch_org(
+    org_alias: str,
+    duration: str,
+    devhub: str,
+    scratch_def: str,
+    use_namepspace: bool,
+    email: str = None,
+    preview: bool = False,
+    snapshot: str = None,
+):
+    logging.debug(
+        f"create_sratch_org({org_alias}, {duration}, {devhub}, {scratch_def}, {use_namepspace}, {email}, {preview}, {snapshot})"
+    )
+
+    return run_cmd_invalidating(
+        _create_sratch_org_cmd(org_alias, duration, devhub, scratch_def, use_namepspace, email, preview, snapshot),
+        cmd_cache.ORGS,
+        org_alias,
     )
 
-    return parse_output(out)
+
+async def create_sratch_org_async(
+    org_alias: str,
+    duration: str,
+    devhub: str,
+    scratch_def: str,
+    use_namepspace: bool,
+    email: str = None,
+    preview: bool = False,
+    snapshot: str = None,
+):
+    logging.debug(
+        f"create_sratch_org_async({org_alias}, {duration}, {devhub}, {scratch_def}, {use_namepspace}, {email}, {preview}, {snapshot})"
+    )
+
+    return await run_cmd_invalidating_async(
+        _create_sratch_org_cmd(org_alias, duration, devhub, scratch_def, use_namepspace, email, preview, snapshot),
+        cmd_cache.ORGS,
+        org_alias,
+    )
+
+
+def _delete_org_cmd(org_user: str):
+    return [
+        SFDX_CMD,
+        "org",
+        "delete",
+        "scratch",
+        "-o",
+        f"{org_user}",
+        "-p",
+        "--json",
+    ]
+
+
+def delete_org(org_user: str):
+    logging.debug(f"delete_org({org_user})")
+
+    return run_cmd_invalidating(_delete_org_cmd(org_user), cmd_cache.ORGS, org_user)
+
+
+async def delete_org_async(org_user: str):
+    logging.debug(f"delete_org_async({org_user})")
+
+    return await run_cmd_invalidating_async(_delete_org_cmd(org_user), cmd_cache.ORGS, org_user)
+
+
+def _logout_org_cmd(org_user: str):
+    return [
+        SFDX_CMD,
+        "org",
+        "logout",
+        "-o",
+        f"{org_user}",
+        "-p",
+        "--json",
+    ]
+
+
+def logout_org(org_user: str):
+    logging.debug(f"logout_org({org_user})")
+
+    return run_cmd_invalidating(_logout_org_cmd(org_user), cmd_cache.ORGS, org_user)
+
+
+async def logout_org_async(org_user: str):
+    logging.debug(f"logout_org_async({org_user})")
+
+    return await run_cmd_invalidating_async(_logout_org_cmd(org_user), cmd_cache.ORGS, org_user)
+
+
+def _create_snapshot_cmd(devhub: str, source_org: str, name: str, description: str = None):
+    cmd = [
+        SFDX_CMD,
+        "org",
+        "create",
+        "snapshot",
+        "-v",
+        f"{devhub}",
+        "-o",
+        f"{source_org}",
+        "-n",
+        f"{name}",
+        "--json",
+    ]
+
+    if description:
+        cmd.append("-d")
+        cmd.append(f"{description}")
+
+    return cmd
+
+
+def create_snapshot(devhub: str, source_org: str, name: str, description: str = None):
+    logging.debug(f"create_snapshot({devhub}, {source_org}, {name}, {description})")
+
+    return run_cmd(_create_snapshot_cmd(devhub, source_org, name, description))
+
+
+async def create_snapshot_async(devhub: str, source_org: str, name: str, description: str = None):
+    logging.debug(f"create_snapshot_async({devhub}, {source_org}, {name}, {description})")
+
+    return await run_cmd_async(_create_snapshot_cmd(devhub, source_org, name, description))
+
+
+def _get_snapshot_cmd(devhub: str, name: str):
+    return [
+        SFDX_CMD,
+        "org",
+        "get",
+        "snapshot",
+        "-v",
+        f"{devhub}",
+        "-s",
+        f"{name}",
+        "--json",
+    ]
+
+
+def get_snapshot(devhub: str, name: str):
+    logging.debug(f"get_snapshot({devhub}, {name})")
+
+    return run_cmd(_get_snapshot_cmd(devhub, name))
+
+
+async def get_snapshot_async(devhub: str, name: str):
+    logging.debug(f"get_snapshot_async({devhub}, {name})")
+
+    return await run_cmd_async(_get_snapshot_cmd(devhub, name))
+
+
+def _delete_snapshot_cmd(devhub: str, name: str):
+    return [
+        SFDX_CMD,
+        "org",
+        "delete",
+        "snapshot",
+        "-v",
+        f"{devhub}",
+        "-s",
+        f"{name}",
+        "-p",
+        "--json",
+    ]
+
+
+def delete_snapshot(devhub: str, name: str):
+    logging.debug(f"delete_snapshot({devhub}, {name})")
+
+    return run_cmd(_delete_snapshot_cmd(devhub, name))
+
+
+async def delete_snapshot_async(devhub: str, name: str):
+    logging.debug(f"delete_snapshot_async({devhub}, {name})")
+
+    return await run_cmd_async(_delete_snapshot_cmd(devhub, name))
+
+
+def _org_limits_cmd(org_user: str):
+    return [
+        SFDX_CMD,
+        "org",
+        "list",
+        "limits",
+        "-o",
+        f"{org_user}",
+        "--json",
+    ]
+
+
+def org_limits(org_user: str):
+    logging.debug(f"org_limits({org_user})")
+
+    return run_cmd(_org_limits_cmd(org_user))
+
+
+async def org_limits_async(org_user: str):
+    logging.debug(f"org_limits_async({org_user})")
+
+    return await run_cmd_async(_org_limits_cmd(org_user))
+
+
+def _execute_script_cmd(org_alias: str, apex_file: str):
+    return [
+        SFDX_CMD,
+        "apex",
+        "run",
+        "-f",
+        f"{apex_file}",
+        "-o",
+        f"{org_alias}",
+        "--json",
+    ]
+
+
+def _execute_script_rest(org_alias: str, apex_file: str):
+    # None when the apex is too long for a URL, once encoded.
+    if not os.path.isfile(apex_file) or os.path.getsize(apex_file) > rest_api.MAX_APEX_LENGTH:
+        return None
+
+    with open(apex_file, "r") as f:
+        apex = f.read()
+    if not rest_api.fits_in_url(apex):
+        logging.debug(f"{apex_file} is too long for the REST API once URL-encoded, using the sf CLI")
+        return None
+
+    return run_rest(org_alias, lambda client, user: rest_api.execute_anonymous(client, apex))
 
 
 def execute_script(org_alias: str, apex_file: str):
     logging.debug(f"execute_script({org_alias}, {apex_file})")
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "apex",
-            "run",
-            "-f",
-            f"{apex_file}",
-            "-o",
-            f"{org_alias}",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    if API_BACKEND == "rest":
+        py_obj = _execute_script_rest(org_alias, apex_file)
+        if py_obj is not None:
+            return py_obj
+
+    return run_cmd(_execute_script_cmd(org_alias, apex_file))
+
+
+async def execute_script_async(org_alias: str, apex_file: str):
+    logging.debug(f"execute_script_async({org_alias}, {apex_file})")
+
+    if API_BACKEND == "rest":
+        return await asyncio.to_thread(execute_script, org_alias, apex_file)
+
+    return await run_cmd_async(_execute_script_cmd(org_alias, apex_file))
+
+
+def _data_export_tree_cmd(org_alias: str, query: str, output_dir: str, prefix: str):
+    return [
+        SFDX_CMD,
+        "data",
+        "export",
+        "tree",
+        "-q",
+        f"{query}",
+        "-o",
+        f"{org_alias}",
+        "-d",
+        f"{output_dir}",
+        "-x",
+        f"{prefix}",
+        "-p",
+        "--json",
+    ]
+
+
+def data_export_tree(org_alias: str, query: str, output_dir: str, prefix: str):
+    logging.debug(f"data_export_tree({org_alias}, {query}, {output_dir}, {prefix})")
+
+    return run_cmd(_data_export_tree_cmd(org_alias, query, output_dir, prefix))
+
+
+async def data_export_tree_async(org_alias: str, query: str, output_dir: str, prefix: str):
+    logging.debug(f"data_export_tree_async({org_alias}, {query}, {output_dir}, {prefix})")
+
+    return await run_cmd_async(_data_export_tree_cmd(org_alias, query, output_dir, prefix))
+
+
+def _data_import_tree_cmd(org_alias: str, plan: str = None, files: list = None):
+    cmd = [
+        SFDX_CMD,
+        "data",
+        "import",
+        "tree",
+        "-o",
+        f"{org_alias}",
+        "--json",
+    ]
+
+    if plan:
+        cmd += ["-p", f"{plan}"]
+    if files:
+        cmd += ["-f", ",".join(files)]
+
+    return cmd
+
+
+def data_import_tree(org_alias: str, plan: str = None, files: list = None):
+    logging.debug(f"data_import_tree({org_alias}, {plan}, {files})")
 
-    return parse_output(out)
+    return run_cmd_invalidating(_data_import_tree_cmd(org_alias, plan, files), org_alias)
+
+
+async def data_import_tree_async(org_alias: str, plan: str = None, files: list = None):
+    logging.debug(f"data_import_tree_async({org_alias}, {plan}, {files})")
+
+    return await run_cmd_invalidating_async(_data_import_tree_cmd(org_alias, plan, files), org_alias)
+
+
+def _install_package_cmd(org_alias: str, package_id: str):
+    return [
+        SFDX_CMD,
+        "package",
+        "install",
+        "-p",
+        f"{package_id}",
+        "-o",
+        f"{org_alias}",
+        "-r",
+        "--json",
+    ]
 
 
 def install_package(org_alias: str, package_id: str):
     logging.debug(f"install_package({org_alias})")
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "package",
-            "install",
-            "-p",
-            f"{package_id}",
-            "-o",
-            f"{org_alias}",
-            "-r",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    return run_cmd_invalidating(_install_package_cmd(org_alias, package_id), org_alias)
 
-    return parse_output(out)
+
+async def install_package_async(org_alias: str, package_id: str):
+    logging.debug(f"install_package_async({org_alias})")
+
+    return await run_cmd_invalidating_async(_install_package_cmd(org_alias, package_id), org_alias)
+
+
+def _install_permission_set_cmd(org_alias: str, pset: str):
+    return [
+        SFDX_CMD,
+        "org",
+        "assign",
+        "permset",
+        "-n",
+        f"{pset}",
+        "-o",
+        f"{org_alias}",
+        "--json",
+    ]
 
 
 def install_permission_set(org_alias: str, pset: str):
     logging.debug(f"install_permission_Set({org_alias}, {pset})")
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "org",
-            "assign",
-            "permset",
-            "-n",
-            f"{pset}",
-            "-o",
-            f"{org_alias}",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    if API_BACKEND == "rest":
+        return install_permission_sets(org_alias, [pset])
 
-    return parse_output(out)
+    return run_cmd_invalidating(_install_permission_set_cmd(org_alias, pset), org_alias)
+
+
+async def install_permission_set_async(org_alias: str, pset: str):
+    logging.debug(f"install_permission_set_async({org_alias}, {pset})")
+
+    if API_BACKEND == "rest":
+        return await asyncio.to_thread(install_permission_set, org_alias, pset)
+
+    return await run_cmd_invalidating_async(_install_permission_set_cmd(org_alias, pset), org_alias)
+
+
+def _install_permission_sets_cmd(org_alias: str, psets: list):
+    cmd = [
+        SFDX_CMD,
+        "org",
+        "assign",
+        "permset",
+        "-o",
+        f"{org_alias}",
+        "--json",
+    ]
+
+    for pset in psets:
+        cmd.append("-n")
+        cmd.append(f"{pset}")
+
+    return cmd
+
+
+def install_permission_sets(org_alias: str, psets: list):
+    logging.debug(f"install_permission_sets({org_alias}, {psets})")
+
+    if API_BACKEND == "rest":
+        return run_rest_invalidating(
+            org_alias,
+            lambda client, user: rest_api.assign_permission_sets(client, user["id"], user["username"], psets),
+        )
+
+    return run_cmd_invalidating(_install_permission_sets_cmd(org_alias, psets), org_alias)
+
+
+async def install_permission_sets_async(org_alias: str, psets: list):
+    logging.debug(f"install_permission_sets_async({org_alias}, {psets})")
+
+    if API_BACKEND == "rest":
+        return await asyncio.to_thread(install_permission_sets, org_alias, psets)
+
+    return await run_cmd_invalidating_async(_install_permission_sets_cmd(org_alias, psets), org_alias)
 
 
 def install_source(org_alias: str, src_folder: str):
@@ -218,86 +886,169 @@ def install_source(org_alias: str, src_folder: str):
     return source_push(org_alias, False, src_folder)
 
 
-def org_list():
-    logging.debug("org_list()")
+async def install_source_async(org_alias: str, src_folder: str):
+    logging.debug(f"install_source_async({org_alias}, {src_folder})")
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "org",
-            "list",
-            "--all",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    return await source_push_async(org_alias, False, src_folder)
+
+
+def _install_sources_cmd(org_alias: str, src_folders: list):
+    cmd = _source_push_cmd(org_alias, False)
+
+    for src_folder in src_folders:
+        cmd.append("-d")
+        cmd.append(f"{src_folder}")
 
-    return parse_output(out)
+    return cmd
+
+
+def install_sources(org_alias: str, src_folders: list):
+    logging.debug(f"install_sources({org_alias}, {src_folders})")
+
+    return run_cmd_invalidating(_install_sources_cmd(org_alias, src_folders), org_alias)
+
+
+async def install_sources_async(org_alias: str, src_folders: list):
+    logging.debug(f"install_sources_async({org_alias}, {src_folders})")
+
+    return await run_cmd_invalidating_async(_install_sources_cmd(org_alias, src_folders), org_alias)
+
+
+def _org_list_cmd():
+    return [
+        SFDX_CMD,
+        "org",
+        "list",
+        "--all",
+        "--json",
+    ]
+
+
+def org_list(fresh: bool = False):
+    logging.debug(f"org_list({fresh})")
+
+    return run_cmd_cached("org_list", _org_list_cmd(), [cmd_cache.ORGS], fresh)
+
+
+def org_list_cached():
+    # The last cached `sf org list`, without running it; None if there is none.
+    logging.debug("org_list_cached()")
+
+    return cmd_cache.peek("org_list", _org_list_cmd())
+
+
+async def org_list_async(fresh: bool = False):
+    logging.debug(f"org_list_async({fresh})")
+
+    return await run_cmd_cached_async("org_list", _org_list_cmd(), [cmd_cache.ORGS], fresh)
+
+
+def _org_open_cmd(org_user: str):
+    return [
+        SFDX_CMD,
+        "org",
+        "open",
+        "-o",
+        f"{org_user}",
+        "--json",
+    ]
 
 
 def org_open(org_user: str):
     logging.debug(f"open_org({org_user})")
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "org",
-            "open",
-            "-o",
-            f"{org_user}",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    return run_cmd(_org_open_cmd(org_user))
 
-    return parse_output(out)
 
+async def org_open_async(org_user: str):
+    logging.debug(f"org_open_async({org_user})")
 
-def package_list(org_alias: str):
-    logging.debug(f"package_list({org_alias})")
+    return await run_cmd_async(_org_open_cmd(org_user))
+
+
+def _package_dependencies_cmd(org_alias: str, package_id: str):
+    return [
+        SFDX_CMD,
+        "data",
+        "query",
+        "-t",
+        "-q",
+        f"SELECT Id, Dependencies FROM SubscriberPackageVersion WHERE Id = '{package_id}'",
+        "-o",
+        f"{org_alias}",
+        "--json",
+    ]
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "package",
-            "installed",
-            "list",
-            "-o",
-            f"{org_alias}",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
 
-    return parse_output(out)
+def package_dependencies(org_alias: str, package_id: str):
+    logging.debug(f"package_dependencies({org_alias}, {package_id})")
+
+    return run_cmd(_package_dependencies_cmd(org_alias, package_id))
+
+
+async def package_dependencies_async(org_alias: str, package_id: str):
+    logging.debug(f"package_dependencies_async({org_alias}, {package_id})")
+
+    return await run_cmd_async(_package_dependencies_cmd(org_alias, package_id))
+
+
+def _package_list_cmd(org_alias: str):
+    return [
+        SFDX_CMD,
+        "package",
+        "installed",
+        "list",
+        "-o",
+        f"{org_alias}",
+        "--json",
+    ]
+
+
+def package_list(org_alias: str, fresh: bool = False):
+    logging.debug(f"package_list({org_alias}, {fresh})")
+
+    def fetch_rest():
+        return run_rest(org_alias, lambda client, user: rest_api.installed_packages(client))
+
+    fetch = fetch_rest if API_BACKEND == "rest" else None
+
+    return run_cmd_cached("package_list", _package_list_cmd(org_alias), [org_alias], fresh, fetch)
+
+
+async def package_list_async(org_alias: str, fresh: bool = False):
+    logging.debug(f"package_list_async({org_alias}, {fresh})")
+
+    if API_BACKEND == "rest":
+        return await asyncio.to_thread(package_list, org_alias, fresh)
+
+    return await run_cmd_cached_async("package_list", _package_list_cmd(org_alias), [org_alias], fresh)
+
+
+def _publish_community_cmd(org_alias: str, community: str):
+    return [
+        SFDX_CMD,
+        "force:community:publish",
+        "-u",
+        f"{org_alias}",
+        "-n",
+        f"{community}",
+        "--json",
+    ]
 
 
 def publish_community(org_alias: str, community: str):
     logging.debug(f"publish_community({org_alias}, {community})")
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "force:community:publish",
-            "-u",
-            f"{org_alias}",
-            "-n",
-            f"{community}",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    return run_cmd_invalidating(_publish_community_cmd(org_alias, community), org_alias)
 
-    return parse_output(out)
 
+async def publish_community_async(org_alias: str, community: str):
+    logging.debug(f"publish_community_async({org_alias}, {community})")
 
-def source_push(org_alias: str, forceoverwrite: bool, src_folder: str = None):
-    logging.debug(f"source_push({org_alias}, {forceoverwrite}, {src_folder})")
+    return await run_cmd_invalidating_async(_publish_community_cmd(org_alias, community), org_alias)
 
+
+def _source_push_cmd(org_alias: str, forceoverwrite: bool, src_folder: str = None):
     cmd = [
         SFDX_CMD,
         "project",
@@ -316,18 +1067,22 @@ def source_push(org_alias: str, forceoverwrite: bool, src_folder: str = None):
         cmd.append("-d")
         cmd.append(f"{src_folder}")
 
-    out = subprocess.run(
-        cmd,
-        capture_output=True,
-        encoding="utf-8",
-    )
+    return cmd
 
-    return parse_output(out)
 
+def source_push(org_alias: str, forceoverwrite: bool, src_folder: str = None):
+    logging.debug(f"source_push({org_alias}, {forceoverwrite}, {src_folder})")
+
+    return run_cmd_invalidating(_source_push_cmd(org_alias, forceoverwrite, src_folder), org_alias)
 
-def source_pull(org_alias: str, metadata: str = None):
-    logging.debug(f"source_pull({org_alias}, {metadata})")
 
+async def source_push_async(org_alias: str, forceoverwrite: bool, src_folder: str = None):
+    logging.debug(f"source_push_async({org_alias}, {forceoverwrite}, {src_folder})")
+
+    return await run_cmd_invalidating_async(_source_push_cmd(org_alias, forceoverwrite, src_folder), org_alias)
+
+
+def _source_pull_cmd(org_alias: str, metadata: str = None):
     cmd = [
         SFDX_CMD,
         "project",
@@ -342,30 +1097,334 @@ def source_pull(org_alias: str, metadata: str = None):
         cmd.append("-m")
         cmd.append(f"{metadata}")
 
-    out = subprocess.run(
-        cmd,
-        capture_output=True,
-        encoding="utf-8",
-    )
+    return cmd
+
+
+def source_pull(org_alias: str, metadata: str = None):
+    logging.debug(f"source_pull({org_alias}, {metadata})")
+
+    return run_cmd(_source_pull_cmd(org_alias, metadata))
+
+
+async def source_pull_async(org_alias: str, metadata: str = None):
+    logging.debug(f"source_pull_async({org_alias}, {metadata})")
 
-    return parse_output(out)
+    return await run_cmd_async(_source_pull_cmd(org_alias, metadata))
+
+
+def _user_details_cmd(org_alias: str):
+    return [
+        SFDX_CMD,
+        "org",
+        "display",
+        "user",
+        "-o",
+        f"{org_alias}",
+        "--json",
+    ]
 
 
 def user_details(org_alias: str):
+    # Not kept in the command cache, the result holds the org's access token.
     logging.debug(f"user_details({org_alias})")
 
-    out = subprocess.run(
-        [
-            SFDX_CMD,
-            "org",
-            "display",
-            "user",
-            "-o",
-            f"{org_alias}",
-            "--json",
-        ],
-        capture_output=True,
-        encoding="utf-8",
-    )
+    return run_cmd(_user_details_cmd(org_alias))
+
+
+async def user_details_async(org_alias: str):
+    logging.debug(f"user_details_async({org_alias})")
+
+    return await run_cmd_async(_user_details_cmd(org_alias))
+
+
+#
+# Server-side jobs
+#
+# Deploys, retrieves & package installs submitted without waiting for
+# Salesforce to finish. Each submit returns a Job at once; one poller thread,
+# running its own event loop, reports on every job in flight whatever its
+# org, each on its own backoff. The sf CLI has no report for a retrieve, so
+# a retrieve is followed by one `project retrieve resume` in that loop.
+#
+
+
+def _deploy_report_cmd(org_alias: str, job_id: str):
+    return [
+        SFDX_CMD,
+        "project",
+        "deploy",
+        "report",
+        "-o",
+        f"{org_alias}",
+        "--job-id",
+        f"{job_id}",
+        "--json",
+    ]
+
+
+def _deploy_cancel_cmd(org_alias: str, job_id: str):
+    return [
+        SFDX_CMD,
+        "project",
+        "deploy",
+        "cancel",
+        "-o",
+        f"{org_alias}",
+        "--job-id",
+        f"{job_id}",
+        "--async",
+        "--json",
+    ]
+
+
+def _retrieve_resume_cmd(org_alias: str, job_id: str):
+    return [
+        SFDX_CMD,
+        "project",
+        "retrieve",
+        "resume",
+        "--job-id",
+        f"{job_id}",
+        "--json",
+    ]
+
+
+async def _report_deploy(job):
+    return await run_cmd_async(_deploy_report_cmd(job.org_alias, job.id))
+
+
+async def _report_install(job):
+    return await check_install_async(job.org_alias, job.id)
+
+
+async def _report_retrieve(job):
+    return await run_cmd_async(_retrieve_resume_cmd(job.org_alias, job.id))
+
+
+# report: latest `--json` output, is_done: on its result, cancel: command
+# (None when Salesforce can't cancel it), invalidates: the org's cached
+# results once done, profile: polling profile.
+JOB_KINDS = {
+    "deploy": {
+        "report": _report_deploy,
+        "is_done": lambda result: result.get("done", False),
+        "cancel": _deploy_cancel_cmd,
+        "invalidates": True,
+        "profile": "default",
+    },
+    "install": {
+        "report": _report_install,
+        "is_done": lambda result: result.get("Status") != "IN_PROGRESS",
+        "cancel": None,
+        "invalidates": True,
+        "profile": "package_install",
+    },
+    "retrieve": {
+        "report": _report_retrieve,
+        "is_done": lambda result: result.get("done", True),
+        "cancel": None,
+        "invalidates": False,
+        "profile": "default",
+    },
+}
+
+
+class Job:
+    # A submitted deploy, install or retrieve. .result is the last `--json`
+    # report, kept up to date by the poller until the job is done.
+    def __init__(self, kind: str, org_alias: str, job_id: str, py_obj: dict):
+        self.kind = kind
+        self.org_alias = org_alias
+        self.id = job_id
+        self.result = py_obj
+        self.submitted = time.perf_counter()
+        self.finished = None
+        self.future = concurrent.futures.Future()
+
+    def __repr__(self):
+        return f"{self.kind} {self.id} ({self.org_alias})"
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    @property
+    def status(self):
+        # As reported by Salesforce, e.g. InProgress, Succeeded, IN_PROGRESS.
+        result = self.result.get("result") or {}
+        return result.get("status") or result.get("Status") or self.result.get("name", "")
+
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.submitted
+
+    def poll(self):
+        # Like Popen.poll(): None while the job runs, else its final result.
+        return self.future.result() if self.future.done() else None
+
+    def wait(self, timeout: float = None):
+        try:
+            return self.future.result(timeout)
+        except concurrent.futures.TimeoutError as e:
+            raise TimeoutError(f"{self} not done after {timeout}s") from e
+
+    async def wait_async(self):
+        return await asyncio.wrap_future(self.future)
+
+    def cancel(self):
+        # Asks Salesforce to cancel; the job is done once it reports so.
+        logging.debug(f"Job.cancel({self})")
+
+        cancel_cmd = JOB_KINDS[self.kind]["cancel"]
+        if cancel_cmd is None:
+            return {"status": 1, "name": "CancelNotSupported", "message": f"A {self.kind} can't be cancelled"}
+        if self.done:
+            return {"status": 1, "name": "JobDone", "message": f"{self} is already done"}
+
+        return run_cmd(cancel_cmd(self.org_alias, self.id))
+
+    def finish(self, py_obj: dict):
+        self.result = py_obj
+        self.finished = time.perf_counter()
+        if JOB_KINDS[self.kind]["invalidates"]:
+            cmd_cache.invalidate(self.org_alias)
+        self.future.set_result(py_obj)
+
+
+class JobPoller:
+    # One thread & event loop reporting on every Job.
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="sf-job-poller", daemon=True)
+        self.thread.start()
+
+    def track(self, job: Job):
+        asyncio.run_coroutine_threadsafe(self.follow(job), self.loop)
+
+    async def follow(self, job: Job):
+        kind = JOB_KINDS[job.kind]
+        settings = polling.profile(kind["profile"])
+        deadline = time.monotonic() + settings["timeout"]
+
+        try:
+            for delay in polling.intervals(settings["initial"], settings["factor"], settings["max_interval"]):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    job.finish(
+                        {
+                            "status": 1,
+                            "name": "JobTimeoutError",
+                            "message": f"{job} not done after {settings['timeout']}s",
+                            "result": job.result.get("result"),
+                        }
+                    )
+                    return
+
+                await asyncio.sleep(min(delay, remaining))
+
+                py_obj = await kind["report"](job)
+                if py_obj["status"] == 1 and "result" not in py_obj:
+                    if retry.retryable(SfdxError.from_result(py_obj)):
+                        logging.error(f"Checking {job} failed, checking again ~ {py_obj['message']}")
+                        continue
+                    job.finish(py_obj)
+                    return
+
+                job.result = py_obj
+                if kind["is_done"](py_obj["result"]):
+                    job.finish(py_obj)
+                    return
+                logging.info(f"{job} {job.status}, next check in {delay:.1f}s")
+        except Exception as e:
+            job.finish({"status": 1, "name": type(e).__name__, "message": str(e)})
+
+
+_job_poller = None
+_job_poller_lock = threading.Lock()
+
+
+def job_poller():
+    global _job_poller
+
+    with _job_poller_lock:
+        if _job_poller is None:
+            _job_poller = JobPoller()
+
+    return _job_poller
+
+
+def submit_job(kind: str, org_alias: str, py_obj: dict):
+    # py_obj: the output of the command that started the job.
+    result = py_obj.get("result") or {}
+    job = Job(kind, org_alias, result.get("id") or result.get("Id") or result.get("jobId"), py_obj)
+
+    if py_obj["status"] != 0 or job.id is None or JOB_KINDS[kind]["is_done"](result):
+        job.finish(py_obj)
+    else:
+        job_poller().track(job)
+
+    return job
+
+
+def source_push_job(org_alias: str, forceoverwrite: bool, src_folder: str = None):
+    logging.debug(f"source_push_job({org_alias}, {forceoverwrite}, {src_folder})")
+
+    py_obj = run_cmd(_source_push_cmd(org_alias, forceoverwrite, src_folder) + ["--async"])
+    return submit_job("deploy", org_alias, py_obj)
+
+
+async def source_push_job_async(org_alias: str, forceoverwrite: bool, src_folder: str = None):
+    logging.debug(f"source_push_job_async({org_alias}, {forceoverwrite}, {src_folder})")
+
+    py_obj = await run_cmd_async(_source_push_cmd(org_alias, forceoverwrite, src_folder) + ["--async"])
+    return submit_job("deploy", org_alias, py_obj)
+
+
+def install_source_job(org_alias: str, src_folder: str):
+    logging.debug(f"install_source_job({org_alias}, {src_folder})")
+
+    return source_push_job(org_alias, False, src_folder)
+
+
+async def install_source_job_async(org_alias: str, src_folder: str):
+    logging.debug(f"install_source_job_async({org_alias}, {src_folder})")
+
+    return await source_push_job_async(org_alias, False, src_folder)
+
+
+def install_sources_job(org_alias: str, src_folders: list):
+    logging.debug(f"install_sources_job({org_alias}, {src_folders})")
+
+    return submit_job("deploy", org_alias, run_cmd(_install_sources_cmd(org_alias, src_folders) + ["--async"]))
+
+
+async def install_sources_job_async(org_alias: str, src_folders: list):
+    logging.debug(f"install_sources_job_async({org_alias}, {src_folders})")
+
+    py_obj = await run_cmd_async(_install_sources_cmd(org_alias, src_folders) + ["--async"])
+    return submit_job("deploy", org_alias, py_obj)
+
+
+def install_package_job(org_alias: str, package_id: str):
+    # `package install` already returns once the install is requested.
+    logging.debug(f"install_package_job({org_alias}, {package_id})")
+
+    return submit_job("install", org_alias, run_cmd(_install_package_cmd(org_alias, package_id)))
+
+
+async def install_package_job_async(org_alias: str, package_id: str):
+    logging.debug(f"install_package_job_async({org_alias}, {package_id})")
+
+    return submit_job("install", org_alias, await run_cmd_async(_install_package_cmd(org_alias, package_id)))
+
+
+def source_pull_job(org_alias: str, metadata: str = None):
+    logging.debug(f"source_pull_job({org_alias}, {metadata})")
+
+    return submit_job("retrieve", org_alias, run_cmd(_source_pull_cmd(org_alias, metadata) + ["--async"]))
+
+
+async def source_pull_job_async(org_alias: str, metadata: str = None):
+    logging.debug(f"source_pull_job_async({org_alias}, {metadata})")
 
-    return parse_output(out)
+    return submit_job("retrieve", org_alias, await run_cmd_async(_source_pull_cmd(org_alias, metadata) + ["--async"]))
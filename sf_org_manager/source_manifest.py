@@ -0,0 +1,46 @@
+# source_manifest.py
+__version__ = "0.0.3"
+
+#
+# Keeps, per scratch org, the content hash of each source folder last
+# deployed to it, so unchanged folders are not deployed again.
+#
+
+import os
+
+from . import local_state
+
+
+def manifest_file(username):
+    return local_state.state_path("manifests", f"{username}.json")
+
+
+def folder_key(src_folder):
+    return os.path.abspath(src_folder)
+
+
+def is_deployed(username, src_folder, content_hash):
+    manifest = local_state.read_json(manifest_file(username), {})
+    return manifest.get(folder_key(src_folder)) == content_hash
+
+
+def deployed(username):
+    return local_state.read_json(manifest_file(username), {})
+
+
+def seed(username, folders):
+    # An org built from a snapshot starts with the snapshot's source.
+    path = manifest_file(username)
+
+    with local_state.file_lock(path):
+        local_state.write_json(path, dict(folders))
+
+
+def record(username, src_folder, content_hash):
+    path = manifest_file(username)
+
+    with local_state.file_lock(path):
+        manifest = local_state.read_json(path, {})
+        manifest[folder_key(src_folder)] = content_hash
+        local_state.write_json(path, manifest)
+
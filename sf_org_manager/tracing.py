@@ -0,0 +1,125 @@
+# tracing.py
+__version__ = "0.0.3"
+
+#
+# Records spans for build steps, sf commands and REST calls, and writes them
+# in Chrome trace event format (chrome://tracing, Perfetto, speedscope).
+# Recording is off until start() is called.
+#
+
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+# Thread ids given to the lanes of concurrent asyncio commands.
+ASYNC_TID_BASE = 1000000
+
+_spans = []
+_threads = {}
+_lanes = set()
+_lock = threading.Lock()
+_origin = None
+
+
+def start():
+    global _origin
+
+    with _lock:
+        _spans.clear()
+        _origin = time.perf_counter()
+
+
+def stop():
+    global _origin
+
+    _origin = None
+
+
+def enabled():
+    return _origin is not None
+
+
+def current_tid():
+    # Small, stable ids for the timeline rows of threads.
+    ident = threading.get_ident()
+    with _lock:
+        if ident not in _threads:
+            _threads[ident] = len(_threads) + 1
+        return _threads[ident]
+
+
+def add_span(name, cat, start_time, end_time, args=None, tid=None):
+    # Times are time.perf_counter() values.
+    if _origin is None:
+        return
+
+    span = {
+        "name": name,
+        "cat": cat,
+        "ph": "X",
+        "ts": round((start_time - _origin) * 1e6),
+        "dur": round((end_time - start_time) * 1e6),
+        "pid": os.getpid(),
+        "tid": tid or current_tid(),
+        "args": args or {},
+    }
+    with _lock:
+        _spans.append(span)
+
+
+@contextmanager
+def span(name, cat, **args):
+    # Yields the span args, so the caller can add to them.
+    if _origin is None:
+        yield args
+        return
+
+    start_time = time.perf_counter()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = repr(e)
+        raise
+    finally:
+        add_span(name, cat, start_time, time.perf_counter(), args)
+
+
+@contextmanager
+def lane():
+    # Overlapping spans on one thread (asyncio) need a timeline row each.
+    with _lock:
+        n = 0
+        while n in _lanes:
+            n = n + 1
+        _lanes.add(n)
+    try:
+        yield ASYNC_TID_BASE + n
+    finally:
+        with _lock:
+            _lanes.discard(n)
+
+
+def thread_name(tid):
+    if tid >= ASYNC_TID_BASE:
+        return f"async-{tid - ASYNC_TID_BASE}"
+    if tid == _threads.get(threading.main_thread().ident):
+        return "main"
+    return f"thread-{tid}"
+
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+
+def write_chrome_trace(path):
+    events = spans()
+
+    for tid in sorted({event["tid"] for event in events}):
+        events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": thread_name(tid)}})
+
+    with open(path, "w") as jsonfile:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, jsonfile)
@@ -0,0 +1,38 @@
+# conftest.py
+
+import json
+import subprocess
+
+import pytest
+
+from sf_org_manager import fake_sf
+from sf_org_manager import polling
+from sf_org_manager import sfdx_cli_utils as sfdx
+
+
+@pytest.fixture
+def fake_home(tmp_path, monkeypatch):
+    # State, command cache & the fake CLI's auth files in a temp folder.
+    monkeypatch.setenv("SF_ORG_BUILDER_HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("FAKE_SF_HOME", str(tmp_path / "sf"))
+    monkeypatch.setenv("SF_ORG_BUILDER_AUTH_HOME", str(tmp_path / "sf"))
+    return tmp_path
+
+
+@pytest.fixture
+def fake_cli(fake_home, monkeypatch):
+    # sfdx_cli_utils pointed at the fake sf CLI, polling without waiting.
+    monkeypatch.setenv("FAKE_SF_INSTALL_SECONDS", "0")
+    monkeypatch.setattr(sfdx, "SFDX_CMD", fake_sf.install_shim(str(fake_home / "bin")))
+    for job_type in polling.POLL_PROFILES:
+        monkeypatch.setitem(polling.POLL_PROFILES, job_type, dict(polling.POLL_PROFILES[job_type], initial=0.05))
+    return sfdx.SFDX_CMD
+
+
+@pytest.fixture
+def scratch_org(fake_cli):
+    # Alias & username of a new fake scratch org.
+    output = subprocess.run(
+        [fake_cli, "org", "create", "scratch", "-a", "test-org", "--json"], capture_output=True, text=True, check=True
+    )
+    return "test-org", json.loads(output.stdout)["result"]["username"]
@@ -0,0 +1,76 @@
+# test_cmd_cache.py
+
+import os
+
+from sf_org_manager import cmd_cache
+from sf_org_manager import local_state
+from sf_org_manager import package_installer
+from sf_org_manager import sfdx_cli_utils as sfdx
+
+
+def package_ids(py_obj):
+    return [item["SubscriberPackageVersionId"] for item in py_obj["result"]]
+
+
+def test_install_by_username_clears_package_list_cached_by_alias(scratch_org):
+    alias, username = scratch_org
+    assert package_ids(sfdx.package_list(alias)) == []
+
+    package_installer.install_packages(username, ["04t000000000001"])
+
+    assert package_ids(sfdx.package_list(alias)) == ["04t000000000001"]
+
+
+def test_entries_are_tagged_with_alias_and_username(scratch_org):
+    alias, username = scratch_org
+    assert cmd_cache.target_keys([alias]) == {alias, username}
+    assert cmd_cache.target_keys([username]) == {alias, username}
+    assert cmd_cache.target_keys([cmd_cache.ORGS, None]) == {cmd_cache.ORGS}
+
+
+def test_invalidate_by_either_name(scratch_org):
+    alias, username = scratch_org
+    for name in (alias, username):
+        sfdx.package_list(alias)
+        assert cmd_cache.peek("package_list", sfdx._package_list_cmd(alias)) is not None
+
+        cmd_cache.invalidate(name)
+
+        assert cmd_cache.peek("package_list", sfdx._package_list_cmd(alias)) is None
+
+
+def test_org_change_clears_org_list(fake_cli):
+    sfdx.org_list()
+    assert cmd_cache.peek("org_list", sfdx._org_list_cmd()) is not None
+
+    sfdx.alias_set("other", "user@dev-hub-org.com")
+
+    assert cmd_cache.peek("org_list", sfdx._org_list_cmd()) is None
+
+
+def test_user_details_are_not_written_to_disk(scratch_org):
+    alias, _ = scratch_org
+    token = sfdx.user_details(alias)["result"]["accessToken"]
+
+    for file_name in os.listdir(cmd_cache.cache_dir()):
+        with open(os.path.join(cmd_cache.cache_dir(), file_name)) as cache_file:
+            assert token not in cache_file.read()
+
+
+def test_entries_of_an_older_version_are_dropped_once(scratch_org, monkeypatch):
+    alias, _ = scratch_org
+    monkeypatch.setattr(cmd_cache, "_upgraded", set())
+    # A cache folder as an older version left it, user_details included.
+    old_entry = cmd_cache.entry_path("user_details", sfdx._user_details_cmd(alias))
+    local_state.write_json(old_entry, {"result": {"accessToken": "00D!old"}})
+    os.remove(os.path.join(cmd_cache.cache_dir(), "VERSION"))
+    cmd_cache._upgraded.clear()
+
+    sfdx.package_list(alias)
+
+    assert not os.path.isfile(old_entry)
+    assert cmd_cache.peek("package_list", sfdx._package_list_cmd(alias)) is not None
+
+    # Entries of this version are kept.
+    cmd_cache._upgraded.clear()
+    assert cmd_cache.peek("package_list", sfdx._package_list_cmd(alias)) is not None
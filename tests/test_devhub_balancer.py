@@ -0,0 +1,44 @@
+# test_devhub_balancer.py
+
+import pytest
+
+from sf_org_manager import devhub_balancer
+from sf_org_manager import polling
+from sf_org_manager.errors import BuildError
+
+
+@pytest.fixture
+def hubs(fake_cli, monkeypatch):
+    # Two fake Dev Hubs, hub-full at its limits; waits give up after a second.
+    monkeypatch.setenv("FAKE_SF_HUBS", "hub-free=5/5,hub-full=0/0")
+    monkeypatch.setitem(polling.POLL_PROFILES, "devhub", dict(polling.POLL_PROFILES["devhub"], timeout=1))
+
+
+def test_choose_takes_the_hub_with_room(hubs):
+    assert devhub_balancer.choose(["hub-full", "hub-free"]) == "hub-free"
+
+
+def test_choose_skips_unreadable_hubs(hubs):
+    assert devhub_balancer.choose(["no-such-hub", "hub-free"]) == "hub-free"
+
+
+def test_choose_fails_at_once_when_no_hub_is_readable(hubs, monkeypatch):
+    # Not a wait for capacity that may never show up.
+    monkeypatch.setattr(polling, "poll", lambda *args, **kwargs: pytest.fail("waited for unreadable hubs"))
+
+    with pytest.raises(BuildError, match="Unable to read the scratch org limits"):
+        devhub_balancer.choose(["no-such-hub", "other-hub"])
+
+
+def test_choose_waits_when_every_hub_is_full(hubs):
+    with pytest.raises(BuildError, match="not ready after"):
+        devhub_balancer.choose(["hub-full"])
+
+
+def test_choose_fails_when_hubs_become_unreadable_while_waiting(hubs, monkeypatch):
+    with pytest.raises(BuildError):
+        devhub_balancer.choose(["hub-full"])
+
+    monkeypatch.setenv("FAKE_SF_FAIL", "org:list:limits=INVALID_SESSION_ID")
+    with pytest.raises(BuildError, match="Unable to read the scratch org limits"):
+        devhub_balancer.choose(["hub-full"])
@@ -0,0 +1,135 @@
+# test_journal.py
+
+import os
+import shutil
+
+import pytest
+
+from sf_org_manager import data_snapshot
+from sf_org_manager import journal
+from sf_org_manager import org_builder
+from sf_org_manager import org_snapshot
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+ORG = ("test-org", "test@example.com")
+DATA = {"BUILD_DATA_CMD": ["data/setup-accounts.apex"], "DATA_SNAPSHOT_QUERIES": ["SELECT Name FROM Account"]}
+
+
+@pytest.fixture
+def project(tmp_path, fake_home):
+    project_dir = tmp_path / "project"
+    shutil.copytree(os.path.join(BENCHMARKS, "project"), project_dir)
+    return project_dir
+
+
+def build(project, *argv, **config):
+    config_file = os.path.join(BENCHMARKS, "configs", "minimal.yml")
+    cfg = dict(org_builder.get_config(config_file), **config)
+    args = org_builder.setup_args(cfg, config_file).parse_args(["-a", ORG[0], *argv])
+
+    return cfg, {s.name: s for s in org_builder.build_steps(args, cfg, ORG[1], str(project))}
+
+
+def fingerprints(project, *argv, **config):
+    _, steps = build(project, *argv, **config)
+    return {name: journal.fingerprint(s, ORG) for name, s in steps.items()}
+
+
+def edit(project, path):
+    with open(project / path, "a") as source_file:
+        source_file.write("\n// edited\n")
+
+
+def test_fingerprints_are_stable(project):
+    assert fingerprints(project) == fingerprints(project)
+
+
+def test_source_push_follows_project_source(project):
+    before = fingerprints(project)
+
+    edit(project, "force-app/main/default/classes/InvoiceService.cls")
+
+    after = fingerprints(project)
+    assert before["source_push"] != after["source_push"]
+    assert before["details"] == after["details"]
+
+
+def test_deploy_steps_follow_their_folders(project):
+    before = fingerprints(project, "--skip", SRC_FOLDERS=["force-app"])
+
+    edit(project, "force-app/main/default/classes/InvoiceService.cls")
+
+    after = fingerprints(project, "--skip", SRC_FOLDERS=["force-app"])
+    assert before["src_folders:force-app"] != after["src_folders:force-app"]
+
+
+def test_org_names_are_left_out(project):
+    _, steps = build(project)
+    s = steps["source_push"]
+
+    assert journal.fingerprint(s, ORG) == journal.fingerprint(s, (ORG[0], "other@example.com"))
+
+
+def test_resume_reruns_changed_source_push(project):
+    _, steps = build(project)
+    for name, s in steps.items():
+        journal.record(*ORG, name, journal.fingerprint(s, ORG))
+
+    edit(project, "force-app/main/default/classes/InvoiceService.cls")
+
+    _, steps = build(project)
+    completed = journal.start(*ORG, resume=True)
+    changed = [name for name, s in steps.items() if completed.get(name) != journal.fingerprint(s, ORG)]
+    assert changed == ["source_push"]
+
+
+def test_snapshot_key_follows_project_source(project):
+    cfg, _ = build(project)
+    before = org_snapshot.snapshot_key(cfg, "my-dev-hub-org", str(project))
+
+    edit(project, "force-app/main/default/classes/InvoiceService.cls")
+
+    assert org_snapshot.snapshot_key(cfg, "my-dev-hub-org", str(project)) != before
+    assert org_snapshot.snapshot_key(cfg, "other-hub", str(project)) != before
+
+
+def test_org_from_snapshot_reruns_changed_source_push(project):
+    # The journal of the org the snapshot was taken from, seeded into the new org's.
+    source_org = ("source-org", "source@example.com")
+    _, steps = build(project, "-a", source_org[0])
+    snapshot = {"steps": {name: journal.fingerprint(s, source_org) for name, s in steps.items()}, "folders": {}}
+    org_snapshot.seed(snapshot, *ORG)
+
+    edit(project, "force-app/main/default/classes/InvoiceService.cls")
+
+    _, steps = build(project)
+    completed = journal.start(*ORG, resume=True)
+    changed = [name for name, s in steps.items() if completed.get(name) != journal.fingerprint(s, ORG)]
+    assert changed == ["source_push"]
+
+
+def test_data_snapshot_follows_project_source(project):
+    cfg, _ = build(project, **DATA)
+    key = data_snapshot.snapshot_key(cfg, str(project))
+    os.makedirs(data_snapshot.snapshot_path(key))
+    with open(data_snapshot.manifest_file(key), "w") as manifest:
+        manifest.write("{}")
+
+    _, steps = build(project, **DATA)
+    assert "build_data:snapshot" in steps
+
+    edit(project, "force-app/main/default/classes/InvoiceService.cls")
+
+    _, steps = build(project, **DATA)
+    assert data_snapshot.snapshot_key(cfg, str(project)) != key
+    assert "build_data:snapshot" not in steps
+    assert "build_data:export" in steps
+
+
+def test_data_snapshot_without_source_push_ignores_project_source(project):
+    cfg, _ = build(project, "--skip", **DATA)
+    key = data_snapshot.snapshot_key(cfg, str(project), skip=True)
+
+    edit(project, "force-app/main/default/classes/InvoiceService.cls")
+
+    assert data_snapshot.snapshot_key(cfg, str(project), skip=True) == key
@@ -0,0 +1,119 @@
+# test_local_auth.py
+
+import json
+import os
+
+import pytest
+
+from sf_org_manager import local_auth
+
+
+@pytest.fixture
+def sfdx(tmp_path, monkeypatch):
+    # An empty CLI home; the project folder is the test's cwd.
+    monkeypatch.setenv(local_auth.AUTH_HOME_ENV, str(tmp_path / "home"))
+    monkeypatch.chdir(tmp_path)
+    folder = tmp_path / "home" / ".sfdx"
+    folder.mkdir(parents=True)
+    return folder
+
+
+def write(path, py_obj):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(py_obj))
+    # A new mtime even on filesystems with coarse timestamps.
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+
+
+def add_org(folder, username, alias=None, **auth):
+    write(folder / f"{username}.json", {"username": username, "orgId": "00D000000000001", **auth})
+    if alias:
+        aliases = local_auth.read_json(folder / "alias.json") or {"orgs": {}}
+        aliases["orgs"][alias] = username
+        write(folder / "alias.json", aliases)
+
+
+def test_resolve_by_alias_or_username(sfdx):
+    add_org(sfdx, "admin@hub.org", "my-hub", isDevHub=True)
+
+    assert local_auth.resolve("my-hub")["username"] == "admin@hub.org"
+    assert local_auth.resolve("admin@hub.org")["alias"] == "my-hub"
+    assert local_auth.resolve("no-such-org") is None
+
+
+def test_scratch_orgs_and_expiry(sfdx):
+    add_org(sfdx, "live@scratch.org", "live", devHubUsername="admin@hub.org", expirationDate="2999-01-01")
+    add_org(sfdx, "old@scratch.org", "old", devHubUsername="admin@hub.org", expirationDate="2000-01-01")
+    add_org(sfdx, "admin@hub.org", "my-hub", isDevHub=True)
+
+    live, old, hub = (local_auth.resolve(alias) for alias in ("live", "old", "my-hub"))
+
+    assert live["isScratch"] and live["status"] == "Active"
+    assert old["isExpired"] and old["status"] == "Expired"
+    assert not hub["isScratch"] and hub["isDevHub"]
+    assert "status" not in hub
+
+
+def test_index_follows_the_files(sfdx):
+    add_org(sfdx, "first@scratch.org", "dev")
+    assert local_auth.resolve("dev")["username"] == "first@scratch.org"
+
+    # Re-pointing an alias, as `sf alias set` does.
+    add_org(sfdx, "second@scratch.org", "dev")
+    assert local_auth.resolve("dev")["username"] == "second@scratch.org"
+
+    os.remove(sfdx / "second@scratch.org.json")
+    assert local_auth.resolve("dev") is None
+
+
+def test_skips_files_that_are_not_auth_files(sfdx):
+    add_org(sfdx, "admin@hub.org", "my-hub")
+    (sfdx / "broken@scratch.org.json").write_text("{not json")
+    write(sfdx / "nouser@scratch.org.json", {"orgId": "00D000000000002"})
+    write(sfdx / "sfdx-config.json", {"defaultusername": "my-hub"})
+
+    orgs = local_auth.org_list()["result"]["nonScratchOrgs"]
+
+    assert [org["username"] for org in orgs] == ["admin@hub.org"]
+
+
+def test_default_markers_project_config_wins(sfdx, tmp_path):
+    add_org(sfdx, "admin@hub.org", "my-hub", isDevHub=True)
+    add_org(sfdx, "a@scratch.org", "org-a", devHubUsername="admin@hub.org")
+    add_org(sfdx, "b@scratch.org", "org-b", devHubUsername="admin@hub.org")
+    write(tmp_path / "home" / ".sf" / "config.json", {"target-org": "org-a", "target-dev-hub": "my-hub"})
+    write(tmp_path / ".sf" / "config.json", {"target-org": "b@scratch.org"})
+
+    markers = {alias: local_auth.resolve(alias).get("defaultMarker") for alias in ("my-hub", "org-a", "org-b")}
+
+    assert markers == {"my-hub": "(D)", "org-a": None, "org-b": "(U)"}
+
+
+def test_org_list_shape(sfdx):
+    add_org(sfdx, "admin@hub.org", "my-hub", isDevHub=True)
+    add_org(sfdx, "a@scratch.org", "org-a", devHubUsername="admin@hub.org", expirationDate="2999-01-01")
+
+    result = local_auth.org_list()["result"]
+
+    assert [org["alias"] for org in result["devHubs"]] == ["my-hub"]
+    assert [org["alias"] for org in result["nonScratchOrgs"]] == ["my-hub"]
+    assert [org["alias"] for org in result["scratchOrgs"]] == ["org-a"]
+    assert result["other"] == result["sandboxes"] == []
+
+
+def test_no_sfdx_folder(tmp_path, monkeypatch):
+    monkeypatch.setenv(local_auth.AUTH_HOME_ENV, str(tmp_path))
+
+    assert not local_auth.available()
+    assert local_auth.resolve("my-hub") is None
+    assert local_auth.org_list() is None
+
+
+def test_matches_the_fake_cli(scratch_org):
+    alias, username = scratch_org
+
+    org = local_auth.resolve(alias)
+
+    assert org["username"] == username
+    assert org["isScratch"]
+    assert local_auth.resolve(username)["alias"] == alias
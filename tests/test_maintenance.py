@@ -0,0 +1,128 @@
+# test_maintenance.py
+
+import argparse
+import asyncio
+
+import pytest
+
+from sf_org_manager import maintenance
+from sf_org_manager import sfdx_cli_utils as sfdx
+
+OK = {"status": 0, "result": {}}
+AUTH_EXPIRED = {
+    "status": 1,
+    "name": "RefreshTokenAuthError",
+    "message": "Error authenticating with the refresh token due to: expired access/refresh token",
+}
+NO_ORG = {"status": 1, "name": "NoOrgFound", "message": "No authorization information found for x."}
+INVALID_SESSION = {"status": 1, "name": "Error", "message": "INVALID_SESSION_ID: Session expired or invalid"}
+DNS = {"status": 1, "name": "Error", "message": "getaddrinfo ENOTFOUND test.my.salesforce.com"}
+RESET = {"status": 1, "name": "Error", "message": "socket hang up"}
+TIMEOUT = {"status": 1, "name": "GenericTimeoutError", "message": "Operation timed out"}
+GONE = {"status": 1, "name": "ScratchOrgNotFound", "message": "Attempting to delete an expired or deleted org"}
+
+SCRATCH = {"username": "test@example.com", "isScratch": True}
+HUB = {"username": "hub@example.com", "isScratch": False}
+
+
+def options(**kwargs):
+    return argparse.Namespace(**{"dry_run": False, "logout_unreachable": False, **kwargs})
+
+
+@pytest.fixture
+def cli(monkeypatch):
+    # The sf results per command, and the commands run.
+    results = {"user_details": OK, "delete_org": OK, "logout_org": OK}
+    calls = []
+
+    def fake(name):
+        async def run(username):
+            calls.append(name)
+            return results[name]
+
+        return run
+
+    for name in results:
+        monkeypatch.setattr(sfdx, f"{name}_async", fake(name))
+
+    return results, calls
+
+
+@pytest.mark.parametrize(
+    "details, health",
+    [
+        (OK, maintenance.CONNECTED),
+        (AUTH_EXPIRED, maintenance.UNREACHABLE),
+        (NO_ORG, maintenance.UNREACHABLE),
+        (INVALID_SESSION, maintenance.UNREACHABLE),
+        (DNS, maintenance.UNKNOWN),
+        (RESET, maintenance.UNKNOWN),
+        (TIMEOUT, maintenance.UNKNOWN),
+    ],
+)
+def test_check_org(cli, details, health):
+    results, _ = cli
+    results["user_details"] = details
+
+    assert asyncio.run(maintenance.check_org(SCRATCH))[0] == health
+
+
+def test_expired_orgs_are_not_checked(cli):
+    _, calls = cli
+
+    assert asyncio.run(maintenance.check_org(dict(SCRATCH, isExpired=True)))[0] == maintenance.EXPIRED
+    assert calls == []
+
+
+@pytest.mark.parametrize(
+    "org, health, logout_unreachable, action",
+    [
+        (SCRATCH, maintenance.CONNECTED, False, None),
+        (SCRATCH, maintenance.UNKNOWN, False, None),
+        (SCRATCH, maintenance.EXPIRED, False, "delete"),
+        (SCRATCH, maintenance.UNREACHABLE, False, "delete"),
+        (HUB, maintenance.CONNECTED, True, None),
+        (HUB, maintenance.UNKNOWN, True, None),
+        (HUB, maintenance.UNREACHABLE, False, None),
+        (HUB, maintenance.UNREACHABLE, True, "logout"),
+    ],
+)
+def test_plan_action(org, health, logout_unreachable, action):
+    assert maintenance.plan_action(org, health, options(logout_unreachable=logout_unreachable)) == action
+
+
+@pytest.mark.parametrize(
+    "delete, outcome, calls",
+    [
+        (OK, "Deleted", ["delete_org"]),
+        (GONE, "Logged out", ["delete_org", "logout_org"]),
+        (DNS, "Failed", ["delete_org"]),
+        (RESET, "Failed", ["delete_org"]),
+    ],
+)
+def test_clean_org_only_logs_out_orgs_the_dev_hub_lost(cli, delete, outcome, calls):
+    results, run = cli
+    results["delete_org"] = delete
+
+    assert asyncio.run(maintenance.clean_org(SCRATCH, "delete")) == outcome
+    assert run == calls
+
+
+def test_network_outage_keeps_every_org(cli):
+    results, calls = cli
+    results["user_details"] = DNS
+
+    summary = asyncio.run(maintenance.maintain_async([SCRATCH, HUB], options(logout_unreachable=True)))
+
+    assert [r["outcome"] for r in summary] == ["Kept", "Kept"]
+    assert calls == ["user_details", "user_details"]
+
+
+def test_dry_run_changes_nothing(cli):
+    results, calls = cli
+    results["user_details"] = AUTH_EXPIRED
+
+    summary = asyncio.run(maintenance.maintain_async([SCRATCH], options(dry_run=True)))
+
+    assert summary[0]["outcome"] == "Would delete"
+    assert calls == ["user_details"]
@@ -0,0 +1,225 @@
+# test_org_daemon.py
+
+import json
+import os
+import sys
+import threading
+import time
+
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from sf_org_manager import org_daemon
+
+
+OPTIONS = {"config": "org_config.yml", "scratch_def": "config/project-scratch-def.json", "duration": 7}
+
+
+@pytest.fixture
+def queue(fake_home):
+    return org_daemon.JobQueue(str(fake_home / "jobs.db"))
+
+
+@pytest.fixture
+def daemon(queue):
+    # The HTTP API, with workers that are not started.
+    builder = org_daemon.Builder(queue, 0, {}, org_daemon.DEVHUB_MAX_BUILDS)
+    handler = type("Handler", (org_daemon.DaemonHandler,), {"builder": builder})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, data):
+    request = Request(f"{url}/jobs", data=data, method="POST")
+    try:
+        with urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_claim_respects_devhub_caps(queue):
+    ids = [queue.submit(f"org-{n}", "hub-a" if n < 3 else "hub-b", "/project", {}) for n in range(4)]
+
+    claimed = [queue.claim({"hub-a": 2}, 1) for _ in range(4)]
+
+    assert [job["id"] if job else None for job in claimed] == [ids[0], ids[1], ids[3], None]
+    assert queue.running() == {"hub-a": 2, "hub-b": 1}
+
+
+def test_balanced_jobs_count_against_the_chosen_hub(queue):
+    ids = [queue.submit(f"org-{n}", org_daemon.BALANCED, "/project", {}) for n in range(5)]
+
+    claimed = [queue.claim({}, 2, ["hub-a", "hub-b"], lambda free: free[0]) for _ in range(5)]
+
+    assert [job["devhub"] if job else None for job in claimed] == ["hub-a", "hub-a", "hub-b", "hub-b", None]
+    assert queue.running() == {"hub-a": 2, "hub-b": 2}
+    assert queue.get(ids[4])["status"] == "queued"
+
+
+def test_balanced_jobs_wait_while_every_hub_is_full(queue):
+    balanced = queue.submit("org-1", org_daemon.BALANCED, "/project", {})
+    pinned = queue.submit("org-2", "hub-c", "/project", {"devhub": "hub-c"})
+
+    job = queue.claim({}, 2, ["hub-a", "hub-b"], lambda free: None)
+
+    assert job["id"] == pinned
+    assert queue.get(balanced)["status"] == "queued"
+
+
+def test_requeued_balanced_jobs_choose_again(queue):
+    balanced = queue.submit("org-1", org_daemon.BALANCED, "/project", {"devhub": None})
+    pinned = queue.submit("org-2", "hub-c", "/project", {"devhub": "hub-c"})
+    queue.claim({}, 2, ["hub-a"], lambda free: free[0])
+    queue.claim({}, 2, ["hub-a"], lambda free: free[0])
+
+    assert queue.requeue_running() == 2
+    assert queue.get(balanced)["devhub"] == org_daemon.BALANCED
+    assert queue.get(pinned)["devhub"] == "hub-c"
+
+
+def test_builder_chooses_hubs_by_headroom(fake_cli, queue, monkeypatch):
+    monkeypatch.setenv("FAKE_SF_HUBS", "hub-small=1/1,hub-big=5/5,hub-full=0/0")
+    builder = org_daemon.Builder(queue, 0, {}, 2, ["hub-small", "hub-big", "hub-full"])
+    org_daemon.devhub_balancer.refresh(builder.devhubs)
+
+    assert builder.choose_devhub(["hub-small", "hub-big"]) == "hub-big"
+    assert builder.choose_devhub(["hub-small", "hub-full"]) == "hub-small"
+    assert builder.choose_devhub(["hub-full"]) is None
+    # Its build fails, telling why.
+    assert builder.choose_devhub(["no-such-hub"]) == org_daemon.BALANCED
+
+
+def test_cancel_only_stops_queued_jobs(queue):
+    running = queue.submit("org-1", "hub-a", "/project", {})
+    queued = queue.submit("org-2", "hub-a", "/project", {})
+    queue.claim({}, 1)
+
+    assert not queue.cancel(running)
+    assert queue.cancel(queued)
+    assert queue.get(queued)["status"] == "cancelled"
+    assert queue.get(running)["status"] == "running"
+
+
+def test_readers_share_the_connection_with_writers(queue):
+    errors = []
+
+    def read():
+        try:
+            for _ in range(200):
+                queue.jobs()
+                queue.running()
+                queue.get(1)
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for n in range(200):
+        queue.submit(f"org-{n}", "hub-a", "/project", {})
+        queue.claim({}, 1000)
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert len(queue.jobs(limit=1000)) == 200
+
+
+def test_post_job(daemon, tmp_path):
+    body = {"alias": "org-1", "project": str(tmp_path), "options": dict(OPTIONS, devhub="hub-a")}
+
+    status, job = post(daemon, json.dumps(body).encode("utf-8"))
+
+    assert status == 201
+    assert (job["alias"], job["devhub"], job["status"]) == ("org-1", "hub-a", "queued")
+    assert job["options"]["skip"] is False
+
+
+def test_post_job_without_devhub_is_balanced(daemon, tmp_path):
+    status, job = post(daemon, json.dumps({"alias": "org-1", "project": str(tmp_path), "options": OPTIONS}).encode())
+
+    assert status == 201
+    assert job["devhub"] == org_daemon.BALANCED
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"not json",
+        b"[]",
+        b"{}",
+        json.dumps({"alias": "org-1", "options": OPTIONS}).encode(),
+        json.dumps({"alias": "org-1", "project": "/no/such/folder", "options": OPTIONS}).encode(),
+        json.dumps({"alias": "org-1", "project": ".", "options": []}).encode(),
+        json.dumps({"alias": "org-1", "project": ".", "options": {"devhub": "hub-a"}}).encode(),
+    ],
+)
+def test_post_malformed_job(daemon, queue, body):
+    status, payload = post(daemon, body)
+
+    assert status == 400
+    assert payload["message"].startswith("Bad job")
+    assert queue.jobs() == []
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX process groups")
+def test_terminate_build_stops_its_children(tmp_path):
+    # A build with an sf command running, standing in for org_builder.
+    pid_file = tmp_path / "child.pid"
+    script = f"sleep 60 & echo $! > {pid_file}; wait"
+    with open(tmp_path / "build.log", "w") as log:
+        proc = org_daemon.start_build(["sh", "-c", script], str(tmp_path), log)
+
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text().strip():
+            break
+        time.sleep(0.05)
+    child = int(pid_file.read_text())
+
+    org_daemon.terminate_build(proc)
+    proc.wait(timeout=10)
+
+    for _ in range(100):
+        try:
+            os.kill(child, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("the build's child process is still running")
+
+    # Signalling a finished build is harmless.
+    org_daemon.terminate_build(proc)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.05)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX process groups")
+def test_stopped_daemon_requeues_interrupted_builds(queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(org_daemon.fleet, "child_cmd", lambda options, alias, scratch_def: ["sleep", "60"])
+    job_id = queue.submit("org-1", "hub-a", str(tmp_path), OPTIONS)
+    builder = org_daemon.Builder(queue, 1, {}, org_daemon.DEVHUB_MAX_BUILDS)
+    builder.start()
+    wait_for(lambda: job_id in builder._procs)
+
+    builder.stop()
+    wait_for(lambda: job_id not in builder._procs)
+    # Time for the worker to record the killed build, were it going to.
+    time.sleep(0.5)
+
+    assert queue.get(job_id)["status"] == "running"
+    assert queue.requeue_running() == 1
+    assert queue.get(job_id)["status"] == "queued"
@@ -0,0 +1,22 @@
+# test_polling.py
+
+import pytest
+
+from sf_org_manager import polling
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    for job_type in polling.POLL_PROFILES:
+        monkeypatch.setitem(polling.POLL_PROFILES, job_type, dict(polling.POLL_PROFILES[job_type]))
+
+
+def test_set_timeout_only_changes_build_jobs(profiles):
+    devhub = polling.profile("devhub")["timeout"]
+
+    polling.set_timeout(7200)
+
+    assert [polling.profile(job_type)["timeout"] for job_type in polling.BUILD_JOB_TYPES] == [7200] * 3
+    assert polling.profile("devhub")["timeout"] == devhub
+    assert polling.profile("unknown")["timeout"] == 7200
+
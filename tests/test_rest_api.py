@@ -0,0 +1,89 @@
+# test_rest_api.py
+
+import pytest
+
+from sf_org_manager import fake_sf
+from sf_org_manager import rest_api
+from sf_org_manager import sfdx_cli_utils as sfdx
+
+
+@pytest.fixture
+def api(fake_cli, monkeypatch):
+    # The REST backend against the fake CLI's stub REST API; returns the
+    # paths of the requests it served.
+    server = fake_sf.start_api_server()
+    monkeypatch.setenv("FAKE_SF_API_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(sfdx, "API_BACKEND", "rest")
+    monkeypatch.setattr(sfdx, "_rest_sessions", {})
+
+    paths = []
+    handle_api = fake_sf.FakeApiHandler.handle_api
+
+    def recording(handler, method):
+        paths.append(handler.path)
+        return handle_api(handler, method)
+
+    monkeypatch.setattr(fake_sf.FakeApiHandler, "handle_api", recording)
+    yield paths
+
+    for client, _ in sfdx._rest_sessions.values():
+        client.close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cli_calls(monkeypatch):
+    calls = []
+    run_cmd = sfdx.run_cmd
+
+    def recording(cmd, *args, **kwargs):
+        calls.append(cmd[1:3])
+        return run_cmd(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(sfdx, "run_cmd", recording)
+    return calls
+
+
+def apex_file(tmp_path, apex):
+    path = tmp_path / "script.apex"
+    path.write_text(apex)
+    return str(path)
+
+
+def test_fits_in_url_counts_the_encoded_apex():
+    plain = "a" * rest_api.MAX_APEX_LENGTH
+    assert rest_api.fits_in_url(plain)
+    assert not rest_api.fits_in_url(plain + "a")
+
+    # Every character here takes three once encoded.
+    spaced = " " * (rest_api.MAX_APEX_LENGTH // 2)
+    assert len(spaced) < rest_api.MAX_APEX_LENGTH
+    assert not rest_api.fits_in_url(spaced)
+
+
+def test_anonymous_body_encodes_query_separators():
+    assert rest_api.anonymous_body("a&b=c/d #e+f") == "a%26b%3Dc%2Fd%20%23e%2Bf"
+
+
+def test_short_apex_goes_through_rest(api, cli_calls, scratch_org, tmp_path):
+    alias, _ = scratch_org
+
+    py_obj = sfdx.execute_script(alias, apex_file(tmp_path, "System.debug('hello');"))
+
+    assert py_obj["status"] == 0
+    assert any("executeAnonymous" in path for path in api)
+    assert ["apex", "run"] not in cli_calls
+
+
+def test_apex_too_long_once_encoded_goes_through_the_cli(api, cli_calls, scratch_org, tmp_path):
+    alias, _ = scratch_org
+    # Under MAX_APEX_LENGTH as written, well over it in the URL.
+    lines = "System.debug(' ');\n" * (rest_api.MAX_APEX_LENGTH // 25)
+    assert len(lines) < rest_api.MAX_APEX_LENGTH
+
+    py_obj = sfdx.execute_script(alias, apex_file(tmp_path, lines))
+
+    assert py_obj["status"] == 0
+    assert not any("executeAnonymous" in path for path in api)
+    assert ["apex", "run"] in cli_calls
@@ -0,0 +1,80 @@
+# test_sfdx_cli_utils.py
+
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from sf_org_manager import sfdx_cli_utils as sfdx
+
+# A command that logs when it starts & ends, and prints an sf-like result.
+COMMAND = """
+import sys, time
+with open(sys.argv[1], "a") as log:
+    log.write(f"{time.time()} 1\\n")
+time.sleep(0.2)
+with open(sys.argv[1], "a") as log:
+    log.write(f"{time.time()} -1\\n")
+print('{"status": 0, "result": {}}')
+"""
+
+
+@pytest.fixture
+def slots(monkeypatch):
+    # Two slots for the test, the module's own put back after it.
+    monkeypatch.setattr(sfdx, "MAX_CONCURRENT_CMDS", sfdx.MAX_CONCURRENT_CMDS)
+    monkeypatch.setattr(sfdx, "_cmd_slots", sfdx._cmd_slots)
+    sfdx.set_max_concurrent_cmds(2)
+    return 2
+
+
+def peak(log):
+    # Most commands running at once; an end at the same time as a start comes first.
+    events = sorted((float(t), int(step)) for t, step in (line.split() for line in log.read_text().splitlines()))
+    running = top = 0
+    for _, step in events:
+        running += step
+        top = max(top, running)
+
+    return top
+
+
+def test_sync_and_async_commands_share_one_limit(slots, tmp_path):
+    log = tmp_path / "running.log"
+    cmd = [sys.executable, "-c", COMMAND, str(log)]
+
+    async def batch():
+        return await asyncio.gather(*(sfdx.run_cmd_async(cmd) for _ in range(3)))
+
+    threads = [threading.Thread(target=sfdx.run_cmd, args=(cmd,)) for _ in range(3)]
+    # Each asyncio.run is an event loop of its own, like the JobPoller's.
+    threads += [threading.Thread(target=asyncio.run, args=(batch(),)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(log.read_text().splitlines()) == 2 * 9
+    assert peak(log) == slots
+
+
+def test_cancelled_async_wait_gives_its_slot_back(slots, tmp_path):
+    cmd = [sys.executable, "-c", COMMAND, str(tmp_path / "running.log")]
+
+    async def cancel_a_waiter():
+        running = [asyncio.ensure_future(sfdx.run_cmd_async(cmd)) for _ in range(slots)]
+        await asyncio.sleep(0.05)
+        waiting = asyncio.ensure_future(sfdx.run_cmd_async(cmd))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        await asyncio.gather(*running)
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(cancel_a_waiter())
+
+    # Every slot is free again.
+    for _ in range(slots):
+        assert sfdx._cmd_slots.acquire(timeout=2)
+    assert not sfdx._cmd_slots.acquire(blocking=False)